@@ -1,64 +1,88 @@
-from openai import OpenAI
-import stripe
 from flask import Flask, request, jsonify, send_file, render_template, redirect
 from flask_cors import CORS
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
 import os
+import json
+import logging
 import tempfile
 import time
 import requests
-from bs4 import BeautifulSoup
-import base64
-from fpdf import FPDF
-from PIL import Image
-import io
-import re
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
-import secrets
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Queue-based, level-gated logging (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT) - set up before anything logs
+from services.logging_config import configure_logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Import custom modules
-from services.airbnb_scraper import scrape_airbnb_images
-from services.pdf_generator import ModernPDF
-from services.email_service import send_email
-from services.str_optimizer import optimize_listing
-
-# Initialize Firebase Admin SDK
-try:
-    # Try to initialize Firebase Admin with default credentials
-    # For production, set GOOGLE_APPLICATION_CREDENTIALS env variable
-    if not firebase_admin._apps:
-        # Initialize with the same project as frontend
-        cred = credentials.Certificate({
-            "type": "service_account",
-            "project_id": "str-optimizer",
-            "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
-            "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
-            "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
-            "client_id": os.getenv("FIREBASE_CLIENT_ID"),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": os.getenv("FIREBASE_CERT_URL")
-        }) if os.getenv("FIREBASE_PRIVATE_KEY") else None
-        
-        if cred:
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Admin SDK initialized successfully")
-        else:
-            print("⚠️ Firebase Admin SDK not initialized - missing credentials")
-except Exception as e:
-    print(f"⚠️ Firebase Admin SDK initialization warning: {e}")
+from services.email_outbox import get_outbox_metrics, start_outbox_worker
+from services.report_links import verify_report_link
+from services.optimization_jobs import submit_optimization, wait_for_job
+from services.stripe_cache import cache_checkout_session, retrieve_checkout_session
+from services.user_directory import ensure_user_directory, query_users, list_users_direct, clamp_page_size, last_synced_at
+from services.session_store import get_session_store
+from services.admission import admission_control, get_admission_metrics
+from services.single_flight import single_flight, optimization_key
+from services.llm_gateway import get_gateway_metrics
+from services.llm_usage import usage_report
+from services.lazy_import import lazy_module
+from services.instrumentation import init_app as init_instrumentation, render_metrics, span
+
+def optimize_listing(form_data):
+    """
+    Run the optimization pipeline - its OpenAI, scraping and PDF stack is imported on first use.
+    Identical overlapping requests (double clicks, retries) share a single run.
+    """
+    from services.str_optimizer import optimize_listing as run_optimization
+    return single_flight(optimization_key(form_data), lambda: run_optimization(form_data))
+
+def configure_stripe(module):
+    module.api_key = os.getenv("STRIPE_SECRET_KEY")
+
+def initialize_firebase(module):
+    """Initialize the Firebase Admin SDK when firebase_admin is first used (admin endpoints)"""
+    try:
+        # Try to initialize Firebase Admin with default credentials
+        # For production, set GOOGLE_APPLICATION_CREDENTIALS env variable
+        if not module._apps:
+            # Initialize with the same project as frontend
+            cred = module.credentials.Certificate({
+                "type": "service_account",
+                "project_id": "str-optimizer",
+                "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
+                "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
+                "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
+                "client_id": os.getenv("FIREBASE_CLIENT_ID"),
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+                "client_x509_cert_url": os.getenv("FIREBASE_CERT_URL")
+            }) if os.getenv("FIREBASE_PRIVATE_KEY") else None
+        
+            if cred:
+                module.initialize_app(cred)
+                logger.info("✅ Firebase Admin SDK initialized successfully")
+            else:
+                logger.warning("⚠️ Firebase Admin SDK not initialized - missing credentials")
+    except Exception as e:
+        logger.warning(f"⚠️ Firebase Admin SDK initialization warning: {e}")
+
+# Heavy SDKs are imported on first use instead of at worker boot
+stripe = lazy_module('stripe', on_load=configure_stripe)
+firebase_admin = lazy_module('firebase_admin', on_load=initialize_firebase)
+firebase_auth = lazy_module('firebase_admin.auth')
+
+# /api/get-optimization-result blocks until the job finishes (as it always has), up to the
+# gunicorn timeout. Clients that poll pass ?wait=<seconds> and get a 202 while it's running;
+# their long-poll is capped below the Heroku router's 30s limit.
+OPTIMIZATION_BLOCKING_WAIT = float(os.getenv('OPTIMIZATION_BLOCKING_WAIT', '110'))
+OPTIMIZATION_RESULT_WAIT = float(os.getenv('OPTIMIZATION_RESULT_WAIT', '25'))
 
-# Store admin sessions (in production, use Redis or database)
-admin_sessions = {}
+# Admin sessions live in the shared session store (SESSION_STORE) so every worker sees them
+admin_sessions = get_session_store('admin')
+ADMIN_SESSION_TTL = int(os.getenv('ADMIN_SESSION_TTL', '3600'))
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
@@ -88,22 +112,24 @@ else:
     CORS(app, origins=allowed_origins)
 
 # Configure API keys
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    print("Warning: OPENAI_API_KEY not set. AI features will be limited.")
-    openai_api_key = "placeholder-key-for-development"
-    
-client = OpenAI(api_key=openai_api_key)
+if not os.getenv("OPENAI_API_KEY"):
+    logger.warning("Warning: OPENAI_API_KEY not set. AI features will be limited.")
 
 # Configure Stripe with debug logging
 stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
-print(f"🔑 Stripe Secret Key loaded: {'Yes' if stripe_secret_key else 'No'}")
+logger.debug(f"🔑 Stripe Secret Key loaded: {'Yes' if stripe_secret_key else 'No'}")
 if stripe_secret_key:
-    print(f"🔑 Stripe Key starts with: {stripe_secret_key[:10]}...")
+    logger.debug(f"🔑 Stripe Key starts with: {stripe_secret_key[:10]}...")
 else:
-    print("❌ No Stripe secret key found in environment")
-    
-stripe.api_key = stripe_secret_key
+    logger.warning("❌ No Stripe secret key found in environment")
+
+# Stage timing: Server-Timing header, per-request timing log line and /metrics histograms
+init_instrumentation(app)
+
+@app.before_request
+def ensure_background_workers():
+    # Threads started in the gunicorn master (preload_app) do not survive fork, so start them per worker
+    start_outbox_worker()
 
 @app.route('/')
 def index():
@@ -125,14 +151,48 @@ def health_check():
         }
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this worker: stage/request latency histograms and outbox gauges"""
+    gauges = {}
+    try:
+        outbox = get_outbox_metrics()
+        gauges = {
+            'str_email_outbox_pending': outbox['pending'],
+            'str_email_outbox_sending': outbox['sending'],
+            'str_email_outbox_failed': outbox['failed'],
+            'str_email_outbox_oldest_pending_age_seconds': outbox['oldest_pending_age_seconds'],
+        }
+    except Exception as e:
+        logger.warning(f"⚠️ Outbox metrics unavailable: {e}")
+    admission = get_admission_metrics()
+    gateway = get_gateway_metrics()
+    gauges['str_llm_concurrency_limit'] = gateway['concurrency_limit']
+    gauges['str_llm_in_flight'] = gateway['in_flight']
+    gauges['str_llm_breaker_open'] = int(gateway['breaker_state'] == 'open')
+    gauges['str_admission_in_flight'] = admission['in_flight']
+    gauges['str_admission_waiting'] = admission['waiting']
+    return render_metrics(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/email-outbox/metrics')
+def email_outbox_metrics():
+    """Email outbox queue depth and delivery stats"""
+    try:
+        return jsonify({'success': True, 'outbox': get_outbox_metrics()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Scrape Airbnb listing title and description
 @app.route('/api/scrape', methods=['POST'])
+@admission_control('scrape')
 def scrape():
     data = request.json
     url = data.get('url')
     try:
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=15)
+        from bs4 import BeautifulSoup
+        with span('scrape.listing'):
+            response = requests.get(url, headers=headers, timeout=15)
         soup = BeautifulSoup(response.text, 'html.parser')
 
         title = soup.find('meta', property='og:title')
@@ -147,6 +207,7 @@ def scrape():
         return jsonify({'error': str(e), 'success': False}), 500
 
 @app.route('/api/optimize', methods=['POST'])
+@admission_control('optimize', cost=5)
 def optimize():
     """Main optimization endpoint"""
     try:
@@ -169,24 +230,24 @@ def create_checkout_session():
         delivery_type = data.get('delivery_type')
         form_data = data.get('form_data', {})
 
-        print(f"=== STRIPE CHECKOUT DEBUG ===")
-        print(f"Creating checkout session for delivery_type: {delivery_type}")
-        print(f"Form data: {form_data}")
+        logger.debug(f"=== STRIPE CHECKOUT DEBUG ===")
+        logger.info(f"Creating checkout session for delivery_type: {delivery_type}")
+        logger.debug("Form data: %s", form_data)
         
         # Ensure Stripe API key is set
         stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
         if not stripe_secret_key:
-            print("❌ ERROR: Stripe API key not found in environment")
+            logger.warning("❌ ERROR: Stripe API key not found in environment")
             return jsonify({'error': 'Payment processing is not configured. Please contact support.'}), 500
         
         stripe.api_key = stripe_secret_key
-        print(f"🔑 Stripe API Key: {'Set' if stripe.api_key else 'Not Set'}")
+        logger.debug(f"🔑 Stripe API Key: {'Set' if stripe.api_key else 'Not Set'}")
         if stripe.api_key:
-            print(f"🔑 Stripe Key starts with: {stripe.api_key[:10]}...")
+            logger.debug(f"🔑 Stripe Key starts with: {stripe.api_key[:10]}...")
 
         # Check if Stripe is configured
         if not stripe.api_key:
-            print("ERROR: Stripe API key not configured")
+            logger.error("ERROR: Stripe API key not configured")
             return jsonify({'error': 'Payment processing is not configured. Please contact support.'}), 500
 
         # Set pricing based on delivery type
@@ -199,7 +260,7 @@ def create_checkout_session():
             product_description = 'Professional PDF report with email delivery'
             unit_amount = 1999  # $19.99
 
-        print(f"Product: {product_name}, Price: ${unit_amount/100}")
+        logger.debug(f"Product: {product_name}, Price: ${unit_amount/100}")
 
         # Get the server URL from environment variables - Updated fallback for Heroku
         server_url = os.getenv('SERVER_URL', 'https://str-optimizer-backend-7d9de05e5c57.herokuapp.com')
@@ -207,7 +268,7 @@ def create_checkout_session():
         cancel_url = server_url + '/api/payment-cancel'
 
         try:
-            print("🔄 Creating Stripe checkout session...")
+            logger.info("🔄 Creating Stripe checkout session...")
             checkout_session = stripe.checkout.Session.create(
                 payment_method_types=['card'],
                 line_items=[{
@@ -237,20 +298,77 @@ def create_checkout_session():
                     'description': form_data.get('description', '')
                 }
             )
-            print(f"✅ Stripe session created successfully: {checkout_session.id}")
+            logger.info(f"✅ Stripe session created successfully: {checkout_session.id}")
             return jsonify({'checkout_url': checkout_session.url})
         except Exception as stripe_error:
-            print(f"❌ Stripe session creation failed: {stripe_error}")
-            print(f"❌ Error type: {type(stripe_error)}")
+            logger.error(f"❌ Stripe session creation failed: {stripe_error}")
+            logger.error(f"❌ Error type: {type(stripe_error)}")
             raise stripe_error
 
     except stripe.StripeError as e:
-        print(f"❌ STRIPE ERROR: {e}")
+        logger.error(f"❌ STRIPE ERROR: {e}")
         return jsonify({'error': f'Payment processing error: {str(e)}'}), 500
     except Exception as e:
-        print(f"❌ UNEXPECTED ERROR: {e}")
+        logger.error(f"❌ UNEXPECTED ERROR: {e}")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+def checkout_form_data(metadata, session_id):
+    """Optimization inputs for a checkout session, from the metadata stored at checkout"""
+    delivery_type = metadata.get('delivery_type')
+    form_data = {
+        'url': metadata.get('url') or metadata.get('listingUrl'),  # Handle both keys
+        'email': metadata.get('email'),
+        'title': metadata.get('title'),
+        'description': metadata.get('description'),
+        'session_id': session_id,  # Dedupes the report email across repeated fetches
+        'tier': delivery_type  # For LLM usage accounting
+    }
+
+    if delivery_type == 'premium':
+        form_data['wants_pdf'] = True
+        form_data['wants_email'] = True
+    else:
+        form_data['wants_pdf'] = False
+        form_data['wants_email'] = False
+
+    return delivery_type, form_data
+
+@app.route('/api/stripe-webhook', methods=['POST'])
+def stripe_webhook():
+    """Stripe webhook: start the paid optimization as soon as checkout completes"""
+    webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
+    if not webhook_secret:
+        logger.error("❌ STRIPE_WEBHOOK_SECRET not configured - refusing unverified webhook")
+        return jsonify({'error': 'Webhook not configured'}), 503
+
+    payload = request.get_data()
+    try:
+        stripe.Webhook.construct_event(payload, request.headers.get('Stripe-Signature', ''), webhook_secret)
+        # Verified - read the event as plain JSON (Stripe objects aren't dicts in every SDK version)
+        event = json.loads(payload)
+    except ValueError as e:
+        logger.warning(f"⚠️ Invalid webhook payload: {e}")
+        return jsonify({'error': 'Invalid payload'}), 400
+    except stripe.SignatureVerificationError as e:
+        logger.warning(f"⚠️ Webhook signature verification failed: {e}")
+        return jsonify({'error': 'Invalid signature'}), 400
+
+    if event['type'] == 'checkout.session.completed':
+        checkout_session = event['data']['object']
+        session_id = checkout_session['id']
+        metadata = checkout_session.get('metadata') or {}
+        cache_checkout_session(session_id, checkout_session.get('payment_status'), metadata)
+
+        if checkout_session.get('payment_status') != 'paid':
+            logger.info(f"🧾 Checkout {session_id} completed but not paid yet - skipping")
+        elif not metadata.get('delivery_type'):
+            logger.warning(f"⚠️ Checkout {session_id} has no optimization metadata - skipping")
+        else:
+            delivery_type, form_data = checkout_form_data(metadata, session_id)
+            submit_optimization(session_id, form_data, delivery_type)
+
+    return jsonify({'received': True})
+
 @app.route('/api/payment-success')
 def payment_success():
     session_id = request.args.get('session_id')
@@ -260,49 +378,40 @@ def payment_success():
         return redirect(f'{frontend_url}/payment-error?error=missing_session_id')
 
     try:
-        # Retrieve the session from Stripe
-        stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
-        metadata = checkout_session.metadata
+        # Retrieve the session (cached locally once paid)
+        checkout_session = retrieve_checkout_session(session_id)
+        metadata = checkout_session['metadata']
 
         if not metadata or not metadata.get('delivery_type'):
             frontend_url = os.getenv('FRONTEND_URL', 'https://optimizemystr.com')
             return redirect(f'{frontend_url}/payment-error?error=invalid_session_data')
         
-        delivery_type = metadata.get('delivery_type')
-        form_data = {
-            'url': metadata.get('url') or metadata.get('listingUrl'),  # Handle both keys
-            'email': metadata.get('email'),
-            'title': metadata.get('title'),
-            'description': metadata.get('description')
-        }
-
-        print(f"🔍 Payment success - processing form data:")
-        print(f"  URL: {form_data['url']}")
-        print(f"  Email: {form_data['email']}")
-        print(f"  Title: {form_data['title']}")
-        print(f"  Description: {form_data['description'][:100] if form_data['description'] else 'None'}...")
+        delivery_type, form_data = checkout_form_data(metadata, session_id)
 
-        if delivery_type == 'premium':
-            form_data['wants_pdf'] = True
-            form_data['wants_email'] = True
-        else:
-            form_data['wants_pdf'] = False
-            form_data['wants_email'] = False
+        logger.debug(f"🔍 Payment success - processing form data:")
+        logger.debug(f"  URL: {form_data['url']}")
+        logger.debug(f"  Email: {form_data['email']}")
+        logger.debug(f"  Title: {form_data['title']}")
+        logger.debug(f"  Description: {form_data['description'][:100] if form_data['description'] else 'None'}...")
 
-        # Don't process optimization here - let frontend handle it with loading screen
-        # Just redirect immediately to show the beautiful loading experience
+        # Start the optimization now (if the webhook hasn't already) - the frontend's loading
+        # screen then waits on work that is already running
+        if checkout_session['payment_status'] == 'paid':
+            try:
+                submit_optimization(session_id, form_data, delivery_type)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not queue optimization for {session_id}: {e}")
         
         # Redirect to frontend success page with session_id
         frontend_url = os.getenv('FRONTEND_URL', 'https://optimizemystr.com')
         return redirect(f'{frontend_url}/payment-success?session_id={session_id}')
         
     except stripe.StripeError as e:
-        print(f"❌ Stripe error in payment success: {e}")
+        logger.error(f"❌ Stripe error in payment success: {e}")
         frontend_url = os.getenv('FRONTEND_URL', 'https://optimizemystr.com')
         return redirect(f'{frontend_url}/payment-error?error=stripe_error')
     except Exception as e:
-        print(f"❌ Unexpected error in payment success: {e}")
+        logger.error(f"❌ Unexpected error in payment success: {e}")
         frontend_url = os.getenv('FRONTEND_URL', 'https://optimizemystr.com')
         return redirect(f'{frontend_url}/payment-error?error=unexpected_error')
 
@@ -310,58 +419,60 @@ def payment_success():
 @app.route('/api/get-optimization-result/<session_id>')
 def get_optimization_result(session_id):
     try:
-        print(f"🔍 Fetching optimization result for session: {session_id}")
+        logger.info(f"🔍 Fetching optimization result for session: {session_id}")
         
         # Validate session ID format
         if not session_id or not session_id.startswith('cs_'):
             return jsonify({'error': 'Invalid session ID format'}), 400
             
-        # Retrieve the session from Stripe and process optimization
-        stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-        
+        # Retrieve the session (cached locally once paid, so polling doesn't hit Stripe) and process optimization
         try:
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            checkout_session = retrieve_checkout_session(session_id)
         except stripe.InvalidRequestError as e:
-            print(f"❌ Stripe session error: {e}")
+            logger.error(f"❌ Stripe session error: {e}")
             return jsonify({'error': 'Payment session has expired or is invalid. Please try making a new payment.'}), 400
             
-        metadata = checkout_session.metadata
-        print(f"🔍 Session metadata: {metadata}")
+        metadata = checkout_session['metadata']
+        logger.debug("🔍 Session metadata: %s", metadata)
 
         if not metadata or not metadata.get('delivery_type'):
             return jsonify({'error': 'Payment session is missing required data. Please contact support.'}), 400
         
-        delivery_type = metadata.get('delivery_type')
-        form_data = {
-            'url': metadata.get('url') or metadata.get('listingUrl'),
-            'email': metadata.get('email'),
-            'title': metadata.get('title'),
-            'description': metadata.get('description')
-        }
+        delivery_type, form_data = checkout_form_data(metadata, session_id)
+
+        logger.info(f"🔍 Processing optimization for {delivery_type} package")
+        logger.debug("🔍 Form data: %s", form_data)
 
-        print(f"🔍 Processing optimization for {delivery_type} package")
-        print(f"🔍 Form data: {form_data}")
+        # Usually already queued or finished by the webhook / payment redirect; this is a no-op then
+        submit_optimization(session_id, form_data, delivery_type)
 
-        if delivery_type == 'premium':
-            form_data['wants_pdf'] = True
-            form_data['wants_email'] = True
+        # Block until the background job is done, unless the client polls (?wait=0 returns immediately)
+        if 'wait' in request.args:
+            wait = min(max(0.0, request.args.get('wait', OPTIMIZATION_RESULT_WAIT, type=float)), OPTIMIZATION_RESULT_WAIT)
         else:
-            form_data['wants_pdf'] = False
-            form_data['wants_email'] = False
+            wait = OPTIMIZATION_BLOCKING_WAIT
+        job = wait_for_job(session_id, wait)
 
-        result = optimize_listing(form_data)
-        result['package_type'] = delivery_type
+        if job['status'] == 'done':
+            logger.info(f"✅ Optimization completed successfully")
+            return jsonify({
+                'success': True,
+                'data': job['result']
+            })
+        if job['status'] == 'failed':
+            logger.error(f"❌ Optimization failed for {session_id}: {job['error']}")
+            return jsonify({'error': 'An unexpected error occurred. Please try again or contact support.'}), 500
 
-        print(f"✅ Optimization completed successfully")
         return jsonify({
-            'success': True,
-            'data': result
-        })
+            'success': False,
+            'status': job['status'],
+            'message': 'Your optimization is still being prepared. Please check back in a few seconds.'
+        }), 202
     except stripe.StripeError as e:
-        print(f"❌ Stripe API error: {e}")
+        logger.error(f"❌ Stripe API error: {e}")
         return jsonify({'error': 'Payment system error. Please contact support.'}), 500
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.error(f"❌ Unexpected error: {e}")
         return jsonify({'error': 'An unexpected error occurred. Please try again or contact support.'}), 500
 
 @app.route('/api/payment-cancel')
@@ -386,12 +497,21 @@ def payment_cancel_redirect():
 def download(filename):
     """Download PDF files with proper error handling"""
     try:
-        print(f"📥 Download request for: {filename}")
+        logger.info(f"📥 Download request for: {filename}")
         
         # Security check - only allow PDF files
         if not filename.endswith('.pdf'):
-            print(f"❌ Invalid file type requested: {filename}")
+            logger.error(f"❌ Invalid file type requested: {filename}")
             return jsonify({'error': 'Only PDF files are allowed'}), 400
+
+        # Signed links (emailed or returned with the result) must be unexpired and untampered
+        valid, reason = verify_report_link(filename, request.args.get('expires'), request.args.get('signature'))
+        if not valid:
+            logger.error(f"❌ Download link rejected for {filename}: {reason}")
+            return jsonify({
+                'error': 'Download link is invalid or has expired',
+                'message': 'Please request a new report link.'
+            }), 403
         
         # Check multiple possible locations for the file
         possible_paths = [
@@ -404,16 +524,16 @@ def download(filename):
         for path in possible_paths:
             if path and os.path.exists(path):
                 file_path = path
-                print(f"✅ Found file at: {file_path}")
+                logger.debug(f"✅ Found file at: {file_path}")
                 break
         
         if not file_path:
-            print(f"❌ File not found in any location: {filename}")
-            print(f"   Checked paths: {[p for p in possible_paths if p]}")
+            logger.warning(f"❌ File not found in any location: {filename}")
+            logger.debug(f"   Checked paths: {[p for p in possible_paths if p]}")
             # List files in temp directory for debugging
             temp_files = os.listdir(tempfile.gettempdir())
             pdf_files = [f for f in temp_files if f.endswith('.pdf')]
-            print(f"   Available PDF files in temp: {pdf_files[:5]}")  # Show first 5
+            logger.debug(f"   Available PDF files in temp: {pdf_files[:5]}")  # Show first 5
             return jsonify({
                 'error': 'File not found',
                 'message': 'The PDF file may have expired or been cleaned up. Please regenerate your report.',
@@ -422,10 +542,10 @@ def download(filename):
         
         # Check file size and permissions
         file_size = os.path.getsize(file_path)
-        print(f"📊 File size: {file_size} bytes")
+        logger.debug(f"📊 File size: {file_size} bytes")
         
         if file_size == 0:
-            print(f"❌ File is empty: {file_path}")
+            logger.error(f"❌ File is empty: {file_path}")
             return jsonify({'error': 'File is empty or corrupted'}), 500
         
         # Send file with proper headers
@@ -437,35 +557,35 @@ def download(filename):
         )
         
     except FileNotFoundError as e:
-        print(f"❌ FileNotFoundError: {e}")
+        logger.error(f"❌ FileNotFoundError: {e}")
         return jsonify({
             'error': 'File not found',
             'message': 'The PDF file may have been cleaned up. Please regenerate your report.'
         }), 404
     except Exception as e:
-        print(f"❌ Download error: {e}")
+        logger.error(f"❌ Download error: {e}")
         return jsonify({'error': f'Download failed: {str(e)}'}), 500
 
 @app.route('/api/test-stripe')
 def test_stripe():
     """Test Stripe configuration"""
     try:
-        print("🧪 Testing Stripe configuration...")
+        logger.debug("🧪 Testing Stripe configuration...")
         
         # Ensure Stripe API key is set
         stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
         if not stripe_secret_key:
-            print("❌ ERROR: Stripe API key not found in environment")
+            logger.warning("❌ ERROR: Stripe API key not found in environment")
             return jsonify({'error': 'Stripe API key not configured'}), 500
         
         stripe.api_key = stripe_secret_key
-        print(f"🔑 Stripe API Key: {'Set' if stripe.api_key else 'Not Set'}")
+        logger.debug(f"🔑 Stripe API Key: {'Set' if stripe.api_key else 'Not Set'}")
         if stripe.api_key:
-            print(f"🔑 Key starts with: {stripe.api_key[:10]}...")
+            logger.debug(f"🔑 Key starts with: {stripe.api_key[:10]}...")
         
         # Test a simple Stripe API call
         account = stripe.Account.retrieve()
-        print(f"✅ Stripe account test successful: {account.id}")
+        logger.info(f"✅ Stripe account test successful: {account.id}")
         
         return jsonify({
             'success': True,
@@ -473,7 +593,7 @@ def test_stripe():
             'account_id': account.id
         })
     except Exception as e:
-        print(f"❌ Stripe test failed: {e}")
+        logger.error(f"❌ Stripe test failed: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -486,7 +606,7 @@ def test_email():
         data = request.get_json()
         test_email_addr = data.get('email', 'test@example.com')
         
-        print(f"🧪 Testing email to: {test_email_addr}")
+        logger.debug(f"🧪 Testing email to: {test_email_addr}")
         
         from services.email_service import send_email
         result = send_email(
@@ -503,31 +623,32 @@ def test_email():
             return jsonify({"status": "error", "message": "Email sending failed"}), 500
             
     except Exception as e:
-        print(f"❌ Email test error: {e}")
+        logger.error(f"❌ Email test error: {e}")
         return jsonify({"status": "error", "message": f"Email test failed: {str(e)}"}), 500
 
 # Test endpoint for PDF generation debugging
 @app.route('/api/test-pdf-generation')
+@admission_control('test-pdf', cost=5)
 def test_pdf_generation():
     try:
-        print("🧪 Testing PDF generation...")
+        logger.debug("🧪 Testing PDF generation...")
         
         # Check Playwright installation
         import subprocess
         try:
             playwright_check = subprocess.run(['python', '-m', 'playwright', '--version'], 
                                             capture_output=True, text=True, timeout=10)
-            print(f"🧪 Playwright version: {playwright_check.stdout.strip()}")
+            logger.debug(f"🧪 Playwright version: {playwright_check.stdout.strip()}")
         except Exception as e:
-            print(f"❌ Playwright check failed: {e}")
+            logger.error(f"❌ Playwright check failed: {e}")
         
         # Check if chromium is available
         try:
             chromium_check = subprocess.run(['python', '-m', 'playwright', 'install', '--dry-run'], 
                                           capture_output=True, text=True, timeout=10)
-            print(f"🧪 Playwright install check: {chromium_check.stdout.strip()}")
+            logger.debug(f"🧪 Playwright install check: {chromium_check.stdout.strip()}")
         except Exception as e:
-            print(f"❌ Chromium check failed: {e}")
+            logger.error(f"❌ Chromium check failed: {e}")
         
         # Create test form data with premium settings
         form_data = {
@@ -539,11 +660,11 @@ def test_pdf_generation():
             'wants_email': False
         }
         
-        print("🧪 Calling optimize_listing with test data...")
+        logger.debug("🧪 Calling optimize_listing with test data...")
         result = optimize_listing(form_data)
         
-        print(f"🧪 Result keys: {list(result.keys())}")
-        print(f"🧪 PDF download URL: {result.get('pdf_download_url', 'NOT FOUND')}")
+        logger.debug(f"🧪 Result keys: {list(result.keys())}")
+        logger.debug(f"🧪 PDF download URL: {result.get('pdf_download_url', 'NOT FOUND')}")
         
         return jsonify({
             'success': True,
@@ -554,9 +675,8 @@ def test_pdf_generation():
         })
         
     except Exception as e:
-        print(f"❌ PDF test error: {e}")
+        logger.exception(f"❌ PDF test error: {e}")
         import traceback
-        traceback.print_exc()
         return jsonify({
             'success': False,
             'error': str(e),
@@ -658,65 +778,57 @@ def verify_admin_code():
         
         # Verify the code
         if provided_code == admin_secret:
-            # Generate a session token
-            session_token = secrets.token_urlsafe(32)
-            
-            # Store session (expires in 1 hour)
-            admin_sessions[session_token] = {
-                'created_at': time.time(),
-                'expires_at': time.time() + 3600  # 1 hour
-            }
+            # Generate and store a session token (expires after ADMIN_SESSION_TTL, 1 hour by default)
+            session_token = admin_sessions.create({'role': 'admin'}, ADMIN_SESSION_TTL)
             
-            print(f"✅ Admin authenticated successfully")
+            logger.info(f"✅ Admin authenticated successfully")
             return jsonify({
                 'success': True,
                 'token': session_token,
                 'message': 'Authentication successful'
             })
         else:
-            print(f"❌ Invalid admin code attempt")
+            logger.error(f"❌ Invalid admin code attempt")
             return jsonify({
                 'success': False,
                 'error': 'Invalid admin code'
             }), 401
             
     except Exception as e:
-        print(f"❌ Admin verification error: {e}")
+        logger.error(f"❌ Admin verification error: {e}")
         return jsonify({
             'success': False,
             'error': 'Verification failed'
         }), 500
 
+def admin_auth_error():
+    """401 response if the request lacks a valid admin session token, otherwise None"""
+    auth_header = request.headers.get('Authorization', '')
+    
+    if not auth_header.startswith('Bearer '):
+        return jsonify({
+            'success': False,
+            'error': 'Missing authentication token'
+        }), 401
+    
+    token = auth_header.replace('Bearer ', '')
+    
+    # Check if token exists and is not expired
+    if not admin_sessions.get(token):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid or expired session'
+        }), 401
+    return None
+
 @app.route('/api/admin/users', methods=['GET'])
 def get_admin_users():
-    """Get all Firebase users (admin only)"""
+    """List Firebase users (admin only), with optional search, sort, order, page and pageSize"""
     try:
         # Verify admin session token
-        auth_header = request.headers.get('Authorization', '')
-        
-        if not auth_header.startswith('Bearer '):
-            return jsonify({
-                'success': False,
-                'error': 'Missing authentication token'
-            }), 401
-        
-        token = auth_header.replace('Bearer ', '')
-        
-        # Check if token exists and is not expired
-        session = admin_sessions.get(token)
-        if not session:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid or expired session'
-            }), 401
-        
-        if session['expires_at'] < time.time():
-            # Clean up expired session
-            del admin_sessions[token]
-            return jsonify({
-                'success': False,
-                'error': 'Session expired'
-            }), 401
+        auth_error = admin_auth_error()
+        if auth_error:
+            return auth_error
         
         # Check if Firebase Admin is initialized
         if not firebase_admin._apps:
@@ -725,44 +837,65 @@ def get_admin_users():
                 'error': 'Firebase Admin not initialized. Please configure Firebase credentials.'
             }), 500
         
-        # Fetch all users from Firebase
-        users_list = []
-        page = firebase_auth.list_users()
-        
-        while page:
-            for user in page.users:
-                users_list.append({
-                    'uid': user.uid,
-                    'email': user.email or 'N/A',
-                    'displayName': user.display_name or 'N/A',
-                    'emailVerified': user.email_verified,
-                    'disabled': user.disabled,
-                    'createdAt': user.user_metadata.creation_timestamp if user.user_metadata else None,
-                    'lastSignInAt': user.user_metadata.last_sign_in_timestamp if user.user_metadata else None,
-                    'photoURL': user.photo_url or None,
-                    'phoneNumber': user.phone_number or None,
-                    'providerData': [{'providerId': p.provider_id, 'uid': p.uid} for p in user.provider_data]
-                })
-            
-            # Get next page
-            page = page.get_next_page()
-        
-        print(f"✅ Retrieved {len(users_list)} Firebase users for admin")
+        # Served from the local user directory (synced from Firebase in the background);
+        # straight from Firebase only while another worker's first sync is still running
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = clamp_page_size(request.args.get('pageSize', type=int))
+        filters = {
+            'search': request.args.get('search'),
+            'sort': request.args.get('sort', 'createdAt'),
+            'order': request.args.get('order', 'desc'),
+            'page': page,
+            'page_size': page_size
+        }
+        if ensure_user_directory(firebase_auth):
+            users_list, total = query_users(**filters)
+        else:
+            users_list, total = list_users_direct(firebase_auth, **filters)
+
+        logger.info(f"✅ Retrieved {len(users_list)} of {total} users for admin")
         return jsonify({
             'success': True,
             'users': users_list,
-            'total': len(users_list)
+            'total': total,
+            'page': page,
+            'pageSize': page_size,
+            'syncedAt': last_synced_at()
         })
         
     except Exception as e:
-        print(f"❌ Error fetching users: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error fetching users: {e}")
         return jsonify({
             'success': False,
             'error': f'Failed to fetch users: {str(e)}'
         }), 500
 
+@app.route('/api/admin/llm-usage', methods=['GET'])
+def get_llm_usage():
+    """OpenAI token usage and estimated cost (admin only), grouped by section, tier, day, model or request"""
+    try:
+        auth_error = admin_auth_error()
+        if auth_error:
+            return auth_error
+        
+        group_by = request.args.get('groupBy', 'section')
+        days = request.args.get('days', 7, type=int)
+        report = usage_report(group_by, days, request.args.get('limit', 100, type=int))
+        return jsonify({
+            'success': True,
+            'groupBy': group_by,
+            'days': days,
+            'usage': report,
+            'totalCostUsd': round(sum(row['cost_usd'] for row in report), 4)
+        })
+        
+    except Exception as e:
+        logger.exception(f"❌ Error building LLM usage report: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to build usage report: {str(e)}'
+        }), 500
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
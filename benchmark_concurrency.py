@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the gunicorn setup.
+
+Starts gunicorn with gunicorn_config.py on a free local port. Each optimization is replaced
+by a fixed sleep, standing in for the time spent waiting on OpenAI. The script fires a burst
+of concurrent /api/optimize requests and polls /health during the burst. It reports the
+burst's wall time and the /health latency. With threaded workers the burst takes about
+one optimization's time. With GUNICORN_WORKER_CLASS=sync GUNICORN_THREADS=1 the requests run
+one after another.
+
+Admission control (ADMISSION_MAX_CONCURRENT) is off by default so the benchmark measures the
+web tier; --admission keeps it on.
+
+Usage: python benchmark_concurrency.py [--requests 30] [--seconds 5] [--admission]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# App module gunicorn loads: the real app, with the optimization pipeline swapped for a sleep
+PROBE_APP = """
+import os, time
+import services.str_optimizer as str_optimizer
+
+def optimize_listing(form_data):
+    time.sleep(float(os.environ['BENCHMARK_OPTIMIZE_SECONDS']))
+    return {'title': form_data.get('title')}
+
+str_optimizer.optimize_listing = optimize_listing
+from app import app
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(f"{base_url}/health", timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not answer /health in time")
+
+def post_optimize(base_url, i):
+    # Distinct listings, so single-flight doesn't merge the requests
+    body = json.dumps({'title': f'Benchmark listing {i}', 'description': 'x', 'url': f'https://example.com/{i}'}).encode()
+    request = urllib.request.Request(f"{base_url}/api/optimize", data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+def poll_health(base_url, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            urllib.request.urlopen(f"{base_url}/health", timeout=60).read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=30, help='concurrent optimizations (default 30)')
+    parser.add_argument('--seconds', type=float, default=5, help='duration of each optimization (default 5)')
+    parser.add_argument('--admission', action='store_true', help='keep admission control on')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix='str-benchmark-')
+    with open(os.path.join(workdir, 'benchmark_app.py'), 'w') as f:
+        f.write(PROBE_APP)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ,
+               PORT=str(port),
+               PYTHONPATH=os.pathsep.join([workdir, root, os.environ.get('PYTHONPATH', '')]),
+               STR_DATA_DIR=os.path.join(workdir, 'data'),
+               BENCHMARK_OPTIMIZE_SECONDS=str(args.seconds))
+    if not args.admission:
+        env['ADMISSION_ENABLED'] = 'false'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py', '--pid', os.path.join(workdir, 'gunicorn.pid'),
+         '--access-logfile', os.devnull, 'benchmark_app:app'],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        wait_until_up(base_url, process)
+        stop, health = threading.Event(), []
+        poller = threading.Thread(target=poll_health, args=(base_url, stop, health), daemon=True)
+        poller.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.requests) as pool:
+            results = list(pool.map(lambda i: post_optimize(base_url, i), range(args.requests)))
+        wall = time.perf_counter() - start
+        stop.set()
+        poller.join()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    print(f"⚡ {args.requests} concurrent {args.seconds:g}s optimizations "
+          f"({worker_class}, {os.environ.get('WEB_CONCURRENCY', '1')} worker(s), "
+          f"{os.environ.get('GUNICORN_THREADS', '32')} threads{', admission on' if args.admission else ''})")
+    print(f"   burst wall time:  {wall:8.2f} s")
+    print(f"   slowest request:  {max(t for _, t in results):8.2f} s")
+    print(f"   statuses:         {', '.join(f'{code} x{count}' for code, count in sorted(statuses.items()))}")
+    if health:
+        print(f"   /health p50/max:  {statistics.median(health) * 1000:6.0f} / {max(health) * 1000:.0f} ms ({len(health)} probes)")
+    else:
+        print("   /health:          no answer during the burst")
+
+if __name__ == '__main__':
+    main()
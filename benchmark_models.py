@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Per-section model benchmark for the optimization prompts.
+
+record: runs one optimization against a recording client (no API calls) and saves every
+        section's routed request - messages, model, temperature, max_tokens - as JSON lines.
+replay: sends the saved requests to each candidate model and reports latency, token use,
+        estimated cost and output validity per section and model. By default requests go to
+        a local OpenAI-compatible stand-in (checks the harness and the validators, not the
+        models); --live uses the real API with OPENAI_API_KEY.
+
+Usage: python benchmark_models.py record [--listing listing.json] [--out benchmarks/prompts.jsonl]
+       python benchmark_models.py replay [--prompts benchmarks/prompts.jsonl] [--models gpt-3.5-turbo,gpt-4o-mini]
+                                         [--runs 3] [--sections title,rating] [--live] [--out results.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.llm_usage import cost_of
+from services.text_compression import count_tokens
+from services.title_ranking import parse_candidates
+
+DEFAULT_PROMPTS = os.path.join('benchmarks', 'prompts.jsonl')
+
+SAMPLE_LISTING = {
+    'url': 'https://www.airbnb.com/rooms/12345678',
+    'title': 'Riverside Cabin with Hot Tub',
+    'description': (
+        'Cozy two-bedroom cabin on the French Broad River, 15 minutes from downtown Asheville. '
+        'Soak in the private hot tub, gather around the fire pit, or watch the sunset from the deck. '
+        'Fully equipped kitchen, fast wifi, king bed in the main room and a loft for the kids.'
+    ),
+    'reviews': '',
+}
+
+# Review fragments combined into a review set large enough for map-reduce sentiment
+# (over SENTIMENT_MAP_REDUCE_TOKENS), so the sentiment_map and reduce prompts are recorded too
+REVIEW_OPENERS = [
+    'Beautiful spot right on the river.', 'Super clean and cozy.', 'Perfect getaway, quiet and peaceful.',
+    'Our second stay here and it was just as good.', 'Great place for a family weekend.',
+    'Not quite what the photos showed.', 'Lovely cabin with a lot of character.', 'A relaxing base for exploring Asheville.',
+    'Mixed feelings about this one.', 'Exactly what we needed after a long week.',
+]
+REVIEW_DETAILS = [
+    'The hot tub was amazing after a day of hiking.', 'Host was very responsive and check-in was easy.',
+    'The road in is a bit steep and hard to drive after rain.', 'Wifi was slow at night and dropped during calls.',
+    'Kitchen had everything we needed to cook dinner.', 'The loft bed was cramped and the mattress was worn.',
+    'Loved the deck and the fire pit by the water.', 'The bathroom was dated and smelled musty.',
+    'Beds were comfortable and the linens were spotless.', 'It was loud on Saturday night from the neighbors.',
+    'Fast drive to downtown breweries and restaurants.',
+]
+REVIEW_CLOSERS = [
+    'Would definitely stay again.', 'Highly recommend for couples.', 'Good value for the price.',
+    'Some fixes would make it perfect.', 'The kids did not want to leave.', 'Bring bug spray for the evenings.',
+]
+
+def sample_reviews(count=110):
+    reviews = []
+    for i in range(count):
+        details = (REVIEW_DETAILS[i % len(REVIEW_DETAILS)], REVIEW_DETAILS[(i * 3 + 1) % len(REVIEW_DETAILS)])
+        reviews.append(' '.join((REVIEW_OPENERS[i % len(REVIEW_OPENERS)], *details, REVIEW_CLOSERS[i % len(REVIEW_CLOSERS)])))
+    return '\n\n'.join(reviews)
+
+SAMPLE_LISTING['reviews'] = sample_reviews()
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_percentage(value):
+    # The percentages prompt asks for "10-30" style ranges; plain numbers are accepted too
+    return _is_number(value) or (isinstance(value, str) and bool(re.search(r'\d', value)))
+
+def _is_priority(value):
+    return isinstance(value, str) and value.strip().upper() in ('HIGH', 'MEDIUM', 'LOW')
+
+# Sections whose reply the code parses as JSON: the fields the report and later prompts read,
+# each with a check of its value
+JSON_FIELDS = {
+    'market': {'market_insights': lambda value: isinstance(value, list) and bool(value)},
+    'scores': dict.fromkeys(('market_positioning', 'amenity_score', 'visual_score', 'experience_score'), _is_number),
+    'revenue': dict.fromkeys(('booking_improvement', 'revenue_impact'), _is_number),
+    'percentages': dict.fromkeys(('conversion_rate', 'average_rate_adjustment', 'minimum_stay_revenue', 'holiday_premium',
+                                  'midweek_discount', 'lastminute_discount', 'extended_stay_discount',
+                                  'early_bird_discount'), _is_percentage),
+    'priorities': dict.fromkeys(('title_priority', 'pricing_priority', 'photo_priority', 'experience_priority',
+                                 'booking_priority'), _is_priority),
+}
+
+def _has_fields(text, fields):
+    try:
+        data = json.loads(text.strip())
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(data, dict) and all(key in data and check(data[key]) for key, check in fields.items())
+
+def _is_rating(text):
+    match = re.search(r'(\d+\.?\d*)', text or '')
+    return bool(match) and 3.5 <= float(match.group(1)) <= 5.0
+
+# Output checks per section: does the reply have the shape the report code expects?
+VALIDATORS = {
+    'title': lambda text: len(parse_candidates(text)) >= 3,
+    'location': lambda text: 0 < len(text.strip()) <= 80 and '\n' not in text.strip(),
+    'rating': _is_rating,
+    'sentiment': lambda text: all(h in text for h in ('Recurring Praise', 'Common Complaints', 'Sentiment Trends')),
+    'sentiment_map': lambda text: all(label in text for label in ('Praise:', 'Complaints:', 'Emotional drivers:')),
+}
+
+def is_valid(section, text):
+    if section in JSON_FIELDS:
+        return _has_fields(text, JSON_FIELDS[section])
+    return bool(VALIDATORS.get(section, lambda t: bool(t and t.strip()))(text))
+
+# ---------------------------------------------------------------- record
+
+def record(listing, out_path):
+    """Run one optimization with a fake client, saving each section's routed request"""
+    from services import str_optimizer
+    from services.model_routing import apply_route
+
+    recorded = []
+    lock = threading.Lock()
+
+    def recording_completion(client, section, **kwargs):
+        kwargs = apply_route(section, kwargs)
+        with lock:
+            recorded.append({'section': section, 'request': kwargs})
+        content = stub_reply(kwargs, section)
+        return SimpleNamespace(model=kwargs.get('model'), usage=None,
+                               choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    originals = (str_optimizer.chat_completion, str_optimizer.get_openai_client, str_optimizer.scrape_airbnb_images)
+    str_optimizer.chat_completion = recording_completion
+    str_optimizer.get_openai_client = lambda: SimpleNamespace()
+    str_optimizer.scrape_airbnb_images = lambda url, max_images=3: ['https://example.com/photo.jpg']
+    try:
+        str_optimizer.optimize_listing(dict(listing))
+    finally:
+        str_optimizer.chat_completion, str_optimizer.get_openai_client, str_optimizer.scrape_airbnb_images = originals
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w') as f:
+        for entry in sorted(recorded, key=lambda e: e['section']):
+            f.write(json.dumps(entry) + '\n')
+    print(f"📝 Recorded {len(recorded)} section requests to {out_path}")
+    if not any(entry['section'] == 'sentiment_map' for entry in recorded):
+        print("⚠️ The listing's reviews were too short for map-reduce sentiment - sentiment_map was not recorded")
+
+# ---------------------------------------------------------------- local stand-in
+
+# Well-formed replies for the JSON sections, with every field JSON_FIELDS checks
+STUB_JSON = {
+    'market': {'price_range_min': 140, 'price_range_max': 260, 'currency': 'USD',
+               'market_insights': ['Riverside cabins book out on autumn weekends.',
+                                   'Price weekdays below weekends to fill gaps.',
+                                   'Hot tub listings earn a premium in winter.']},
+    'scores': {'market_positioning': 78, 'amenity_score': 84, 'visual_score': 71, 'experience_score': 88},
+    'revenue': {'booking_improvement': 22, 'revenue_impact': 18, 'occupancy_rates': [45, 35, 20],
+                'seasonal_adjustments': {'peak_increase': 35, 'off_season_decrease': 20, 'weekend_premium': 25}},
+    'percentages': {'search_visibility': '10-30', 'conversion_rate': '15-35', 'average_rate_adjustment': '20-40',
+                    'review_probability': '30-70', 'midweek_discount': '12-18', 'lastminute_discount': '7-12',
+                    'monthly_discount': '15-30', 'seasonal_adjustment': '5-20', 'minimum_stay_revenue': '35-50',
+                    'holiday_premium': '40-60', 'extended_stay_discount': '18-22', 'early_bird_discount': '8-12'},
+    'priorities': {'title_priority': 'HIGH', 'pricing_priority': 'MEDIUM', 'photo_priority': 'HIGH',
+                   'experience_priority': 'LOW', 'booking_priority': 'MEDIUM'},
+}
+
+def stub_reply(request, section=None):
+    """A well-formed answer for the request's expected shape (the stand-in doesn't judge quality)"""
+    prompt = request['messages'][-1]['content']
+    if section in STUB_JSON:
+        return json.dumps(STUB_JSON[section])
+    if request.get('response_format') or '"titles"' in prompt:
+        return json.dumps({'titles': [f'Riverside Asheville Cabin Option {i}' for i in range(1, 9)]})
+    if section == 'sentiment_map':
+        return 'Praise: hot tub (12), river views (9)\nComplaints: steep road (6), slow wifi (5)\nEmotional drivers: relaxing, cozy'
+    if 'rating number' in prompt:
+        return '4.6'
+    if 'Return only the location' in prompt:
+        return 'Asheville, USA'
+    headers = re.findall(r'\*\*[^*\n]+\*\*', prompt)
+    return '\n'.join(f"{header}\n- Stub point" for header in headers) or 'Stub answer.'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    POST /v1/chat/completions, answered like the OpenAI API after a size-dependent delay
+    (replay names the section in an X-Benchmark-Section header)
+    """
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))))
+        content = stub_reply(request, self.headers.get('X-Benchmark-Section'))
+        prompt_tokens = sum(count_tokens(m.get('content') if isinstance(m.get('content'), str) else json.dumps(m.get('content')))
+                            for m in request['messages'])
+        completion_tokens = count_tokens(content)
+        time.sleep(0.02 + 0.001 * completion_tokens)
+        body = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ---------------------------------------------------------------- replay
+
+def replay(prompts_path, models, runs, sections, live):
+    from openai import OpenAI
+
+    with open(prompts_path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if sections:
+        entries = [e for e in entries if e['section'] in sections]
+
+    server = None
+    if live:
+        if not os.getenv('OPENAI_API_KEY'):
+            sys.exit("❌ --live needs OPENAI_API_KEY")
+        client = OpenAI(max_retries=0, timeout=120)
+    else:
+        server = start_stub_server()
+        client = OpenAI(api_key='stub', base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", max_retries=0)
+
+    samples = {}
+    try:
+        for entry in entries:
+            for model in models:
+                for _ in range(runs):
+                    request = dict(entry['request'], model=model)
+                    start = time.perf_counter()
+                    try:
+                        response = client.chat.completions.create(
+                            **request, extra_headers={'X-Benchmark-Section': entry['section']})
+                    except Exception as e:
+                        samples.setdefault((entry['section'], model), []).append({'error': str(e)})
+                        continue
+                    latency = time.perf_counter() - start
+                    usage = response.usage
+                    samples.setdefault((entry['section'], model), []).append({
+                        'latency': latency,
+                        'prompt_tokens': usage.prompt_tokens if usage else 0,
+                        'completion_tokens': usage.completion_tokens if usage else 0,
+                        'valid': is_valid(entry['section'], response.choices[0].message.content or ''),
+                    })
+    finally:
+        if server:
+            server.shutdown()
+    return summarize(samples)
+
+def summarize(samples):
+    rows = []
+    for (section, model), runs in sorted(samples.items()):
+        ok = [r for r in runs if 'error' not in r]
+        latencies = sorted(r['latency'] for r in ok)
+        prompt = statistics.mean(r['prompt_tokens'] for r in ok) if ok else 0
+        completion = statistics.mean(r['completion_tokens'] for r in ok) if ok else 0
+        rows.append({
+            'section': section,
+            'model': model,
+            'runs': len(runs),
+            'errors': len(runs) - len(ok),
+            'latency_p50': statistics.median(latencies) if latencies else None,
+            'latency_max': latencies[-1] if latencies else None,
+            'prompt_tokens': round(prompt),
+            'completion_tokens': round(completion),
+            'cost_usd': cost_of(model, prompt, completion),
+            'valid_rate': sum(r['valid'] for r in ok) / len(runs) if runs else 0,
+        })
+    return rows
+
+def print_report(rows, live):
+    print(f"📊 Section benchmark ({'live API' if live else 'local stand-in - timings exercise the harness only'})")
+    print(f"   {'section':<14} {'model':<16} {'p50 ms':>8} {'max ms':>8} {'in tok':>7} {'out tok':>7} {'$/call':>9} {'valid':>6}")
+    for row in rows:
+        p50 = f"{row['latency_p50'] * 1000:8.0f}" if row['latency_p50'] is not None else f"{'-':>8}"
+        worst = f"{row['latency_max'] * 1000:8.0f}" if row['latency_max'] is not None else f"{'-':>8}"
+        print(f"   {row['section']:<14} {row['model']:<16} {p50} {worst} {row['prompt_tokens']:7d} "
+              f"{row['completion_tokens']:7d} {row['cost_usd']:9.5f} {row['valid_rate']:6.0%}"
+              + (f"  ({row['errors']} errors)" if row['errors'] else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help='save the routed request of every section')
+    rec.add_argument('--listing', help='JSON file with title/description/reviews/url (default: built-in sample)')
+    rec.add_argument('--out', default=DEFAULT_PROMPTS)
+    rep = commands.add_parser('replay', help='replay saved requests against candidate models')
+    rep.add_argument('--prompts', default=DEFAULT_PROMPTS)
+    rep.add_argument('--models', default='gpt-3.5-turbo,gpt-4o-mini', help='comma-separated (default gpt-3.5-turbo,gpt-4o-mini)')
+    rep.add_argument('--runs', type=int, default=3, help='calls per section and model (default 3)')
+    rep.add_argument('--sections', help='comma-separated subset of sections')
+    rep.add_argument('--live', action='store_true', help='call the OpenAI API instead of the local stand-in')
+    rep.add_argument('--out', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        listing = SAMPLE_LISTING
+        if args.listing:
+            with open(args.listing) as f:
+                listing = json.load(f)
+        record(listing, args.out)
+        return
+
+    rows = replay(args.prompts, [m.strip() for m in args.models.split(',') if m.strip()], args.runs,
+                  set(args.sections.split(',')) if args.sections else None, args.live)
+    print_report(rows, args.live)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'live': args.live, 'results': rows}, f, indent=2)
+        print(f"\n💾 Results written to {args.out}")
+
+if __name__ == '__main__':
+    main()
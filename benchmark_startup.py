@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the backend.
+
+Imports the app in fresh interpreters (like a dyno restart) and reports wall time,
+resident memory and import time per top-level package. --warm also imports the
+modules that load lazily on first request, to show what the lazy imports defer.
+
+Usage: python benchmark_startup.py [--runs 3] [--top 15] [--warm]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules the app only imports when a request needs them
+LAZY_MODULES = [
+    'services.str_optimizer',
+    'services.html_pdf_generator',
+    'openai',
+    'stripe',
+    'firebase_admin.auth',
+]
+
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+warm = {warm}
+if warm:
+    import importlib
+    for name in warm:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+total = time.perf_counter() - start
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+sys.__stdout__.write('BENCHMARK ' + json.dumps({{'import_app': elapsed, 'total': total, 'rss_mb': rss_mb()}}) + '\\n')
+"""
+
+def parse_importtime(stderr):
+    """Sum -X importtime self times (microseconds) per top-level package"""
+    per_package = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, _, name = line[len('import time:'):].split('|', 2)
+            package = name.strip().split('.')[0]
+            per_package[package] = per_package.get(package, 0) + int(self_us)
+        except ValueError:
+            continue
+    return per_package
+
+def run_once(warm):
+    probe = PROBE.format(warm=repr(LAZY_MODULES if warm else []))
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='0')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, env=env
+    )
+    stats = None
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCHMARK '):
+            stats = json.loads(line[len('BENCHMARK '):])
+    if stats is None:
+        raise RuntimeError(f"App import failed:\n{result.stderr[-2000:]}")
+    return stats, parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='cold starts to measure (default 3)')
+    parser.add_argument('--top', type=int, default=15, help='packages to list (default 15)')
+    parser.add_argument('--warm', action='store_true', help='also import the lazily loaded modules')
+    args = parser.parse_args()
+
+    # First run warms the bytecode cache, like a deployed slug
+    run_once(args.warm)
+
+    runs = [run_once(args.warm) for _ in range(args.runs)]
+    stats = [s for s, _ in runs]
+    packages = {}
+    for _, per_package in runs:
+        for package, us in per_package.items():
+            packages.setdefault(package, []).append(us)
+
+    print(f"🚀 Cold start ({args.runs} runs{', warm modules included' if args.warm else ''})")
+    print(f"   import app:  {statistics.median(s['import_app'] for s in stats) * 1000:8.1f} ms (median)")
+    if args.warm:
+        print(f"   + lazy:      {statistics.median(s['total'] for s in stats) * 1000:8.1f} ms (median)")
+    print(f"   RSS:         {statistics.median(s['rss_mb'] for s in stats):8.1f} MB (median)")
+    print()
+    print(f"📦 Import time by package (top {args.top}, median self time)")
+    ranked = sorted(((statistics.median(v), k) for k, v in packages.items()), reverse=True)
+    for us, package in ranked[:args.top]:
+        print(f"   {package:<28} {us / 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,16 @@ bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
 # Worker processes (optimized for Heroku dynos)
-workers = 1  # Start with 1 worker for Eco/Basic dynos
-worker_class = "sync"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))  # Start with 1 worker for Eco/Basic dynos
+# Requests spend most of their time waiting on OpenAI, Stripe and scraping, so each worker
+# serves them on a thread pool - a minute-long optimization no longer blocks /health or redirects.
+# Set GUNICORN_WORKER_CLASS=sync and GUNICORN_THREADS=1 to go back to one request per worker
+# (gunicorn runs sync workers as gthread whenever threads > 1).
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
 worker_connections = 1000
 timeout = 120  # Increased timeout for PDF generation
+graceful_timeout = 60
 keepalive = 2
 
 # Restart workers after this many requests, to help prevent memory leaks
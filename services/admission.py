@@ -0,0 +1,181 @@
+import os
+import math
+import time
+import logging
+import functools
+import threading
+from .sqlite_store import get_connection
+from .instrumentation import ADMISSION_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Admission control for expensive endpoints (each can start ~15 LLM calls or a full render):
+# per-IP and per-user token buckets shared by all workers, plus a per-worker concurrency cap
+# with a short bounded wait queue. Anything over the limits gets a fast 429 with Retry-After.
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Bucket refill rate (tokens per minute) and size; an endpoint spends its cost in tokens
+ADMISSION_IP_RATE = float(os.getenv('ADMISSION_IP_RATE', '30'))
+ADMISSION_IP_BURST = float(os.getenv('ADMISSION_IP_BURST', '20'))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '20'))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', '15'))
+# Expensive requests running at once in one worker, how many may wait for a slot, and for how long
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '8'))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '16'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))
+# Proxies in front of the app that append to X-Forwarded-For (1 on Heroku: the router)
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1'))
+# Suggested retry delay when turned away for capacity rather than rate
+ADMISSION_BUSY_RETRY_AFTER = 5
+
+BUCKETS_DB = 'rate_limits'
+BUCKETS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_buckets_updated ON buckets (updated_at);
+"""
+
+_slots = threading.Semaphore(max(1, ADMISSION_MAX_CONCURRENT))
+_state_lock = threading.Lock()
+_in_flight = 0
+_waiting = 0
+_last_purge = 0
+
+def _connection():
+    return get_connection(BUCKETS_DB, BUCKETS_SCHEMA)
+
+def take_tokens(buckets, cost):
+    """
+    Spend cost tokens from every bucket in buckets [(key, rate_per_minute, burst)], all or
+    nothing. Returns 0 if admitted, otherwise the seconds until every bucket will have refilled
+    enough (nothing is spent in that case, so one bucket's rejection doesn't drain the others).
+    """
+    now = time.time()
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        levels, wait = [], 0
+        for key, rate_per_minute, burst in buckets:
+            rate = rate_per_minute / 60.0
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row['tokens'] + (now - row['updated_at']) * rate)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate if rate > 0 else 3600)
+            levels.append((key, tokens))
+        if not wait:
+            conn.executemany("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                             [(key, tokens - cost, now) for key, tokens in levels])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _purge_idle_buckets(max((burst / (rate / 60.0) if rate > 0 else 3600) for _, rate, burst in buckets))
+    return wait
+
+def _purge_idle_buckets(full_after):
+    """Buckets idle long enough to be full again carry no information"""
+    global _last_purge
+    if time.time() - _last_purge < 600:
+        return
+    _last_purge = time.time()
+    _connection().execute("DELETE FROM buckets WHERE updated_at < ?", (time.time() - max(full_after, 600),))
+
+def client_ip(request):
+    """
+    Caller IP. Each proxy in front of the app (the Heroku router, TRUSTED_PROXY_HOPS of them)
+    appends the address it received the connection from to X-Forwarded-For, so the entry that
+    many places from the end is the real client; anything before it was sent by the client
+    and can't be trusted.
+    """
+    forwarded = [entry.strip() for entry in request.headers.get('X-Forwarded-For', '').split(',') if entry.strip()]
+    if TRUSTED_PROXY_HOPS <= 0 or not forwarded:
+        return request.remote_addr or 'unknown'
+    return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+
+def client_user(request):
+    """Caller identity for the per-user bucket: the email the request is for, if any"""
+    data = request.get_json(silent=True) or {}
+    email = data.get('email') if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+def _acquire_slot():
+    """Take a concurrency slot, waiting in the bounded queue; False if the queue is full or the wait times out"""
+    global _in_flight, _waiting
+    if _slots.acquire(blocking=False):
+        with _state_lock:
+            _in_flight += 1
+        return True
+
+    with _state_lock:
+        if _waiting >= ADMISSION_MAX_QUEUE:
+            return False
+        _waiting += 1
+    try:
+        acquired = _slots.acquire(timeout=ADMISSION_QUEUE_TIMEOUT)
+    finally:
+        with _state_lock:
+            _waiting -= 1
+    if acquired:
+        with _state_lock:
+            _in_flight += 1
+    return acquired
+
+def _release_slot():
+    global _in_flight
+    with _state_lock:
+        _in_flight -= 1
+    _slots.release()
+
+def _reject(name, reason, retry_after, message):
+    from flask import jsonify
+    ADMISSION_REJECTIONS.inc(name, reason)
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({'success': False, 'error': message, 'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def admission_control(name, cost=1):
+    """
+    Decorator for expensive Flask endpoints: rate-limit per IP and per user (cost tokens per
+    call), then run under the worker's concurrency cap. Over-limit requests get a 429.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ADMISSION_ENABLED:
+                return view(*args, **kwargs)
+
+            from flask import request
+            ip = client_ip(request)
+            try:
+                buckets = [(f"ip:{ip}", ADMISSION_IP_RATE, ADMISSION_IP_BURST)]
+                user = client_user(request)
+                if user:
+                    buckets.append((f"user:{user}", ADMISSION_USER_RATE, ADMISSION_USER_BURST))
+                wait = take_tokens(buckets, cost)
+            except Exception as e:
+                # The limiter must never take the endpoint down with it
+                logger.warning(f"⚠️ Rate limiter unavailable, admitting request: {e}")
+                wait = 0
+            if wait:
+                logger.info(f"🚦 Rate limited {name} for {ip}, retry in {wait:.0f}s")
+                return _reject(name, 'rate', wait, 'Too many requests. Please wait a moment and try again.')
+
+            if not _acquire_slot():
+                logger.info(f"🚦 {name} turned away: {_in_flight} running, {_waiting} waiting")
+                return _reject(name, 'busy', ADMISSION_BUSY_RETRY_AFTER,
+                               'The service is busy right now. Please try again shortly.')
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _release_slot()
+        return wrapper
+    return decorator
+
+def get_admission_metrics():
+    """Expensive requests currently running and waiting in this worker"""
+    with _state_lock:
+        return {'in_flight': _in_flight, 'waiting': _waiting}
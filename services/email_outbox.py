@@ -0,0 +1,224 @@
+import logging
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from .sqlite_store import get_connection
+from .email_service import build_report_email, deliver_email
+from .report_links import REPORT_DELIVERY, build_report_download_url, signing_available
+
+logger = logging.getLogger(__name__)
+
+# Durable email outbox - requests only enqueue, a background sender delivers with retries
+OUTBOX_DB = 'email_outbox'
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    to_email TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    transport TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+# Retry policy: exponential backoff from OUTBOX_BACKOFF_BASE seconds, capped at OUTBOX_BACKOFF_MAX
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_BACKOFF_BASE = float(os.getenv('EMAIL_OUTBOX_BACKOFF_BASE', '30'))
+OUTBOX_BACKOFF_MAX = float(os.getenv('EMAIL_OUTBOX_BACKOFF_MAX', '3600'))
+OUTBOX_POLL_INTERVAL = 5
+# A message claimed by a worker that died mid-send becomes due again after this many seconds
+OUTBOX_LEASE_SECONDS = 300
+# Delivered and permanently failed messages are kept this long for metrics and dedupe
+OUTBOX_RETENTION_SECONDS = 7 * 24 * 3600
+
+_worker_thread = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+def _connection():
+    return get_connection(OUTBOX_DB, OUTBOX_SCHEMA)
+
+def enqueue_email(to_email, desc, amenities, reviews, pdf_path, idempotency_key=None, delivery=None):
+    """
+    Queue the report email for background delivery and return immediately.
+    delivery is 'attachment' or 'link' (defaults to REPORT_DELIVERY).
+    Messages with an idempotency key that is already queued or sent are ignored.
+    Returns True if a new message was queued.
+    """
+    idempotency_key = idempotency_key or f"report:{uuid.uuid4().hex}"
+    payload = json.dumps({
+        'desc': desc,
+        'amenities': amenities,
+        'reviews': reviews,
+        'pdf_path': pdf_path,
+        'delivery': delivery or REPORT_DELIVERY
+    })
+
+    now = time.time()
+    cursor = _connection().execute(
+        "INSERT OR IGNORE INTO outbox (idempotency_key, to_email, payload, next_attempt_at, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (idempotency_key, to_email, payload, now, now)
+    )
+    queued = cursor.rowcount == 1
+
+    if queued:
+        logger.info(f"📬 Email to {to_email} queued (key: {idempotency_key})")
+    else:
+        logger.info(f"📬 Email with key {idempotency_key} already queued - skipping duplicate")
+
+    start_outbox_worker()
+    _wakeup.set()
+    return queued
+
+def _claim_next_message():
+    """Atomically claim the next due message, so concurrent workers never send it twice"""
+    conn = _connection()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT * FROM outbox "
+            "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND locked_until <= ?) "
+            "ORDER BY next_attempt_at LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE outbox SET status = 'sending', locked_until = ? WHERE id = ?",
+                (now + OUTBOX_LEASE_SECONDS, row['id'])
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _backoff_delay(attempts):
+    """Exponential backoff with jitter so retries from several workers don't line up"""
+    delay = min(OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+def _deliver_message(row):
+    """Send one claimed message and record the outcome"""
+    conn = _connection()
+    attempts = row['attempts'] + 1
+    error = None
+    transport = None
+
+    try:
+        payload = json.loads(row['payload'])
+        pdf_path = payload['pdf_path']
+        download_url = None
+        if pdf_path and payload.get('delivery') == 'link':
+            if signing_available():
+                # Link delivery: the email carries a signed download URL, the PDF stays on the server
+                download_url = build_report_download_url(pdf_path)
+                pdf_path = None
+            else:
+                logger.warning(f"⚠️ Outbox email {row['id']}: link signing not configured - attaching the PDF instead")
+        if pdf_path and not os.path.exists(pdf_path):
+            # The report was cleaned up (or the dyno restarted): don't promise an attachment
+            logger.warning(f"⚠️ Outbox email {row['id']}: report PDF no longer exists, sending without it")
+            pdf_path = None
+        # The body describes what is actually sent: a link, an attachment or neither
+        subject, body = build_report_email(payload['desc'], payload['amenities'],
+                                           payload['reviews'], pdf_path, download_url)
+        transport = deliver_email(row['to_email'], subject, body, pdf_path)
+        if not transport:
+            error = 'All email transports failed'
+    except Exception as e:
+        error = str(e)
+
+    if transport:
+        conn.execute(
+            "UPDATE outbox SET status = 'sent', attempts = ?, transport = ?, sent_at = ?, "
+            "locked_until = NULL, last_error = NULL WHERE id = ?",
+            (attempts, transport, time.time(), row['id'])
+        )
+        logger.info(f"✅ Outbox email {row['id']} delivered via {transport} (attempt {attempts})")
+    elif attempts >= OUTBOX_MAX_ATTEMPTS:
+        conn.execute(
+            "UPDATE outbox SET status = 'failed', attempts = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+            (attempts, error, row['id'])
+        )
+        logger.error(f"❌ Outbox email {row['id']} failed permanently after {attempts} attempts: {error}")
+    else:
+        delay = _backoff_delay(attempts)
+        conn.execute(
+            "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, "
+            "locked_until = NULL, last_error = ? WHERE id = ?",
+            (attempts, time.time() + delay, error, row['id'])
+        )
+        logger.warning(f"⚠️ Outbox email {row['id']} attempt {attempts} failed: {error} - retrying in {delay:.0f}s")
+
+def _purge_old_messages():
+    _connection().execute(
+        "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?",
+        (time.time() - OUTBOX_RETENTION_SECONDS,)
+    )
+
+def _outbox_worker():
+    """Background sender loop - drains due messages, then sleeps until woken or the next poll"""
+    last_purge = 0
+    while True:
+        _wakeup.clear()
+        try:
+            row = _claim_next_message()
+            if row:
+                _deliver_message(row)
+                continue
+
+            if time.time() - last_purge > 3600:
+                _purge_old_messages()
+                last_purge = time.time()
+        except Exception as e:
+            logger.error(f"❌ Email outbox worker error: {e}")
+
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+
+def start_outbox_worker():
+    """Start the background sender in this process (safe to call repeatedly, and after fork)"""
+    global _worker_thread, _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid() and _worker_thread and _worker_thread.is_alive():
+            return
+        _worker_thread = threading.Thread(target=_outbox_worker, name='email-outbox', daemon=True)
+        _worker_thread.start()
+        _worker_pid = os.getpid()
+
+def get_outbox_metrics():
+    """Queue depth by status, age of the oldest due message and recent delivery counts"""
+    conn = _connection()
+    now = time.time()
+    counts = {row['status']: row['count'] for row in conn.execute(
+        "SELECT status, COUNT(*) AS count FROM outbox GROUP BY status"
+    )}
+    oldest_pending = conn.execute(
+        "SELECT MIN(created_at) AS oldest FROM outbox WHERE status IN ('pending', 'sending')"
+    ).fetchone()['oldest']
+    sent_last_hour = {row['transport']: row['count'] for row in conn.execute(
+        "SELECT transport, COUNT(*) AS count FROM outbox WHERE status = 'sent' AND sent_at >= ? GROUP BY transport",
+        (now - 3600,)
+    )}
+
+    return {
+        'pending': counts.get('pending', 0),
+        'sending': counts.get('sending', 0),
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_pending_age_seconds': round(now - oldest_pending, 1) if oldest_pending else 0,
+        'sent_last_hour_by_transport': sent_last_hour,
+        'worker_alive': bool(_worker_pid == os.getpid() and _worker_thread and _worker_thread.is_alive())
+    }
@@ -1,35 +1,89 @@
+import logging
 import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from email.mime.base import MIMEBase
 import socket
+import base64
 import requests
 import json
+from .smtp_pool import get_smtp_pool
+from .instrumentation import span
 
-def send_email_via_sendgrid(to_email, subject, body, pdf_path=None):
-    """Send email via SendGrid API (HTTP-based, bypasses SMTP blocks)"""
-    sendgrid_api_key = os.getenv("SENDGRID_API_KEY")
-    if not sendgrid_api_key:
-        print("❌ SendGrid API key not configured")
-        return False
-    
+logger = logging.getLogger(__name__)
+
+def get_encoded_attachment(pdf_path):
+    """
+    Base64 payload for a report attachment, encoded once per PDF and cached next to it
+    (<pdf>.b64) so retries and fallback transports don't re-read and re-encode the file.
+    """
+    cache_path = pdf_path + '.b64'
     try:
-        # Use a different sender to avoid spam reputation
-        from_email = "yashkpa@gmail.com"  # Verified sender for SendGrid
-        
-        # SendGrid API endpoint
-        url = "https://api.sendgrid.com/v3/mail/send"
-        
-        # Convert plain text to HTML with better formatting
-        html_body = body.replace('\n', '<br>').replace('  ', '&nbsp;&nbsp;')
-        html_body = f"""
+        if os.path.getmtime(cache_path) >= os.path.getmtime(pdf_path):
+            with open(cache_path, 'r') as f:
+                return f.read()
+    except OSError:
+        pass
+
+    with open(pdf_path, 'rb') as f:
+        encoded = base64.b64encode(f.read()).decode()
+
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(encoded)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not cache encoded attachment: {e}")
+
+    return encoded
+
+# SendGrid v3 mail send - one request carries up to 1000 recipients across its personalizations
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+SENDGRID_FROM_EMAIL = "yashkpa@gmail.com"  # Verified sender for SendGrid
+SENDGRID_MAX_RECIPIENTS = 1000
+# Per-recipient report text is merged with substitutions, which SendGrid caps at 10,000 bytes per personalization
+SENDGRID_MAX_SUBSTITUTION_BYTES = 10000
+REPORT_TEXT_TAG = '-report_text-'
+REPORT_HTML_TAG = '-report_html-'
+
+_sendgrid_session = None
+_sendgrid_session_pid = None
+
+def _get_sendgrid_session():
+    """Keep-alive HTTP session shared by all SendGrid calls in this process"""
+    global _sendgrid_session, _sendgrid_session_pid
+    if _sendgrid_session is None or _sendgrid_session_pid != os.getpid():
+        _sendgrid_session = requests.Session()
+        _sendgrid_session.headers.update({
+            "Content-Type": "application/json",
+            "User-Agent": "STR-Optimizer/1.0"
+        })
+        _sendgrid_session_pid = os.getpid()
+    return _sendgrid_session
+
+def _post_sendgrid(data):
+    response = _get_sendgrid_session().post(
+        SENDGRID_URL,
+        headers={"Authorization": f"Bearer {os.getenv('SENDGRID_API_KEY')}"},
+        json=data,
+        timeout=30
+    )
+    return response
+
+def _sendgrid_html_fragment(body):
+    """Convert plain text to HTML with better formatting"""
+    return body.replace('\n', '<br>').replace('  ', '&nbsp;&nbsp;')
+
+def _sendgrid_html(title, fragment):
+    return f"""
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{subject}</title>
+            <title>{title}</title>
         </head>
         <body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.6; color: #333; background-color: #f9f9f9; margin: 0; padding: 20px;">
             <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
@@ -38,7 +92,7 @@ def send_email_via_sendgrid(to_email, subject, body, pdf_path=None):
                     <p style="color: #7f8c8d; margin: 5px 0 0 0;">Property Optimization Report</p>
                 </div>
                 <div style="line-height: 1.8;">
-                    {html_body}
+                    {fragment}
                 </div>
                 <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee; text-align: center; color: #7f8c8d; font-size: 12px;">
                     <p>STR Optimizer - Maximize Your Property's Potential</p>
@@ -48,92 +102,201 @@ def send_email_via_sendgrid(to_email, subject, body, pdf_path=None):
         </body>
         </html>
         """
-        
-        # Email data with enhanced headers for deliverability
-        data = {
-            "personalizations": [{
-                "to": [{"email": to_email}],
-                "subject": subject
-            }],
-            "from": {"email": from_email, "name": "STR Optimizer"},
-            "reply_to": {"email": from_email, "name": "STR Optimizer Support"},
-            "content": [
-                {"type": "text/plain", "value": body},
-                {"type": "text/html", "value": html_body}
-            ],
-            "categories": ["property_optimization", "business_report"],
-            "custom_args": {
-                "service": "str_optimizer",
-                "report_type": "property_analysis",
-                "version": "2.0"
-            },
-            "headers": {
-                "X-Priority": "3",
-                "X-MSMail-Priority": "Normal",
-                "Importance": "Normal"
-            }
-        }
-        
-        # Add PDF attachment with size check
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                import base64
-                file_size = os.path.getsize(pdf_path)
-                print(f"📎 PDF file size: {file_size} bytes")
-                
-                # Limit attachment size to 10MB for better deliverability
-                if file_size > 10 * 1024 * 1024:  # 10MB
-                    print("⚠️ PDF too large for email attachment, skipping")
-                else:
-                    with open(pdf_path, "rb") as f:
-                        pdf_data = base64.b64encode(f.read()).decode()
-                    
-                    data["attachments"] = [{
-                        "content": pdf_data,
-                        "filename": "Property_Optimization_Report.pdf",
-                        "type": "application/pdf",
-                        "disposition": "attachment",
-                        "content_id": "property_report"
-                    }]
-                    print("✅ PDF attached to SendGrid email")
-            except Exception as e:
-                print(f"⚠️ Failed to attach PDF to SendGrid: {e}")
-        
-        headers = {
-            "Authorization": f"Bearer {sendgrid_api_key}",
-            "Content-Type": "application/json",
-            "User-Agent": "STR-Optimizer/1.0"
+
+def _sendgrid_attachments(pdf_paths):
+    """Encoded attachment entries for the PDFs that exist and fit the size limit"""
+    attachments = []
+    for index, pdf_path in enumerate(pdf_paths or []):
+        if not pdf_path or not os.path.exists(pdf_path):
+            continue
+        try:
+            file_size = os.path.getsize(pdf_path)
+            logger.debug(f"📎 PDF file size: {file_size} bytes")
+
+            # Limit attachment size to 10MB for better deliverability
+            if file_size > 10 * 1024 * 1024:  # 10MB
+                logger.warning("⚠️ PDF too large for email attachment, skipping")
+                continue
+
+            suffix = f"_{index + 1}" if len(pdf_paths) > 1 else ""
+            attachments.append({
+                "content": get_encoded_attachment(pdf_path),
+                "filename": f"Property_Optimization_Report{suffix}.pdf",
+                "type": "application/pdf",
+                "disposition": "attachment",
+                "content_id": f"property_report{suffix}"
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to attach PDF to SendGrid: {e}")
+    return attachments
+
+def _sendgrid_payload(personalizations, subject, text, html, attachments):
+    """Email data with enhanced headers for deliverability"""
+    data = {
+        "personalizations": personalizations,
+        "from": {"email": SENDGRID_FROM_EMAIL, "name": "STR Optimizer"},
+        "reply_to": {"email": SENDGRID_FROM_EMAIL, "name": "STR Optimizer Support"},
+        "subject": subject,
+        "content": [
+            {"type": "text/plain", "value": text},
+            {"type": "text/html", "value": html}
+        ],
+        "categories": ["property_optimization", "business_report"],
+        "custom_args": {
+            "service": "str_optimizer",
+            "report_type": "property_analysis",
+            "version": "2.0"
+        },
+        "headers": {
+            "X-Priority": "3",
+            "X-MSMail-Priority": "Normal",
+            "Importance": "Normal"
         }
+    }
+    if attachments:
+        data["attachments"] = attachments
+    return data
+
+def send_email_via_sendgrid(to_email, subject, body, pdf_path=None):
+    """Send email via SendGrid API (HTTP-based, bypasses SMTP blocks)"""
+    if not os.getenv("SENDGRID_API_KEY"):
+        logger.warning("❌ SendGrid API key not configured")
+        return False
+    
+    try:
+        attachments = _sendgrid_attachments([pdf_path] if pdf_path else [])
+        if attachments:
+            logger.debug("✅ PDF attached to SendGrid email")
+
+        data = _sendgrid_payload(
+            [{"to": [{"email": to_email}], "subject": subject}],
+            subject, body, _sendgrid_html(subject, _sendgrid_html_fragment(body)), attachments
+        )
         
-        print("📤 Sending email via SendGrid API...")
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        logger.debug("📤 Sending email via SendGrid API...")
+        response = _post_sendgrid(data)
         
         if response.status_code == 202:
-            print(f"✅ Email sent successfully via SendGrid to {to_email}")
+            logger.info(f"✅ Email sent successfully via SendGrid to {to_email}")
             return True
         else:
-            print(f"❌ SendGrid API error: {response.status_code} - {response.text}")
+            logger.error(f"❌ SendGrid API error: {response.status_code} - {response.text}")
             return False
             
     except Exception as e:
-        print(f"❌ SendGrid error: {e}")
+        logger.error(f"❌ SendGrid error: {e}")
         return False
 
-def send_email(to_email, desc, amenities, reviews, pdf_path):
-    """Send email with optimization report"""
-    from_email = os.getenv("EMAIL_USERNAME")
-    password = os.getenv("EMAIL_PASSWORD")
+def _personalization(message, substitutions=None):
+    """One SendGrid personalization: to + cc (deduplicated, SendGrid rejects repeats) and subject"""
+    to = [message['to']] if isinstance(message['to'], str) else list(message['to'])
+    cc = [email for email in dict.fromkeys(message.get('cc') or []) if email not in to]
+    personalization = {"to": [{"email": email} for email in dict.fromkeys(to)], "subject": message['subject']}
+    if cc:
+        personalization["cc"] = [{"email": email} for email in cc]
+    if substitutions:
+        personalization["substitutions"] = substitutions
+    return personalization
 
-    # Check if email credentials are configured
-    if not from_email and not os.getenv("SENDGRID_API_KEY"):
-        print("❌ No email service configured (Gmail or SendGrid). Skipping email send.")
-        return False
+def _recipient_count(personalization):
+    return len(personalization["to"]) + len(personalization.get("cc", []))
 
-    try:
-        print(f"📧 Preparing email to {to_email}")
-        
-        subject = "Your Property Optimization Report is Ready"
-        body = f"""Dear Property Owner,
+def _build_bulk_requests(messages, attachments):
+    """
+    Pack messages that share the same attachments into as few requests as possible.
+    Identical bodies go out as plain content; differing bodies are merged per personalization
+    with substitutions, unless a body is too large for that, in which case it gets its own request.
+    """
+    shared = {(m['subject'], m['body']) for m in messages}
+    if len(shared) == 1:
+        subject, body = shared.pop()
+        html = _sendgrid_html(subject, _sendgrid_html_fragment(body))
+        batches = [([_personalization(m) for m in messages], subject, body, html)]
+    else:
+        merged, batches = [], []
+        for message in messages:
+            fragment = _sendgrid_html_fragment(message['body'])
+            size = len(message['body'].encode()) + len(fragment.encode())
+            if size > SENDGRID_MAX_SUBSTITUTION_BYTES:
+                batches.append(([_personalization(message)], message['subject'], message['body'],
+                                _sendgrid_html(message['subject'], fragment)))
+            else:
+                merged.append(_personalization(message, {REPORT_TEXT_TAG: message['body'], REPORT_HTML_TAG: fragment}))
+        if merged:
+            batches.append((merged, "Your Property Optimization Report", REPORT_TEXT_TAG,
+                            _sendgrid_html("STR Optimizer Report", REPORT_HTML_TAG)))
+
+    requests_data = []
+    for personalizations, subject, text, html in batches:
+        chunk, recipients = [], 0
+        for personalization in personalizations:
+            count = _recipient_count(personalization)
+            if chunk and recipients + count > SENDGRID_MAX_RECIPIENTS:
+                requests_data.append(_sendgrid_payload(chunk, subject, text, html, attachments))
+                chunk, recipients = [], 0
+            chunk.append(personalization)
+            recipients += count
+        if chunk:
+            requests_data.append(_sendgrid_payload(chunk, subject, text, html, attachments))
+    return requests_data
+
+def send_bulk_email(messages):
+    """
+    Send many report emails through SendGrid in as few HTTP requests as possible.
+    Each message is a dict with 'to' (address or list), 'subject', 'body' and optional
+    'cc' (list) and 'pdf_paths' (list). Messages sharing the same attachments are batched
+    into multi-personalization requests of up to SENDGRID_MAX_RECIPIENTS recipients, so each
+    shared PDF is encoded and uploaded once per request, over one keep-alive connection.
+    Returns {'requests': <HTTP calls made>, 'sent': [to...], 'failed': [to...]}.
+    """
+    summary = {'requests': 0, 'sent': [], 'failed': []}
+    if not os.getenv("SENDGRID_API_KEY"):
+        logger.warning("❌ SendGrid API key not configured")
+        summary['failed'] = [m['to'] for m in messages]
+        return summary
+
+    groups = {}
+    for message in messages:
+        groups.setdefault(tuple(message.get('pdf_paths') or ()), []).append(message)
+
+    for pdf_paths, group in groups.items():
+        attachments = _sendgrid_attachments(list(pdf_paths))
+        for data in _build_bulk_requests(group, attachments):
+            recipients = [p["to"][0]["email"] if len(p["to"]) == 1 else [t["email"] for t in p["to"]]
+                          for p in data["personalizations"]]
+            summary['requests'] += 1
+            try:
+                response = _post_sendgrid(data)
+                if response.status_code == 202:
+                    summary['sent'].extend(recipients)
+                    continue
+                logger.error(f"❌ SendGrid batch error: {response.status_code} - {response.text}")
+            except Exception as e:
+                logger.error(f"❌ SendGrid batch error: {e}")
+            summary['failed'].extend(recipients)
+
+    logger.info(f"📤 SendGrid bulk send: {len(summary['sent'])} sent, {len(summary['failed'])} failed "
+                f"in {summary['requests']} requests")
+    return summary
+
+def build_report_email(desc, amenities, reviews, pdf_path, download_url=None):
+    """
+    Build the subject and plain-text body of the optimization report email.
+    With a download_url the body links to the stored report instead of mentioning an attachment.
+    """
+    desc = desc or ""
+    amenities = amenities or ""
+    subject = "Your Property Optimization Report is Ready"
+    if download_url:
+        from .report_links import REPORT_LINK_TTL
+        hours = max(1, REPORT_LINK_TTL // 3600)
+        report_note = (f"Download your detailed PDF report (the link works for up to {hours} hours - "
+                       f"please save a copy, we only keep reports temporarily):\n{download_url}")
+    elif pdf_path:
+        report_note = "Your detailed PDF report is attached to this email."
+    else:
+        report_note = "You can access your full report in your account dashboard."
+    body = f"""Dear Property Owner,
 
 Thank you for using STR Optimizer. Your property analysis has been completed and your optimization report is ready.
 
@@ -146,7 +309,7 @@ RECOMMENDED AMENITIES:
 REVIEW INSIGHTS:
 {reviews[:300] if reviews else "Review analysis not available for this property"}{"..." if reviews and len(reviews) > 300 else ""}
 
-{('Your detailed PDF report is attached to this email.' if pdf_path else 'You can access your full report in your account dashboard.')}
+{report_note}
 
 We hope these recommendations help improve your property's performance and booking rates.
 
@@ -158,102 +321,126 @@ Website: https://str-optimizer.web.app
 
 This is an automated message from STR Optimizer. Please do not reply to this email.
         """
-        
-        print("✅ Email body prepared")
+    return subject, body
+
+def send_email_via_smtp(to_email, subject, body, pdf_path=None):
+    """Send email via Gmail SMTP, trying each port configuration in turn"""
+    from_email = os.getenv("EMAIL_USERNAME")
+    password = os.getenv("EMAIL_PASSWORD")
 
-        # Try SendGrid first (HTTP API - bypasses SMTP blocks)
-        if os.getenv("SENDGRID_API_KEY"):
-            print("🔄 Trying SendGrid API (bypasses SMTP blocks)...")
-            if send_email_via_sendgrid(to_email, subject, body, pdf_path):
-                return True
+    if not from_email or not password:
+        logger.warning("❌ Gmail credentials not configured.")
+        return False
+
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+
+    # Attach PDF if available - with size limit
+    if pdf_path and os.path.exists(pdf_path):
+        try:
+            file_size = os.path.getsize(pdf_path)
+            logger.debug(f"📎 PDF file size: {file_size} bytes")
+            
+            # Limit PDF attachment to 5MB to prevent memory issues
+            if file_size > 5 * 1024 * 1024:  # 5MB
+                logger.warning("⚠️ PDF too large, skipping attachment")
             else:
-                print("⚠️ SendGrid failed, falling back to Gmail SMTP...")
+                # Reuse the cached base64 payload instead of re-reading and re-encoding the PDF
+                encoded = get_encoded_attachment(pdf_path)
+                part = MIMEBase('application', 'pdf', name=os.path.basename(pdf_path))
+                part.set_payload('\r\n'.join(encoded[i:i + 76] for i in range(0, len(encoded), 76)))
+                part['Content-Transfer-Encoding'] = 'base64'
+                part['Content-Disposition'] = f'attachment; filename="str_optimization_report.pdf"'
+                msg.attach(part)
+                logger.debug("✅ PDF attached successfully")
+        except Exception as attachment_error:
+            logger.warning(f"⚠️ Failed to attach PDF: {attachment_error}")
 
-        # Fall back to Gmail SMTP if SendGrid unavailable
-        if not from_email or not password:
-            print("❌ Gmail credentials not configured and SendGrid failed.")
-            return False
+    # Try multiple SMTP configurations for better compatibility
+    smtp_configs = [
+        # Gmail SSL
+        {'server': 'smtp.gmail.com', 'port': 465, 'ssl': True, 'name': 'Gmail SSL'},
+        # Gmail TLS (alternative port)
+        {'server': 'smtp.gmail.com', 'port': 587, 'ssl': False, 'name': 'Gmail TLS'},
+        # Gmail on port 25 (basic)
+        {'server': 'smtp.gmail.com', 'port': 25, 'ssl': False, 'name': 'Gmail Port 25'},
+    ]
 
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
+    for config in smtp_configs:
+        try:
+            logger.debug(f"📤 Trying {config['name']} ({config['server']}:{config['port']})...")
+            # Pooled, already-authenticated connection with its own socket timeout
+            pool = get_smtp_pool(config['server'], config['port'], config['ssl'], from_email, password)
+            logger.debug("📨 Sending email...")
+            pool.send_message(msg)
+            logger.info(f"✅ Email sent successfully via {config['name']} to {to_email}")
+            return True
+            
+        except (socket.gaierror, socket.timeout, OSError) as network_error:
+            logger.error(f"❌ {config['name']} network error: {network_error}")
+            continue
+        except smtplib.SMTPAuthenticationError as auth_error:
+            logger.error(f"❌ {config['name']} authentication failed: {auth_error}")
+            continue
+        except smtplib.SMTPException as smtp_error:
+            logger.error(f"❌ {config['name']} SMTP error: {smtp_error}")
+            continue
+        except Exception as config_error:
+            logger.error(f"❌ {config['name']} unexpected error: {config_error}")
+            continue
 
-        # Attach PDF if available - with size limit
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                file_size = os.path.getsize(pdf_path)
-                print(f"📎 PDF file size: {file_size} bytes")
-                
-                # Limit PDF attachment to 5MB to prevent memory issues
-                if file_size > 5 * 1024 * 1024:  # 5MB
-                    print("⚠️ PDF too large, skipping attachment")
-                else:
-                    with open(pdf_path, "rb") as f:
-                        part = MIMEApplication(f.read(), Name=os.path.basename(pdf_path))
-                        part['Content-Disposition'] = f'attachment; filename="str_optimization_report.pdf"'
-                        msg.attach(part)
-                        print("✅ PDF attached successfully")
-            except Exception as attachment_error:
-                print(f"⚠️ Failed to attach PDF: {attachment_error}")
-
-        # Try multiple SMTP configurations for better compatibility
-        smtp_configs = [
-            # Gmail SSL
-            {'server': 'smtp.gmail.com', 'port': 465, 'ssl': True, 'name': 'Gmail SSL'},
-            # Gmail TLS (alternative port)
-            {'server': 'smtp.gmail.com', 'port': 587, 'ssl': False, 'name': 'Gmail TLS'},
-            # Gmail on port 25 (basic)
-            {'server': 'smtp.gmail.com', 'port': 25, 'ssl': False, 'name': 'Gmail Port 25'},
-        ]
-
-        for config in smtp_configs:
-            try:
-                print(f"📤 Trying {config['name']} ({config['server']}:{config['port']})...")
-                
-                # Set socket timeout to prevent hanging
-                socket.setdefaulttimeout(10)
-                
-                if config['ssl']:
-                    # SSL connection
-                    server = smtplib.SMTP_SSL(config['server'], config['port'], timeout=10)
-                else:
-                    # TLS connection
-                    server = smtplib.SMTP(config['server'], config['port'], timeout=10)
-                    if config['port'] == 587:
-                        server.starttls()
-                
-                print("🔐 Logging into Gmail...")
-                server.login(from_email, password)
-                print("📨 Sending email...")
-                server.send_message(msg)
-                server.quit()
-                print(f"✅ Email sent successfully via {config['name']} to {to_email}")
-                return True
-                
-            except (socket.gaierror, socket.timeout, OSError) as network_error:
-                print(f"❌ {config['name']} network error: {network_error}")
-                continue
-            except smtplib.SMTPAuthenticationError as auth_error:
-                print(f"❌ {config['name']} authentication failed: {auth_error}")
-                continue
-            except smtplib.SMTPException as smtp_error:
-                print(f"❌ {config['name']} SMTP error: {smtp_error}")
-                continue
-            except Exception as config_error:
-                print(f"❌ {config['name']} unexpected error: {config_error}")
-                continue
+    logger.error("❌ All Gmail SMTP configurations failed.")
+    return False
+
+def deliver_email(to_email, subject, body, pdf_path=None):
+    """
+    Try each configured transport in order (SendGrid, then Gmail SMTP).
+    Returns the name of the transport that delivered the message, or None.
+    """
+    # Try SendGrid first (HTTP API - bypasses SMTP blocks)
+    if os.getenv("SENDGRID_API_KEY"):
+        logger.info("🔄 Trying SendGrid API (bypasses SMTP blocks)...")
+        with span('email.sendgrid'):
+            sent = send_email_via_sendgrid(to_email, subject, body, pdf_path)
+        if sent:
+            return 'sendgrid'
+        logger.warning("⚠️ SendGrid failed, falling back to Gmail SMTP...")
+
+    # Fall back to Gmail SMTP if SendGrid unavailable
+    with span('email.smtp'):
+        sent = send_email_via_smtp(to_email, subject, body, pdf_path)
+    if sent:
+        return 'smtp'
+
+    return None
+
+def send_email(to_email, desc, amenities, reviews, pdf_path):
+    """Send email with optimization report"""
+    # Check if email credentials are configured
+    if not os.getenv("EMAIL_USERNAME") and not os.getenv("SENDGRID_API_KEY"):
+        logger.warning("❌ No email service configured (Gmail or SendGrid). Skipping email send.")
+        return False
+
+    try:
+        logger.debug(f"📧 Preparing email to {to_email}")
+        subject, body = build_report_email(desc, amenities, reviews, pdf_path)
+        logger.debug("✅ Email body prepared")
+
+        if deliver_email(to_email, subject, body, pdf_path):
+            return True
 
         # If all attempts failed
-        print("❌ All email services failed.")
-        print("💡 SMTP ports are blocked by your hosting provider (DigitalOcean).")
-        print("💡 Solutions:")
-        print("   1. Contact DigitalOcean support to unblock SMTP ports")
-        print("   2. Add SENDGRID_API_KEY environment variable for HTTP-based email")
-        print("   3. Use a different email service provider")
+        logger.error("❌ All email services failed.")
+        logger.warning("💡 SMTP ports are blocked by your hosting provider (DigitalOcean).")
+        logger.debug("💡 Solutions:")
+        logger.debug("   1. Contact DigitalOcean support to unblock SMTP ports")
+        logger.debug("   2. Add SENDGRID_API_KEY environment variable for HTTP-based email")
+        logger.debug("   3. Use a different email service provider")
         return False
         
     except Exception as e:
-        print(f"❌ Email preparation error: {e}")
-        return False 
\ No newline at end of file
+        logger.error(f"❌ Email preparation error: {e}")
+        return False
@@ -1,24 +1,51 @@
 # HYBRID SOLUTION - FAST PDF GENERATION FOR HEROKU
+import logging
 import os
 import subprocess
 import tempfile
 import time
 import threading
 import re
+import io
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
 from jinja2 import Template
+from .pools import per_process_executor
+
+logger = logging.getLogger(__name__)
 
 # Import WeasyPrint for fast PDF generation
 try:
     from weasyprint import HTML, CSS
     WEASYPRINT_AVAILABLE = True
-    print("✅ WeasyPrint available - using fast PDF generation")
+    logger.info("✅ WeasyPrint available - using fast PDF generation")
 except (ImportError, OSError, Exception) as e:
     WEASYPRINT_AVAILABLE = False
-    print(f"⚠️ WeasyPrint not available - falling back to wkhtmltopdf. Error: {e}")
+    logger.warning(f"⚠️ WeasyPrint not available - falling back to wkhtmltopdf. Error: {e}")
+
+# pypdf merges the per-section PDFs produced by the parallel renderer
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
 
 # Timeout value for PDF generation (in seconds)
 PDF_TIMEOUT = 20
 
+# Worker processes for section-parallel rendering, shared by every render in this gunicorn worker.
+# Each one imports WeasyPrint, and os.cpu_count() on a dyno is the host's count, not the dyno's
+# share - so the default is small and fixed. Processes start on demand, never more than a report
+# has sections.
+PDF_PARALLEL_WORKERS = max(1, int(os.getenv('PDF_PARALLEL_WORKERS', '2')))
+
+# Every report page is a top-level <div class="pdf-page"> with its own header and footer
+PAGE_SECTION_PATTERN = re.compile(r'<div class="pdf-page"[^>]*>')
+BODY_OPEN_PATTERN = re.compile(r'<body[^>]*>', re.IGNORECASE)
+BODY_CLOSE_PATTERN = re.compile(r'</body>', re.IGNORECASE)
+
+_section_pool = per_process_executor('pdf-section', PDF_PARALLEL_WORKERS, processes=True)
+
 def optimize_html_for_weasyprint(html_content):
     """
     Optimize HTML by replacing flexbox with simpler layouts that WeasyPrint handles faster.
@@ -69,12 +96,12 @@ def generate_html_pdf_fast(optimization_data, output_path):
     """
     FAST PDF generation using WeasyPrint - optimized for Heroku with timeout protection
     """
-    print("⚡ Starting FAST WeasyPrint PDF generation...")
+    logger.info("⚡ Starting FAST WeasyPrint PDF generation...")
     start_time = time.time()
     
     # Load and render template
     try:
-        print("📋 Loading template for WeasyPrint...")
+        logger.debug("📋 Loading template for WeasyPrint...")
         
         template_paths = [
             os.path.join(os.path.dirname(__file__), '..', 'templates', 'professional_report_template.html'),
@@ -86,26 +113,26 @@ def generate_html_pdf_fast(optimization_data, output_path):
             if os.path.exists(template_path):
                 with open(template_path, 'r', encoding='utf-8') as f:
                     template_content = f.read()
-                print(f"✅ Template loaded from: {template_path}")
+                logger.debug(f"✅ Template loaded from: {template_path}")
                 break
         
         if not template_content:
-            print("❌ Template not found for WeasyPrint")
+            logger.error("❌ Template not found for WeasyPrint")
             return False
         
         # Render template with data
-        print("🎨 Rendering template...")
+        logger.debug("🎨 Rendering template...")
         template = Template(template_content)
         rendered_html = template.render(**optimization_data)
-        print("✅ Template rendered")
+        logger.debug("✅ Template rendered")
         
         # Optimize HTML for WeasyPrint (remove flexbox)
-        print("🔧 Optimizing HTML for WeasyPrint...")
+        logger.debug("🔧 Optimizing HTML for WeasyPrint...")
         optimized_html = optimize_html_for_weasyprint(rendered_html)
-        print("✅ HTML optimized (flexbox removed)")
+        logger.debug("✅ HTML optimized (flexbox removed)")
         
         # Generate PDF using WeasyPrint with timeout
-        print(f"🚀 Generating PDF with WeasyPrint (timeout: {PDF_TIMEOUT}s)...")
+        logger.debug(f"🚀 Generating PDF with WeasyPrint (timeout: {PDF_TIMEOUT}s)...")
         
         # Use threading for timeout support
         result_container = {'success': False, 'error': None}
@@ -120,38 +147,138 @@ def generate_html_pdf_fast(optimization_data, output_path):
         
         # Check if thread is still running (timeout)
         if worker_thread.is_alive():
-            print(f"⏰ WeasyPrint TIMEOUT after {PDF_TIMEOUT} seconds - will try backup method")
+            logger.warning(f"⏰ WeasyPrint TIMEOUT after {PDF_TIMEOUT} seconds - will try backup method")
             # Thread is still running - we can't kill it, but we return False
             # The thread will eventually finish or be cleaned up when the process ends
             return False
         
         # Check for errors
         if result_container.get('error'):
-            print(f"❌ WeasyPrint error: {result_container['error']}")
+            logger.error(f"❌ WeasyPrint error: {result_container['error']}")
             return False
         
         # Verify PDF was created
         if os.path.exists(output_path):
             pdf_size = os.path.getsize(output_path)
             if pdf_size > 5000:
-                print(f"🎉 FAST WeasyPrint SUCCESS! PDF: {pdf_size:,} bytes in {execution_time:.2f} seconds")
+                logger.info(f"🎉 FAST WeasyPrint SUCCESS! PDF: {pdf_size:,} bytes in {execution_time:.2f} seconds")
                 return True
             else:
-                print(f"❌ PDF too small: {pdf_size} bytes")
+                logger.error(f"❌ PDF too small: {pdf_size} bytes")
         else:
-            print("❌ PDF not created by WeasyPrint")
+            logger.error("❌ PDF not created by WeasyPrint")
         
         return False
         
     except Exception as e:
-        print(f"❌ WeasyPrint error: {e}")
+        logger.error(f"❌ WeasyPrint error: {e}")
+        return False
+
+def split_report_sections(html_content):
+    """
+    Split rendered report HTML into standalone documents, one per page section.
+    Each document keeps the shared <head> (styles) so it lays out exactly as in the full report.
+    """
+    body_open = BODY_OPEN_PATTERN.search(html_content)
+    body_close = BODY_CLOSE_PATTERN.search(html_content, body_open.end() if body_open else 0)
+    if not body_open or not body_close:
+        return []
+
+    head = html_content[:body_open.end()]
+    tail = html_content[body_close.start():]
+    body = html_content[body_open.end():body_close.start()]
+
+    starts = [match.start() for match in PAGE_SECTION_PATTERN.finditer(body)]
+    if not starts:
+        return []
+
+    # Anything between page blocks is whitespace and comments, so each section runs to the next start
+    ends = starts[1:] + [len(body)]
+    return [head + body[start:end] + tail for start, end in zip(starts, ends)]
+
+def _render_section_pdf(html_content):
+    """Process-pool worker: lay out one report section and return its PDF bytes"""
+    return HTML(string=html_content).write_pdf()
+
+def merge_pdf_sections(section_pdfs, output_path):
+    """Concatenate per-section PDFs into one file, keeping section order"""
+    writer = PdfWriter()
+    for pdf_bytes in section_pdfs:
+        writer.append(io.BytesIO(pdf_bytes))
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+def generate_html_pdf_parallel(optimization_data, output_path):
+    """
+    SECTION-PARALLEL PDF generation - each report page is laid out by WeasyPrint in its own
+    process and the resulting PDFs are merged in page order
+    """
+    logger.info(f"⚡ Starting section-parallel WeasyPrint PDF generation ({PDF_PARALLEL_WORKERS} workers)...")
+    start_time = time.time()
+
+    if not WEASYPRINT_AVAILABLE or not PYPDF_AVAILABLE:
+        logger.error("❌ Section-parallel rendering needs both WeasyPrint and pypdf")
+        return False
+
+    try:
+        template_paths = [
+            os.path.join(os.path.dirname(__file__), '..', 'templates', 'professional_report_template.html'),
+            os.path.join('/app', 'templates', 'professional_report_template.html')
+        ]
+
+        template_content = None
+        for template_path in template_paths:
+            if os.path.exists(template_path):
+                with open(template_path, 'r', encoding='utf-8') as f:
+                    template_content = f.read()
+                break
+
+        if not template_content:
+            logger.error("❌ Template not found for parallel rendering")
+            return False
+
+        rendered_html = Template(template_content).render(**optimization_data)
+        sections = split_report_sections(optimize_html_for_weasyprint(rendered_html))
+        if not sections:
+            logger.warning("❌ No page sections found in rendered report")
+            return False
+
+        logger.debug(f"🧩 Rendering {len(sections)} sections in parallel...")
+        pool = _section_pool.get()
+        futures = [pool.submit(_render_section_pdf, section) for section in sections]
+        done, not_done = wait(futures, timeout=PDF_TIMEOUT)
+
+        if not_done:
+            logger.warning(f"⏰ Section-parallel TIMEOUT after {PDF_TIMEOUT} seconds - {len(not_done)} sections unfinished")
+            _section_pool.reset()
+            return False
+
+        # Results are collected in submission order, which is page order
+        section_pdfs = [future.result() for future in futures]
+        merge_pdf_sections(section_pdfs, output_path)
+
+        execution_time = time.time() - start_time
+        pdf_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if pdf_size > 5000:
+            logger.info(f"🎉 Section-parallel SUCCESS! PDF: {pdf_size:,} bytes in {execution_time:.2f} seconds")
+            return True
+
+        logger.error(f"❌ PDF too small: {pdf_size} bytes")
+        return False
+
+    except BrokenProcessPool as e:
+        logger.error(f"❌ Section worker pool crashed: {e}")
+        _section_pool.reset()
+        return False
+    except Exception as e:
+        logger.error(f"❌ Section-parallel rendering error: {e}")
         return False
 
 def generate_html_pdf_slow(optimization_data, output_path):
     """
     BACKUP: Optimized wkhtmltopdf with aggressive timeout for Heroku
     """
-    print("🐌 Using BACKUP wkhtmltopdf method...")
+    logger.info("🐌 Using BACKUP wkhtmltopdf method...")
     
     # Check system package location first, then fallback to compiled version
     possible_paths = ['/usr/bin/wkhtmltopdf', '/usr/local/bin/wkhtmltopdf', '/app/bin/wkhtmltopdf']
@@ -165,11 +292,11 @@ def generate_html_pdf_slow(optimization_data, output_path):
     if not wkhtmltopdf_cmd:
         wkhtmltopdf_cmd = '/app/bin/wkhtmltopdf'  # Default to Heroku location
     
-    print(f"🎯 Using wkhtmltopdf: {wkhtmltopdf_cmd}")
+    logger.info(f"🎯 Using wkhtmltopdf: {wkhtmltopdf_cmd}")
     
     # Load and render template
     try:
-        print("📋 Loading template...")
+        logger.debug("📋 Loading template...")
         
         template_paths = [
             os.path.join(os.path.dirname(__file__), '..', 'templates', 'professional_report_template.html'),
@@ -181,20 +308,20 @@ def generate_html_pdf_slow(optimization_data, output_path):
             if os.path.exists(template_path):
                 with open(template_path, 'r', encoding='utf-8') as f:
                     template_content = f.read()
-                print(f"✅ Template loaded from: {template_path}")
+                logger.debug(f"✅ Template loaded from: {template_path}")
                 break
         
         if not template_content:
-            print("❌ Template not found")
+            logger.error("❌ Template not found")
             return False
         
         # Render template
         template = Template(template_content)
         html_content = template.render(**optimization_data)
-        print("✅ Template rendered")
+        logger.debug("✅ Template rendered")
         
     except Exception as e:
-        print(f"❌ Template error: {e}")
+        logger.error(f"❌ Template error: {e}")
         return False
     
     # Save temporary HTML
@@ -204,15 +331,15 @@ def generate_html_pdf_slow(optimization_data, output_path):
             temp_file.write(html_content)
             temp_html_path = temp_file.name
         
-        print(f"✅ HTML saved: {temp_html_path}")
+        logger.debug(f"✅ HTML saved: {temp_html_path}")
         
     except Exception as e:
-        print(f"❌ HTML save failed: {e}")
+        logger.error(f"❌ HTML save failed: {e}")
         return False
     
     # Generate PDF - AGGRESSIVE SPEED OPTIMIZATIONS
     try:
-        print("🚀 SPEED-OPTIMIZED PDF generation...")
+        logger.debug("🚀 SPEED-OPTIMIZED PDF generation...")
         
         cmd = [
             'xvfb-run', '-a', '--server-args=-screen 0 800x600x16',  # Smaller screen, less memory
@@ -233,7 +360,7 @@ def generate_html_pdf_slow(optimization_data, output_path):
             output_path
         ]
         
-        print(f"🔧 Fast command: wkhtmltopdf [optimized] -> {output_path}")
+        logger.debug(f"🔧 Fast command: wkhtmltopdf [optimized] -> {output_path}")
         
         start_time = time.time()
         result = subprocess.run(
@@ -245,27 +372,27 @@ def generate_html_pdf_slow(optimization_data, output_path):
         )
         
         execution_time = time.time() - start_time
-        print(f"⏱️ Completed in {execution_time:.2f} seconds")
+        logger.debug(f"⏱️ Completed in {execution_time:.2f} seconds")
         
         # LENIENT success detection - accept exit code 1 if PDF exists and is reasonable size
         pdf_created = os.path.exists(output_path)
         pdf_size = os.path.getsize(output_path) if pdf_created else 0
         
         if pdf_created and pdf_size > 10000:  # Accept if >10KB
-            print(f"⚡ BACKUP SUCCESS! PDF: {pdf_size:,} bytes (exit code: {result.returncode})")
+            logger.info(f"⚡ BACKUP SUCCESS! PDF: {pdf_size:,} bytes (exit code: {result.returncode})")
             return True
         else:
-            print(f"❌ wkhtmltopdf failed: {result.returncode}, size: {pdf_size}")
+            logger.error(f"❌ wkhtmltopdf failed: {result.returncode}, size: {pdf_size}")
             if result.stderr:
-                print(f"Error: {result.stderr}")
+                logger.error(f"Error: {result.stderr}")
         
         return False
         
     except subprocess.TimeoutExpired:
-        print("❌ wkhtmltopdf timeout after 20 seconds")
+        logger.error("❌ wkhtmltopdf timeout after 20 seconds")
         return False
     except Exception as e:
-        print(f"❌ PDF generation error: {e}")
+        logger.error(f"❌ PDF generation error: {e}")
         return False
     
     finally:
@@ -273,7 +400,7 @@ def generate_html_pdf_slow(optimization_data, output_path):
         try:
             if 'temp_html_path' in locals() and os.path.exists(temp_html_path):
                 os.unlink(temp_html_path)
-                print("✅ Cleaned up temp file")
+                logger.debug("✅ Cleaned up temp file")
         except:
             pass
 
@@ -281,26 +408,26 @@ def generate_html_pdf(optimization_data, output_path):
     """
     HYBRID APPROACH - Try fast WeasyPrint first, fallback to optimized wkhtmltopdf
     """
-    print("🚀 Starting HYBRID PDF generation...")
+    logger.info("🚀 Starting HYBRID PDF generation...")
     
     # Try the fast WeasyPrint approach first
     if WEASYPRINT_AVAILABLE:
         try:
             if generate_html_pdf_fast(optimization_data, output_path):
-                print("✅ Fast WeasyPrint succeeded!")
+                logger.debug("✅ Fast WeasyPrint succeeded!")
                 return True
         except Exception as e:
-            print(f"⚠️ WeasyPrint failed: {e}")
+            logger.warning(f"⚠️ WeasyPrint failed: {e}")
     
     # Fallback to optimized wkhtmltopdf approach
-    print("🔄 Falling back to optimized wkhtmltopdf...")
+    logger.info("🔄 Falling back to optimized wkhtmltopdf...")
     
     try:
         if generate_html_pdf_slow(optimization_data, output_path):
-            print("✅ Backup wkhtmltopdf succeeded!")
+            logger.info("✅ Backup wkhtmltopdf succeeded!")
             return True
     except Exception as e:
-        print(f"❌ Backup wkhtmltopdf also failed: {e}")
+        logger.error(f"❌ Backup wkhtmltopdf also failed: {e}")
     
-    print("❌ All PDF generation methods failed")
+    logger.error("❌ All PDF generation methods failed")
     return False 
\ No newline at end of file
@@ -0,0 +1,185 @@
+import re
+import logging
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Lightweight request instrumentation: timing spans per stage, exposed as a Server-Timing
+# header, one structured log line per request and Prometheus histograms at /metrics.
+# Histograms are per worker process.
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Requests faster than this and without spans don't get a timing log line
+SLOW_REQUEST_LOG_SECONDS = 1.0
+
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name, help_text, label_names, buckets=HISTOGRAM_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for labels, series in items:
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in zip(self.label_names, labels))
+                prefix = label_text + ',' if label_text else ''
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{{{label_text}}} {series[-1]}')
+        return '\n'.join(lines)
+
+class Counter:
+    """Prometheus-style counter keyed by label values"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in zip(self.label_names, labels))
+                lines.append(f'{self.name}{{{label_text}}} {value}')
+        return '\n'.join(lines)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+STAGE_DURATION = Histogram('str_stage_duration_seconds', 'Time spent in each instrumented stage', ('stage',))
+STAGE_ERRORS = Counter('str_stage_errors_total', 'Instrumented stages that raised', ('stage',))
+REQUEST_DURATION = Histogram('str_http_request_duration_seconds', 'HTTP request latency',
+                             ('method', 'endpoint', 'status'))
+ADMISSION_REJECTIONS = Counter('str_admission_rejections_total', 'Requests turned away by admission control',
+                              ('endpoint', 'reason'))
+LLM_TOKENS = Counter('str_llm_tokens_total', 'OpenAI tokens used per optimization section', ('section', 'kind'))
+LLM_COST = Counter('str_llm_cost_usd_total', 'Estimated OpenAI spend per optimization section (USD)', ('section',))
+
+@contextmanager
+def span(name):
+    """Time a stage; recorded on the current request (if any) and in the stage histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(name)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, duration))
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _summarize(spans):
+    """Total time and call count per span name, in first-seen order"""
+    summary = {}
+    for name, duration in spans:
+        total, count = summary.get(name, (0.0, 0))
+        summary[name] = (total + duration, count + 1)
+    return summary
+
+SERVER_TIMING_TOKEN = re.compile(r'[^A-Za-z0-9_.-]')
+
+def server_timing_header(spans, total):
+    """Server-Timing value, e.g. 'scrape;dur=812.3, llm.title;dur=1450.0, total;dur=9021.7'"""
+    parts = []
+    for name, (duration, count) in _summarize(spans).items():
+        metric = SERVER_TIMING_TOKEN.sub('_', name)
+        desc = f';desc="x{count}"' if count > 1 else ''
+        parts.append(f"{metric};dur={duration * 1000:.1f}{desc}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
+
+def init_app(app):
+    """Attach per-request timing to a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timing():
+        g.timing_start = time.perf_counter()
+        g.timing_token = _request_spans.set([])
+
+    @app.after_request
+    def _finish_request_timing(response):
+        start = g.pop('timing_start', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        spans = _request_spans.get() or []
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        REQUEST_DURATION.observe(total, request.method, endpoint, str(response.status_code))
+        response.headers['Server-Timing'] = server_timing_header(spans, total)
+
+        if spans or total >= SLOW_REQUEST_LOG_SECONDS:
+            record = {
+                'event': 'request_timing',
+                'method': request.method,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'spans': {name: {'ms': round(d * 1000, 1), 'count': c}
+                          for name, (d, c) in _summarize(spans).items()}
+            }
+            stages = ' '.join(f"{name}={span['ms']}" for name, span in record['spans'].items())
+            logger.info("⏱️ %s %s %s %.1fms %s", request.method, endpoint, response.status_code,
+                        total * 1000, stages, extra={'timing': record})
+        return response
+
+    @app.teardown_request
+    def _reset_request_timing(exc):
+        token = g.pop('timing_token', None)
+        if token is not None:
+            _request_spans.reset(token)
+
+def render_metrics(extra_gauges=None):
+    """Prometheus text exposition of all histograms/counters plus optional {name: value} gauges"""
+    sections = [STAGE_DURATION.render(), STAGE_ERRORS.render(), REQUEST_DURATION.render(),
+                ADMISSION_REJECTIONS.render(), LLM_TOKENS.render(), LLM_COST.render()]
+    for name, value in (extra_gauges or {}).items():
+        sections.append(f"# TYPE {name} gauge\n{name} {value}")
+    return '\n'.join(sections) + '\n'
@@ -0,0 +1,40 @@
+import importlib
+import threading
+
+class LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access, so worker
+    boot doesn't pay for SDKs that only some requests use. on_load(module) runs once
+    after the import, for configuration such as API keys.
+    """
+
+    def __init__(self, name, on_load=None):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_on_load', on_load)
+        object.__setattr__(self, '_module', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_load:
+                        self._on_load(module)
+                    object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_module(name, on_load=None):
+    return LazyModule(name, on_load)
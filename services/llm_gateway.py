@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from .sqlite_store import get_connection
+from .section_pipeline import remaining_budget
+from .llm_usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+# All OpenAI chat calls go through one gateway per worker:
+# - an AIMD concurrency limit: +1/limit per fast success, halved on 429s or slow responses
+# - Retry-After from 429s pauses every caller, not just the one that got it
+# - a circuit breaker that fails calls immediately while the provider is down, serving the
+#   last good response for an identical request when there is one
+LLM_INITIAL_CONCURRENCY = float(os.getenv('LLM_INITIAL_CONCURRENCY', '8'))
+LLM_MIN_CONCURRENCY = float(os.getenv('LLM_MIN_CONCURRENCY', '1'))
+LLM_MAX_CONCURRENCY = float(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+# Responses slower than this count as congestion (seconds)
+LLM_LATENCY_TARGET = float(os.getenv('LLM_LATENCY_TARGET', '20'))
+# Retries of 429 / 5xx / timeouts (the OpenAI client's own retries are turned off in favour of these)
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', os.getenv('OPENAI_MAX_RETRIES', '2')))
+# Longest a caller waits for a slot or a Retry-After pause before giving up
+LLM_MAX_WAIT = float(os.getenv('LLM_MAX_WAIT', '30'))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+# Last good response per identical request, served when the provider is unavailable
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+
+# Multiplicative decreases are at most this often, so one burst of 429s halves the limit once
+DECREASE_COOLDOWN = 2.0
+
+CACHE_DB = 'llm_cache'
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    model TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_created ON responses (created_at);
+"""
+
+class LLMUnavailableError(Exception):
+    """The provider is unavailable (breaker open, rate-limited past our patience) and nothing is cached"""
+
+class AIMDLimiter:
+    """Concurrency limit that grows additively on healthy responses and halves on congestion"""
+
+    def __init__(self, initial, minimum, maximum):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.blocked_until = 0
+        self._last_decrease = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                if now >= self.blocked_until and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                if now >= deadline:
+                    return False
+                wake = min(deadline, self.blocked_until) if now < self.blocked_until else deadline
+                self._cond.wait(max(0.01, wake - now))
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self, latency):
+        with self._cond:
+            if latency > LLM_LATENCY_TARGET:
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_overload(self, retry_after=None):
+        with self._cond:
+            self._decrease()
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+
+    def _decrease(self):
+        now = time.time()
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+            logger.info(f"🐢 LLM concurrency limit lowered to {int(self.limit)}")
+
+class CircuitBreaker:
+    """closed -> open after consecutive outage errors -> half-open probe after the cooldown"""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.time() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        """
+        A permit for one call (hand it back with release() however the call ends), or None if
+        the call must not go out. In half-open state only one caller at a time gets the probe.
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return 'call'
+            if state == 'half-open' and self._probe is None:
+                self._probe = object()
+                return self._probe
+            return None
+
+    def release(self, permit):
+        """A probe that ended without a verdict (429, our own deadline) frees the slot for the next caller"""
+        with self._lock:
+            if permit is not None and permit is self._probe:
+                self._probe = None
+
+    def may_retry(self, permit):
+        """Whether a caller holding this permit may try again: always while closed, and the prober while still half-open"""
+        state = self.state
+        return state == 'closed' or (state == 'half-open' and permit is not None and permit is self._probe)
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("✅ LLM circuit breaker closed - provider healthy again")
+            self.failures = 0
+            self.opened_at = None
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe is not None or self.failures >= self.threshold:
+                if self.opened_at is None or self._probe is not None:
+                    logger.warning(f"⚠️ LLM circuit breaker open for {self.cooldown:.0f}s after {self.failures} failures")
+                self.opened_at = time.time()
+                self._probe = None
+
+_last_purge = 0
+
+_limiter = AIMDLimiter(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+
+def _status_code(error):
+    return getattr(error, 'status_code', None)
+
+def _is_rate_limited(error):
+    return _status_code(error) == 429
+
+def _is_provider_failure(error):
+    """Errors that say the provider is struggling (vs. a bad request of ours)"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ('APITimeoutError', 'APIConnectionError', 'TimeoutError', 'ConnectionError')
+
+def _retry_after(error):
+    """Seconds from the Retry-After / retry-after-ms headers of a 429, if present"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def _cache_key(kwargs):
+    return hashlib.sha256(json.dumps(kwargs, sort_keys=True, default=str).encode()).hexdigest()
+
+def _cache_connection():
+    return get_connection(CACHE_DB, CACHE_SCHEMA)
+
+def _store_response(key, response, model):
+    try:
+        content = response.choices[0].message.content
+        if content:
+            _cache_connection().execute(
+                "INSERT OR REPLACE INTO responses (key, content, model, created_at) VALUES (?, ?, ?, ?)",
+                (key, content, model, time.time())
+            )
+        _purge_cache()
+    except Exception as e:
+        logger.debug(f"LLM response not cached: {e}")
+
+def _purge_cache():
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    _cache_connection().execute("DELETE FROM responses WHERE created_at < ?", (time.time() - LLM_CACHE_TTL,))
+
+def _cached_response(key):
+    """Last good response for an identical request, shaped like a chat completion"""
+    try:
+        row = _cache_connection().execute(
+            "SELECT content, model FROM responses WHERE key = ? AND created_at >= ?",
+            (key, time.time() - LLM_CACHE_TTL)
+        ).fetchone()
+    except Exception:
+        return None
+    if row is None:
+        return None
+    message = SimpleNamespace(role='assistant', content=row['content'])
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+                           model=row['model'], usage=None, cached=True)
+
+def _unavailable(key, section, reason):
+    cached = _cached_response(key)
+    if cached is not None:
+        logger.info(f"💾 LLM {reason} - serving cached {section} response")
+        record_usage(section, cached.model, None, 0, cached=True)
+        return cached
+    raise LLMUnavailableError(f"LLM {reason} ({section})")
+
+def chat_completion(client, section, **kwargs):
+    """
+    client.chat.completions.create through the gateway: waits for a concurrency slot, retries
+    429/5xx/timeouts with backoff (honouring Retry-After), and falls back to the cached response
+    for the same request - or raises LLMUnavailableError - while the provider is unavailable.
+    Inside an optimization pipeline no call outlives the pipeline's deadline.
+    """
+    key = _cache_key(kwargs)
+    permit = _breaker.allow()
+    if permit is None:
+        return _unavailable(key, section, 'circuit open')
+    try:
+        return _call_with_retries(client, section, key, permit, kwargs)
+    finally:
+        _breaker.release(permit)
+
+def _call_with_retries(client, section, key, permit, kwargs):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            return _unavailable(key, section, 'out of time')
+        if not _limiter.acquire(LLM_MAX_WAIT if budget is None else min(LLM_MAX_WAIT, budget)):
+            return _unavailable(key, section, 'saturated')
+        start = time.time()
+        try:
+            call_kwargs = kwargs if budget is None else dict(kwargs, timeout=max(1.0, remaining_budget()))
+            response = client.chat.completions.create(**call_kwargs)
+        except Exception as e:
+            budget = remaining_budget()
+            if budget is not None and budget <= 0:
+                # Cut off by our own deadline - says nothing about the provider's health
+                return _unavailable(key, section, 'out of time')
+            if not _is_provider_failure(e):
+                # The provider answered (e.g. a 400) - it is healthy, the request was not
+                _breaker.record_success()
+                raise
+            retry_after = _retry_after(e) if _is_rate_limited(e) else None
+            _limiter.on_overload(retry_after)
+            if not _is_rate_limited(e):
+                # Throttling is the limiter's job; only outages (5xx, timeouts) trip the breaker
+                _breaker.record_failure()
+            if attempt >= LLM_MAX_RETRIES or not _breaker.may_retry(permit):
+                logger.warning(f"⚠️ LLM {section} failed after {attempt + 1} attempts: {e}")
+                cached = _cached_response(key)
+                if cached is not None:
+                    logger.info(f"💾 Serving cached {section} response")
+                    record_usage(section, cached.model, None, 0, cached=True)
+                    return cached
+                raise
+            if retry_after is None:
+                time.sleep(min(8, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+            continue
+        finally:
+            _limiter.release()
+
+        latency = time.time() - start
+        _limiter.on_success(latency)
+        _breaker.record_success()
+        record_usage(section, getattr(response, 'model', None) or kwargs.get('model'), getattr(response, 'usage', None), latency)
+        _store_response(key, response, kwargs.get('model'))
+        return response
+
+def get_gateway_metrics():
+    """Current limit, in-flight calls and breaker state for this worker"""
+    return {
+        'concurrency_limit': int(_limiter.limit),
+        'in_flight': _limiter.in_flight,
+        'breaker_state': _breaker.state,
+        'retry_after_remaining': max(0.0, round(_limiter.blocked_until - time.time(), 1)),
+    }
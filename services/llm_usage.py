@@ -0,0 +1,203 @@
+import os
+import time
+import uuid
+import logging
+import contextvars
+from datetime import datetime, timezone
+from .sqlite_store import get_connection
+from .instrumentation import LLM_TOKENS, LLM_COST
+
+logger = logging.getLogger(__name__)
+
+# Token and cost accounting for every OpenAI completion: one row per call (section, model, tier,
+# request) in the shared SQLite store, aggregated on demand per section / request / tier / day.
+USAGE_DB = 'llm_usage'
+USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    day TEXT NOT NULL,
+    request_id TEXT,
+    tier TEXT,
+    section TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_day_section ON usage (day, section);
+CREATE INDEX IF NOT EXISTS idx_usage_request ON usage (request_id);
+"""
+
+LLM_USAGE_RETENTION_DAYS = int(os.getenv('LLM_USAGE_RETENTION_DAYS', '90'))
+
+# USD per 1M tokens (prompt, completion) - update when OpenAI's pricing changes
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+}
+
+# Prompt tokens served from the provider's prompt cache are billed at this fraction of the input price
+CACHED_INPUT_DISCOUNT = 0.5
+
+# Output caps per section (completion tokens), comfortably above what each prompt asks for.
+# Override with LLM_MAX_TOKENS="profile=800,sentiment=400"; 0 removes a cap.
+DEFAULT_MAX_TOKENS = {
+    'location': 60,
+    'title': 300,
+    'description': 200,
+    'amenities': 200,
+    'sentiment': 500,
+    'sentiment_map': 250,
+    'gap': 200,
+    'profile': 600,
+    'pricing': 300,
+    'photo': 300,
+    'insights': 200,
+    'strategic': 200,
+    'market': 500,
+    'scores': 200,
+    'rating': 60,
+    'revenue': 400,
+    'percentages': 200,
+    'priorities': 300,
+}
+
+_usage_context = contextvars.ContextVar('llm_usage_context', default=None)
+_last_purge = 0
+_schema_checked = False
+
+def _parse_caps(spec):
+    caps = dict(DEFAULT_MAX_TOKENS)
+    for item in spec.split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            try:
+                caps[name.strip()] = int(value)
+            except ValueError:
+                logger.warning(f"⚠️ Ignoring invalid LLM_MAX_TOKENS entry: {item}")
+    return caps
+
+MAX_TOKENS = _parse_caps(os.getenv('LLM_MAX_TOKENS', ''))
+
+def max_tokens_for(section):
+    """Completion token cap for a section, or None if uncapped"""
+    return MAX_TOKENS.get(section) or None
+
+def start_request(tier=None):
+    """Attribute the following completions (in this context and its section threads) to a new request"""
+    context = {'request_id': uuid.uuid4().hex[:16], 'tier': tier or 'free', 'calls': []}
+    return _usage_context.set(context), context
+
+def end_request(token):
+    _usage_context.reset(token)
+
+def cost_of(model, prompt_tokens, completion_tokens, cached_prompt_tokens=0):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        # Dated snapshots (gpt-4o-mini-2024-07-18) are priced like their base model
+        prices = next((p for name, p in MODEL_PRICES.items() if model and model.startswith(name)), (0, 0))
+    uncached = prompt_tokens - cached_prompt_tokens
+    return (uncached * prices[0] + cached_prompt_tokens * prices[0] * CACHED_INPUT_DISCOUNT
+            + completion_tokens * prices[1]) / 1_000_000
+
+def _connection():
+    global _schema_checked
+    conn = get_connection(USAGE_DB, USAGE_SCHEMA)
+    if not _schema_checked:
+        # Databases created before prompt-cache accounting lack the column
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(usage)")}
+        if 'cached_prompt_tokens' not in columns:
+            try:
+                conn.execute("ALTER TABLE usage ADD COLUMN cached_prompt_tokens INTEGER NOT NULL DEFAULT 0")
+            except Exception as e:
+                logger.debug(f"cached_prompt_tokens column not added: {e}")
+        _schema_checked = True
+    return conn
+
+def record_usage(section, model, usage, latency, cached=False):
+    """Record one completion's usage (response.usage may be None for cached responses)"""
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    # Prompt tokens the provider served from its prefix cache (see services/prompt_builder.py)
+    cached_prompt_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
+    cost = cost_of(model, prompt_tokens, completion_tokens, cached_prompt_tokens)
+    context = _usage_context.get() or {}
+
+    LLM_TOKENS.inc(section, 'prompt', amount=prompt_tokens)
+    LLM_TOKENS.inc(section, 'completion', amount=completion_tokens)
+    LLM_TOKENS.inc(section, 'cached_prompt', amount=cached_prompt_tokens)
+    LLM_COST.inc(section, amount=cost)
+    if 'calls' in context:
+        context['calls'].append((section, prompt_tokens, completion_tokens, cost, cached_prompt_tokens))
+
+    try:
+        now = time.time()
+        _connection().execute(
+            "INSERT INTO usage (day, request_id, tier, section, model, prompt_tokens, completion_tokens, "
+            "cached_prompt_tokens, cost_usd, latency_ms, cached, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now(timezone.utc).strftime('%Y-%m-%d'), context.get('request_id'), context.get('tier'),
+             section, model, prompt_tokens, completion_tokens, cached_prompt_tokens, cost, latency * 1000, int(cached), now)
+        )
+        _purge_old_usage()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record LLM usage: {e}")
+
+def request_summary(context):
+    """Totals for one request's completions, for the end-of-request log line"""
+    calls = context.get('calls', [])
+    return {
+        'request_id': context.get('request_id'),
+        'tier': context.get('tier'),
+        'calls': len(calls),
+        'prompt_tokens': sum(c[1] for c in calls),
+        'completion_tokens': sum(c[2] for c in calls),
+        'cached_prompt_tokens': sum(c[4] for c in calls),
+        'cost_usd': round(sum(c[3] for c in calls), 6),
+    }
+
+GROUPINGS = {
+    'section': 'section',
+    'tier': 'tier',
+    'day': 'day',
+    'model': 'model',
+    'request': 'request_id',
+}
+
+def usage_report(group_by='section', days=7, limit=100):
+    """Aggregated usage over the last `days` days, grouped by section, tier, day, model or request"""
+    column = GROUPINGS.get(group_by, 'section')
+    since = datetime.fromtimestamp(time.time() - days * 86400, timezone.utc).strftime('%Y-%m-%d')
+    rows = _connection().execute(
+        f"SELECT {column} AS key, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+        f"SUM(completion_tokens) AS completion_tokens, SUM(cached_prompt_tokens) AS cached_prompt_tokens, SUM(cost_usd) AS cost_usd, "
+        f"AVG(latency_ms) AS avg_latency_ms, SUM(cached) AS cached_calls "
+        f"FROM usage WHERE day >= ? GROUP BY {column} ORDER BY cost_usd DESC LIMIT ?",
+        (since, int(limit))
+    ).fetchall()
+    return [{
+        group_by: row['key'],
+        'calls': row['calls'],
+        'prompt_tokens': row['prompt_tokens'],
+        'completion_tokens': row['completion_tokens'],
+        'cached_prompt_tokens': row['cached_prompt_tokens'],
+        'prompt_cache_hit_rate': round(row['cached_prompt_tokens'] / row['prompt_tokens'], 3) if row['prompt_tokens'] else 0,
+        'avg_prompt_tokens': round(row['prompt_tokens'] / row['calls'], 1) if row['calls'] else 0,
+        'cost_usd': round(row['cost_usd'] or 0, 6),
+        'avg_latency_ms': round(row['avg_latency_ms'] or 0, 1),
+        'cached_calls': row['cached_calls'],
+    } for row in rows]
+
+def _purge_old_usage():
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    cutoff = datetime.fromtimestamp(time.time() - LLM_USAGE_RETENTION_DAYS * 86400, timezone.utc).strftime('%Y-%m-%d')
+    _connection().execute("DELETE FROM usage WHERE day < ?", (cutoff,))
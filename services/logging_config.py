@@ -0,0 +1,122 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+
+# Level for everything unless overridden per module, e.g. LOG_LEVELS="services.airbnb_scraper=DEBUG,werkzeug=WARNING"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+# 'text' for human-readable lines, 'json' for one structured record per line
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Records beyond this are dropped rather than blocking a request when stdout can't keep up
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Attributes every LogRecord has - anything else was passed via extra= and belongs in the JSON record
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_queue = None
+_handler = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; never blocks the caller if the queue is full"""
+
+    def prepare(self, record):
+        """Resolve the message and traceback now (the listener runs later) but keep them separate"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _start_listener():
+    """Start the thread that writes queued records to stdout"""
+    global _listener
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+    _listener = logging.handlers.QueueListener(_queue, handler, respect_handler_level=False)
+    _listener.start()
+
+def _stop_listener():
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+
+def _restart_in_child():
+    """After a fork the parent's writer thread is gone (and its queue may be locked) - start fresh"""
+    global _queue
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler.queue = _queue
+    _start_listener()
+
+def configure_logging():
+    """
+    Route all logging through a bounded queue to a background writer thread, with levels from
+    LOG_LEVEL / LOG_LEVELS. Safe to call more than once; only the first call configures.
+    """
+    global _queue, _handler
+    if _queue is not None:
+        return
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler = DroppingQueueHandler(_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _start_listener()
+    atexit.register(_stop_listener)
+    # gunicorn preloads the app and forks: threads don't survive the fork, so restart the writer
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_in_child)
@@ -0,0 +1,62 @@
+import os
+import logging
+from .llm_usage import max_tokens_for, DEFAULT_MAX_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Model and temperature per optimization section (max_tokens comes from the LLM_MAX_TOKENS caps
+# in services/llm_usage.py). Sections not listed use LLM_DEFAULT_MODEL at the provider's default
+# temperature. Move a section to another model only with benchmark_models.py results to back it.
+DEFAULT_MODEL = os.getenv('LLM_DEFAULT_MODEL', 'gpt-3.5-turbo')
+
+ROUTES = {
+    # Extraction and structured output: deterministic answers parse more reliably
+    'location': {'temperature': 0},
+    'rating': {'temperature': 0},
+    'scores': {'temperature': 0.2},
+    'market': {'temperature': 0.2},
+    'revenue': {'temperature': 0.2},
+    'percentages': {'temperature': 0.2},
+    'priorities': {'temperature': 0.2},
+    'sentiment_map': {'temperature': 0.2},
+}
+
+def _parse_routes(spec):
+    """LLM_ROUTES="location=gpt-4o-mini,profile=gpt-4o:0.7" - model and optional temperature per section"""
+    routes = {section: dict(route) for section, route in ROUTES.items()}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        section, value = (part.strip() for part in item.split('=', 1))
+        model, _, temperature = value.partition(':')
+        route = routes.setdefault(section, {})
+        if model:
+            route['model'] = model
+        if temperature:
+            try:
+                route['temperature'] = float(temperature)
+            except ValueError:
+                logger.warning(f"⚠️ Ignoring invalid temperature in LLM_ROUTES entry: {item}")
+    return routes
+
+ACTIVE_ROUTES = _parse_routes(os.getenv('LLM_ROUTES', ''))
+
+def route_for(section):
+    """{'model', 'temperature', 'max_tokens'} for a section (temperature/max_tokens only when set)"""
+    route = ACTIVE_ROUTES.get(section, {})
+    resolved = {'model': route.get('model', DEFAULT_MODEL)}
+    if route.get('temperature') is not None:
+        resolved['temperature'] = route['temperature']
+    cap = max_tokens_for(section)
+    if cap:
+        resolved['max_tokens'] = cap
+    return resolved
+
+def apply_route(section, kwargs):
+    """Completion kwargs with the section's route filled in; values the call sets itself win"""
+    return {**route_for(section), **kwargs}
+
+def routing_table(sections=None):
+    """Resolved route of every known section, for logs and the benchmark"""
+    names = sections or sorted(set(ACTIVE_ROUTES) | set(DEFAULT_MAX_TOKENS))
+    return {section: route_for(section) for section in names}
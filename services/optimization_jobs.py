@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import logging
+import threading
+from .sqlite_store import get_connection
+from .pools import per_process_executor
+
+logger = logging.getLogger(__name__)
+
+# Paid optimizations run in the background as soon as Stripe reports the payment, keyed by
+# checkout session id, so the result is usually ready (or well under way) when the customer lands.
+JOBS_DB = 'optimization_jobs'
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    session_id TEXT PRIMARY KEY,
+    package_type TEXT,
+    form_data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    locked_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+"""
+
+OPTIMIZATION_JOB_WORKERS = int(os.getenv('OPTIMIZATION_JOB_WORKERS', '4'))
+# A job whose worker died (restart, crash) can be picked up again after this many seconds;
+# a running job renews its lease every third of that, so a slow run is never taken over
+OPTIMIZATION_JOB_LEASE = int(os.getenv('OPTIMIZATION_JOB_LEASE', '300'))
+OPTIMIZATION_JOB_MAX_ATTEMPTS = 3
+OPTIMIZATION_JOB_RETENTION = 7 * 24 * 3600
+JOB_POLL_INTERVAL = 0.5
+
+_executor = per_process_executor('optimization-job', OPTIMIZATION_JOB_WORKERS)
+_last_purge = 0
+
+def _connection():
+    return get_connection(JOBS_DB, JOBS_SCHEMA)
+
+def submit_optimization(session_id, form_data, package_type=None):
+    """
+    Queue the optimization for a checkout session (no-op if it is already queued, running
+    or done) and start it in the background. Failed jobs are retried up to
+    OPTIMIZATION_JOB_MAX_ATTEMPTS times. Returns the current job status.
+    """
+    conn = _connection()
+    now = time.time()
+    conn.execute(
+        "INSERT OR IGNORE INTO jobs (session_id, package_type, form_data, created_at) VALUES (?, ?, ?, ?)",
+        (session_id, package_type, json.dumps(form_data), now)
+    )
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', error = NULL WHERE session_id = ? AND status = 'failed' AND attempts < ?",
+        (session_id, OPTIMIZATION_JOB_MAX_ATTEMPTS)
+    )
+
+    job = get_job(session_id)
+    if job['status'] == 'queued' or (job['status'] == 'running' and (job['locked_until'] or 0) < now):
+        _executor.submit(_run_job, session_id)
+        logger.info(f"🧾 Optimization queued for session {session_id}")
+    _purge_old_jobs()
+    return job['status']
+
+def _claim_job(session_id):
+    """Take the job if nobody else holds a live lease on it"""
+    now = time.time()
+    cursor = _connection().execute(
+        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, locked_until = ? "
+        "WHERE session_id = ? AND (status = 'queued' OR (status = 'running' AND locked_until < ?))",
+        (now, now + OPTIMIZATION_JOB_LEASE, session_id, now)
+    )
+    return cursor.rowcount == 1
+
+def _renew_lease(session_id, stop):
+    """Keep extending the job's lease until stop is set (runs beside the job in its own thread)"""
+    while not stop.wait(OPTIMIZATION_JOB_LEASE / 3):
+        try:
+            _connection().execute(
+                "UPDATE jobs SET locked_until = ? WHERE session_id = ? AND status = 'running'",
+                (time.time() + OPTIMIZATION_JOB_LEASE, session_id)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not renew lease for session {session_id}: {e}")
+
+def _run_job(session_id):
+    if not _claim_job(session_id):
+        return
+
+    job = get_job(session_id)
+    conn = _connection()
+    stop_renewing = threading.Event()
+    threading.Thread(target=_renew_lease, args=(session_id, stop_renewing), daemon=True,
+                     name=f"job-lease-{session_id[-8:]}").start()
+    try:
+        # Imported here: the optimization stack loads on first use (see app startup)
+        from .str_optimizer import optimize_listing
+        result = optimize_listing(json.loads(job['form_data']))
+        result['package_type'] = job['package_type']
+        conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, locked_until = NULL "
+            "WHERE session_id = ?",
+            (json.dumps(result), time.time(), session_id)
+        )
+        logger.info(f"✅ Background optimization finished for session {session_id}")
+    except Exception as e:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, locked_until = NULL WHERE session_id = ?",
+            (str(e), time.time(), session_id)
+        )
+        logger.exception(f"❌ Background optimization failed for session {session_id}: {e}")
+    finally:
+        stop_renewing.set()
+
+def get_job(session_id):
+    """Job row as a dict (result decoded), or None if nothing was submitted for this session"""
+    row = _connection().execute("SELECT * FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def wait_for_job(session_id, timeout):
+    """Poll until the job is done or failed, or the timeout passes; returns the latest job state"""
+    deadline = time.time() + timeout
+    job = get_job(session_id)
+    while job and job['status'] not in ('done', 'failed') and time.time() < deadline:
+        time.sleep(JOB_POLL_INTERVAL)
+        job = get_job(session_id)
+    return job
+
+def _purge_old_jobs():
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    _connection().execute(
+        "DELETE FROM jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+        (time.time() - OPTIMIZATION_JOB_RETENTION,)
+    )
@@ -1,57 +1,108 @@
+import logging
 import os
-import tempfile
-import requests
-from PIL import Image
-import io
 import re
+import time
+import threading
+from collections import deque
 from fpdf import FPDF
+from .instrumentation import span, timed
 
-# Import the new HTML-to-PDF generator
-from .html_pdf_generator import generate_html_pdf
+logger = logging.getLogger(__name__)
 
-def clean_text_for_pdf(text):
-    """Helper function to clean text for PDF compatibility"""
+# Characters the built-in (Latin-1) PDF fonts cannot show, mapped to ASCII equivalents
+PDF_CHAR_REPLACEMENTS = {
+    '\u2022': '* ',  # bullet point
+    '\u2013': '-',   # en dash
+    '\u2014': '--',  # em dash
+    '\u201c': '"',   # left double quote
+    '\u201d': '"',   # right double quote
+    '\u2018': "'",   # left single quote
+    '\u2019': "'",   # right single quote
+    '\u2026': '...', # ellipsis
+    '\u2713': '[X] ',  # checkmark
+    '\u2605': '*',   # star
+    '\u270d': '',    # writing hand
+    '\ufe0f': '',    # emoji variation selector
+}
+
+# Supplementary-plane characters (emoji) have no glyphs in either font set
+EMOJI_START = 0x10000
+
+class PdfTranslationTable(dict):
+    """str.translate table that resolves each unmapped character once and caches the result"""
+
+    def __init__(self, replacements, unicode_font):
+        super().__init__((ord(char), replacement) for char, replacement in replacements.items())
+        self.unicode_font = unicode_font
+
+    def __missing__(self, codepoint):
+        if codepoint >= EMOJI_START:
+            replacement = ''
+        elif self.unicode_font or codepoint < 256:
+            replacement = chr(codepoint)  # keep the character unchanged
+        else:
+            replacement = '?'
+        self[codepoint] = replacement
+        return replacement
+
+# One table per font mode - Unicode TTF fonts keep quotes, bullets and non-Latin scripts
+LATIN1_TRANSLATION_TABLE = PdfTranslationTable(PDF_CHAR_REPLACEMENTS, unicode_font=False)
+UNICODE_TRANSLATION_TABLE = PdfTranslationTable({'\ufe0f': ''}, unicode_font=True)
+
+def clean_text_for_pdf(text, unicode_font=False):
+    """Helper function to clean text for PDF compatibility in a single translate pass"""
     if not text:
         return ""
-    # Replace problematic Unicode characters with ASCII equivalents
-    replacements = {
-        '\u2022': '* ',  # bullet point
-        '\u2013': '-',   # en dash
-        '\u2014': '--',  # em dash
-        '\u201c': '"',   # left double quote
-        '\u201d': '"',   # right double quote
-        '\u2018': "'",   # left single quote
-        '\u2019': "'",   # right single quote
-        '\u2713': '[X] ',  # checkmark
-        '✓': '[X] ',     # checkmark
-        '•': '* ',       # bullet point
-        '🎯': '',        # target emoji
-        '📊': '',        # chart emoji
-        '✍️': '',        # writing emoji
-        '💰': '',        # money emoji
-        '🚀': '',        # rocket emoji
-        '🏞️': '',        # landscape emoji
-        '🛁': '',        # bathtub emoji
-        '🎱': '',        # pool ball emoji
-        '🐕': '',        # dog emoji
-        '🌟': '',        # star emoji
-        '🍳': '',        # cooking emoji
-        '🔥': '',        # fire emoji
-    }
-    
-    result = text
-    for unicode_char, replacement in replacements.items():
-        result = result.replace(unicode_char, replacement)
+    return text.translate(UNICODE_TRANSLATION_TABLE if unicode_font else LATIN1_TRANSLATION_TABLE)
 
-    # Remove any remaining non-ASCII characters
-    result = ''.join(char if ord(char) < 128 else '?' for char in result)
-    
-    return result
+# Optional Unicode TrueType font: a path, 'auto' to look for DejaVu Sans, or 'none' for core fonts only
+PDF_UNICODE_FONT = os.getenv('PDF_UNICODE_FONT', 'auto')
+PDF_UNICODE_FONT_BOLD = os.getenv('PDF_UNICODE_FONT_BOLD', '')
+
+# DejaVu ships with fonts-dejavu-core from the Aptfile (Heroku installs apt packages under /app/.apt)
+UNICODE_FONT_SEARCH_DIRS = [
+    '/usr/share/fonts/truetype/dejavu',
+    '/app/.apt/usr/share/fonts/truetype/dejavu',
+]
+
+def find_unicode_font():
+    """Return (regular, bold) TTF paths for the configured Unicode font, or None"""
+    if PDF_UNICODE_FONT.lower() in ('', 'none', 'off', 'false'):
+        return None
+
+    if PDF_UNICODE_FONT.lower() != 'auto':
+        if not os.path.exists(PDF_UNICODE_FONT):
+            logger.warning(f"⚠️ PDF_UNICODE_FONT not found: {PDF_UNICODE_FONT} - using core fonts")
+            return None
+        bold = PDF_UNICODE_FONT_BOLD if os.path.exists(PDF_UNICODE_FONT_BOLD) else PDF_UNICODE_FONT
+        return PDF_UNICODE_FONT, bold
+
+    for font_dir in UNICODE_FONT_SEARCH_DIRS:
+        regular = os.path.join(font_dir, 'DejaVuSans.ttf')
+        if os.path.exists(regular):
+            bold = os.path.join(font_dir, 'DejaVuSans-Bold.ttf')
+            return regular, bold if os.path.exists(bold) else regular
+    return None
 
 class ModernPDF(FPDF):
-    def __init__(self):
+    def __init__(self, analysis_date=None, unicode_font=True):
         super().__init__()
         self.set_auto_page_break(auto=True, margin=20)
+        self.analysis_date = analysis_date or 'November 2024'
+
+        # Embed a Unicode TTF when available - fpdf2 subsets it to the glyphs used
+        self.base_font = 'helvetica'
+        self.unicode_font = False
+        font_paths = find_unicode_font() if unicode_font else None
+        if font_paths:
+            try:
+                regular, bold = font_paths
+                self.add_font('ReportSans', '', regular)
+                self.add_font('ReportSans', 'B', bold)
+                self.base_font = 'ReportSans'
+                self.unicode_font = True
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load Unicode font {font_paths[0]}: {e} - using core fonts")
         
         # Modern color scheme matching the HTML
         self.colors = {
@@ -75,16 +126,16 @@ class ModernPDF(FPDF):
     def header(self):
         """Modern header with blue line"""
         # Header text
-        self.set_font('Arial', 'B', 18)
+        self.set_font(self.base_font, 'B', 18)
         self.set_text_color(*self.colors['primary_blue'])
         self.set_y(20)
-        self.cell(0, 10, 'AI Property Insights', 0, 0, 'L')
+        self.cell(0, 10, 'AI Property Insights', 0, 0, 'L', new_x='LMARGIN', new_y='NEXT')
         
         # Date on right
-        self.set_font('Arial', '', 11)
+        self.set_font(self.base_font, '', 11)
         self.set_text_color(*self.colors['light_gray'])
         self.set_xy(140, 20)
-        self.cell(0, 10, 'Analysis Date: November 2024', 0, 1, 'R')
+        self.cell(0, 10, f'Analysis Date: {self.clean_text(self.analysis_date)}', 0, 1, 'R')
         
         # Blue horizontal line
         self.set_draw_color(*self.colors['primary_blue'])
@@ -96,21 +147,48 @@ class ModernPDF(FPDF):
     def footer(self):
         """Modern footer"""
         self.set_y(-15)
-        self.set_font('Arial', 'I', 9)
+        self.set_font(self.base_font, '' if self.unicode_font else 'I', 9)
         self.set_text_color(*self.colors['light_gray'])
-        self.cell(0, 10, f'Page {self.page_no()} of 5 | AI Property Optimization Report', 0, 0, 'C')
+        self.cell(0, 10, f'Page {self.page_no()} of {{nb}} | AI Property Optimization Report', 0, 0, 'C')
+
+    def clean_text(self, text):
+        """Clean text for whichever font set this document uses"""
+        return clean_text_for_pdf(text, unicode_font=self.unicode_font)
+
+    def wrap_text(self, text, max_width):
+        """Split text into lines that fit max_width with the current font"""
+        lines = []
+        current_line = ""
+
+        for word in self.clean_text(text).split():
+            if self.get_string_width(current_line + " " + word) < max_width:
+                current_line += (" " if current_line else "") + word
+            else:
+                if current_line:
+                    lines.append(current_line)
+                current_line = word
+
+        if current_line:
+            lines.append(current_line)
+
+        return lines
+
+    def ensure_space(self, height):
+        """Start a new page if a block of the given height would not fit"""
+        if self.get_y() + height > self.page_break_trigger:
+            self.add_page()
 
     def add_main_title(self, title, subtitle):
         """Add main title section matching HTML"""
         # Main title
-        self.set_font('Arial', 'B', 24)
+        self.set_font(self.base_font, 'B', 24)
         self.set_text_color(*self.colors['dark_gray'])
-        self.cell(0, 15, clean_text_for_pdf(title), 0, 1, 'L')
+        self.cell(0, 15, self.clean_text(title), 0, 1, 'L')
         
         # Subtitle in blue
-        self.set_font('Arial', '', 14)
+        self.set_font(self.base_font, '', 14)
         self.set_text_color(*self.colors['primary_blue'])
-        self.cell(0, 8, clean_text_for_pdf(subtitle), 0, 1, 'L')
+        self.cell(0, 8, self.clean_text(subtitle), 0, 1, 'L')
         self.ln(10)
 
     def add_alert_box(self, text, alert_type='success'):
@@ -125,48 +203,39 @@ class ModernPDF(FPDF):
         bg_color, border_color = colors.get(alert_type, colors['info'])
         
         # Calculate box height
-        self.set_font('Arial', '', 11)
-        words = clean_text_for_pdf(text).split()
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            if self.get_string_width(current_line + " " + word) < 160:
-                current_line += (" " if current_line else "") + word
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        
-        if current_line:
-            lines.append(current_line)
+        self.set_font(self.base_font, '', 11)
+        lines = self.wrap_text(text, 160)
         
         box_height = len(lines) * 6 + 16
+        self.ensure_space(box_height)
+        box_y = self.get_y()
         
         # Background
         self.set_fill_color(*bg_color)
-        self.rect(20, self.get_y(), 170, box_height, 'F')
+        self.rect(20, box_y, 170, box_height, 'F')
         
         # Left border
         self.set_fill_color(*border_color)
-        self.rect(20, self.get_y(), 3, box_height, 'F')
+        self.rect(20, box_y, 3, box_height, 'F')
         
         # Text
         self.set_text_color(*self.colors['dark_gray'])
-        y_start = self.get_y() + 8
+        y_start = box_y + 8
         
         for i, line in enumerate(lines):
             self.set_xy(28, y_start + i * 6)
             self.cell(0, 6, line, 0, 1, 'L')
         
-        self.set_y(self.get_y() + box_height + 10)
+        self.set_y(box_y + box_height + 10)
 
     def add_score_grid(self, metrics):
         """Add score cards in grid layout matching reference design exactly"""
-        box_width = 65   # Adjusted to match reference
-        box_height = 55  # Adjusted to match reference
         spacing = 12     # Adjusted spacing to match reference
+        # 65mm cards match the reference; narrow them when more cards need to fit the 170mm body
+        box_width = min(65, (170 - spacing * (len(metrics) - 1)) / max(len(metrics), 1))
+        box_height = 55  # Adjusted to match reference
         start_x = 20
+        self.ensure_space(box_height)
         current_y = self.get_y()
 
         for i, (value, label, highlight) in enumerate(metrics):
@@ -194,37 +263,46 @@ class ModernPDF(FPDF):
             self.rect(x, current_y, box_width, box_height)
             
             # Value - Large and prominent, centered
-            self.set_font('Arial', 'B', 24)  # Larger font to match reference
+            self.set_font(self.base_font, 'B', 24)  # Larger font to match reference
             self.set_text_color(*self.colors['primary_blue'])
             self.set_xy(x, current_y + 16)
-            self.cell(box_width, 12, clean_text_for_pdf(value), 0, 0, 'C')
+            self.cell(box_width, 12, self.clean_text(value), 0, 0, 'C')
             
             # Label - Smaller, below value, centered
-            self.set_font('Arial', '', 10)
+            self.set_font(self.base_font, '', 10)
             self.set_text_color(*self.colors['light_gray'])
             self.set_xy(x, current_y + 35)
-            self.cell(box_width, 6, clean_text_for_pdf(label), 0, 0, 'C')
+            self.cell(box_width, 6, self.clean_text(label), 0, 0, 'C')
         
         self.set_y(current_y + box_height + 20)  # Proper spacing after cards
 
     def add_section_header(self, title, icon=''):
         """Add section header with optional icon"""
-        self.set_font('Arial', 'B', 16)
+        self.ensure_space(85)  # Keep the header with the first box of its section
+        self.set_font(self.base_font, 'B', 16)
         self.set_text_color(*self.colors['medium_gray'])
         
         if icon:
             title = f"{icon} {title}"
         
-        self.cell(0, 10, clean_text_for_pdf(title), 0, 1, 'L')
+        self.cell(0, 10, self.clean_text(title), 0, 1, 'L')
         self.ln(5)
 
     def add_recommendation_box(self, title, content, priority=''):
         """Add recommendation box matching reference design exactly"""
-        # Calculate dynamic height based on content
-        lines = content.split('\n')
-        content_lines = [line for line in lines if line.strip()]  # Remove empty lines
-        box_height = max(70, 25 + len(content_lines) * 5)  # Increased base height
+        # Calculate dynamic height based on content, wrapping long lines to the box width
+        self.set_font(self.base_font, '', 10)
+        content_lines = []
+        for line in content.split('\n'):
+            if line.strip():  # Remove empty lines
+                content_lines.extend(self.wrap_text(line, 158))
+
+        # A single box never spans pages - keep what fits on one page
+        max_lines = int((self.page_break_trigger - self.t_margin - 45) / 5.5)
+        content_lines = content_lines[:max_lines]
+        box_height = max(70, 25 + len(content_lines) * 5.5)  # Increased base height
         
+        self.ensure_space(box_height)
         current_y = self.get_y()
         
         # Background - Light gray to match reference
@@ -238,9 +316,9 @@ class ModernPDF(FPDF):
         
         # Title - Bold, dark gray, proper positioning
         self.set_xy(25, current_y + 10)
-        self.set_font('Arial', 'B', 12)
+        self.set_font(self.base_font, 'B', 12)
         self.set_text_color(*self.colors['medium_gray'])
-        self.cell(120, 8, clean_text_for_pdf(title), 0, 0, 'L')
+        self.cell(120, 8, self.clean_text(title), 0, 0, 'L', new_x='LMARGIN', new_y='NEXT')
         
         # Priority badge - Match reference exactly
         if priority:
@@ -265,28 +343,21 @@ class ModernPDF(FPDF):
             self.rect(143, current_y + 8, badge_width, badge_height, 'F')
             
             # Badge text
-            self.set_font('Arial', 'B', 7)
+            self.set_font(self.base_font, 'B', 7)
             self.set_text_color(*text_color)
             self.set_xy(143, current_y + 9)
             self.cell(badge_width, 10, badge_text, 0, 0, 'C')
         
         # Content - Process each line properly with better formatting
-        self.set_font('Arial', '', 10)
+        self.set_font(self.base_font, '', 10)
         self.set_text_color(*self.colors['text_gray'])
         
         y_offset = current_y + 25
         for line in content_lines:
             if line.strip():
                 self.set_xy(25, y_offset)
-                # Handle bullet points and formatting - Clean BEFORE processing
-                formatted_line = clean_text_for_pdf(line)
-                
-                # Ensure bullet points are properly formatted
-                if line.strip().startswith('•'):
-                    # Replace bullet with asterisk for PDF compatibility
-                    formatted_line = '* ' + formatted_line[2:].strip() if len(formatted_line) > 2 else '* '
-                
-                self.cell(140, 5, formatted_line, 0, 1, 'L')
+                # Lines are already cleaned by wrap_text
+                self.cell(160, 5, line, 0, 1, 'L')
                 y_offset += 5.5  # Slightly more line spacing
         
         self.set_y(current_y + box_height + 15)  # Space after box to match reference
@@ -299,6 +370,7 @@ class ModernPDF(FPDF):
         start_x = 20
         
         for i in range(0, len(features), 2):
+            self.ensure_space(box_height)
             current_y = self.get_y()
 
             # Left box
@@ -326,30 +398,17 @@ class ModernPDF(FPDF):
 
         # Title
         self.set_xy(x + 5, y + 5)
-        self.set_font('Arial', 'B', 11)
+        self.set_font(self.base_font, 'B', 11)
         self.set_text_color(*self.colors['medium_gray'])
-        self.cell(0, 8, clean_text_for_pdf(title), 0, 1, 'L')
+        self.cell(0, 8, self.clean_text(title), 0, 1, 'L')
         
         # Description
         self.set_xy(x + 5, y + 15)
-        self.set_font('Arial', '', 9)
+        self.set_font(self.base_font, '', 9)
         self.set_text_color(*self.colors['text_gray'])
         
         # Wrap text
-        words = clean_text_for_pdf(description).split()
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            if self.get_string_width(current_line + " " + word) < width - 10:
-                current_line += (" " if current_line else "") + word
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        
-        if current_line:
-            lines.append(current_line)
+        lines = self.wrap_text(description, width - 10)
         
         for i, line in enumerate(lines[:3]):  # Limit to 3 lines
             self.set_xy(x + 5, y + 15 + i * 5)
@@ -370,9 +429,9 @@ class ModernPDF(FPDF):
         
         # Percentage text
         self.set_xy(x + 5, bar_y + 6)
-        self.set_font('Arial', '', 8)
+        self.set_font(self.base_font, '', 8)
         self.set_text_color(*self.colors['text_gray'])
-        self.cell(0, 4, f'Market Uniqueness: {percentage}%', 0, 0, 'L')
+        self.cell(0, 4, f'Market Uniqueness: {percentage}%', 0, 0, 'L', new_x='LMARGIN', new_y='NEXT')
 
     def add_table(self, headers, rows):
         """Add professional table"""
@@ -382,60 +441,61 @@ class ModernPDF(FPDF):
         # Header
         self.set_fill_color(*self.colors['bg_gray'])
         self.set_text_color(*self.colors['medium_gray'])
-        self.set_font('Arial', 'B', 10)
+        self.set_font(self.base_font, 'B', 10)
         
         for i, header in enumerate(headers):
-            self.cell(col_widths[i], row_height, clean_text_for_pdf(header), 1, 0, 'L', True)
+            self.cell(col_widths[i], row_height, self.clean_text(header), 1, 0, 'L', True)
         self.ln()
         
         # Rows
         self.set_fill_color(*self.colors['white'])
         self.set_text_color(*self.colors['text_gray'])
-        self.set_font('Arial', '', 9)
+        self.set_font(self.base_font, '', 9)
         
         for row in rows:
             for i, cell in enumerate(row):
-                self.cell(col_widths[i], row_height, clean_text_for_pdf(str(cell)), 1, 0, 'L', True)
+                self.cell(col_widths[i], row_height, self.clean_text(str(cell)), 1, 0, 'L', True)
             self.ln()
         
         self.ln(10)
 
     def add_numbered_list(self, items):
         """Add numbered list"""
-        self.set_font('Arial', '', 10)
+        self.set_font(self.base_font, '', 10)
         self.set_text_color(*self.colors['text_gray'])
         
         for i, item in enumerate(items, 1):
-            self.cell(0, 6, f"{i}. {clean_text_for_pdf(item)}", 0, 1, 'L')
+            self.multi_cell(0, 6, f"{i}. {self.clean_text(item)}", 0, 'L', new_x='LMARGIN', new_y='NEXT')
         
         self.ln(5)
 
     def add_bullet_list(self, items):
         """Add bullet list"""
-        self.set_font('Arial', '', 10)
+        self.set_font(self.base_font, '', 10)
         self.set_text_color(*self.colors['text_gray'])
         
         for item in items:
-            self.cell(0, 6, f"* {clean_text_for_pdf(item)}", 0, 1, 'L')
+            self.multi_cell(0, 6, f"* {self.clean_text(item)}", 0, 'L', new_x='LMARGIN', new_y='NEXT')
         
         self.ln(5)
 
     def add_final_cta(self):
         """Add final call-to-action box"""
         box_height = 35
+        self.ensure_space(box_height)
         
         # Background
         self.set_fill_color(*self.colors['medium_gray'])
         self.rect(20, self.get_y(), 170, box_height, 'F')
         
         # Title
-        self.set_font('Arial', 'B', 14)
+        self.set_font(self.base_font, 'B', 14)
         self.set_text_color(*self.colors['white'])
         self.set_xy(20, self.get_y() + 8)
         self.cell(170, 8, 'Ready to Transform Your Listing?', 0, 1, 'C')
         
         # Subtitle
-        self.set_font('Arial', '', 10)
+        self.set_font(self.base_font, '', 10)
         self.set_xy(20, self.get_y() + 2)
         self.cell(170, 6, 'This AI-powered analysis identified 25+ optimization opportunities specific to your property.', 0, 1, 'C')
         self.set_xy(20, self.get_y())
@@ -443,10 +503,261 @@ class ModernPDF(FPDF):
         
         self.ln(box_height + 10)
 
-def generate_professional_pdf(optimization_data, output_path):
-    """Generate professional PDF using HTML-to-PDF with enhanced Chromium setup"""
-    
-    print("📄 Starting HTML-to-PDF generation...")
+def _first_value(value, default=''):
+    """Return a scalar for template-style values that may arrive as lists"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else default
+    return default if value in (None, '') else value
+
+def _as_percentage(value, default):
+    """Coerce an AI-generated score ("85", "10-30", 85.0) into a 0-100 integer"""
+    match = re.search(r'\d+(\.\d+)?', str(_first_value(value, default)))
+    if not match:
+        return default
+    return max(0, min(100, int(float(match.group(0)))))
+
+def _content_lines(text, limit=None):
+    """Split AI markdown output into clean non-empty lines"""
+    if not text:
+        return []
+    lines = [re.sub(r'^\s*(\d+[.)]|[-*\u2022])\s*', '', line).replace('**', '').strip()
+             for line in str(text).split('\n')]
+    lines = [line for line in lines if line]
+    return lines[:limit] if limit else lines
+
+NON_LATIN1_PATTERN = re.compile(r'[^\x00-\xff]')
+
+def _needs_unicode_font(value):
+    """True if any text in the report data has characters core fonts would turn into '?'"""
+    if isinstance(value, str):
+        return any(char not in PDF_CHAR_REPLACEMENTS and ord(char) < EMOJI_START
+                   for char in NON_LATIN1_PATTERN.findall(value))
+    if isinstance(value, dict):
+        return any(_needs_unicode_font(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_needs_unicode_font(item) for item in value)
+    return False
+
+def _plain_text(text):
+    """Drop markdown emphasis the AI adds around headings"""
+    return str(text or '').replace('**', '')
+
+@timed('pdf.native')
+def generate_native_pdf(optimization_data, output_path):
+    """Generate the report with fpdf2 only - no WeasyPrint, wkhtmltopdf or Xvfb"""
+    logger.debug("⚡ Starting native fpdf2 PDF generation...")
+    start_time = time.time()
+
+    try:
+        data = optimization_data
+        title = data.get('title') or 'Your Property'
+        location = data.get('location') or 'your area'
+        title_suggestions = data.get('title_suggestions') or []
+        competitive_scores = data.get('competitive_scores') or {}
+        revenue_projections = data.get('revenue_projections') or {}
+        dynamic_percentages = data.get('dynamic_percentages') or {}
+        task_priorities = data.get('task_priorities') or {}
+        market_analysis_data = data.get('market_analysis_data') or {}
+
+        def priority(key, default='HIGH'):
+            return f"{task_priorities.get(key, default)} PRIORITY"
+
+        def percent(key, default):
+            return _first_value(dynamic_percentages.get(key), default)
+
+        # Embedding a TTF costs more than core fonts, so only do it when the text needs it
+        pdf = ModernPDF(analysis_date=data.get('analysis_date'), unicode_font=_needs_unicode_font(data))
+        pdf.set_margins(20, 20, 20)
+        pdf.add_page()
+
+        # Page 1: summary and top immediate actions
+        pdf.add_main_title('Property Optimization Report', f"{title} - {location}")
+        if data.get('optimized_description'):
+            pdf.add_alert_box(f"AI Analysis Summary: {data['optimized_description']}", 'info')
+
+        pdf.add_score_grid([
+            (f"+{_first_value(revenue_projections.get('revenue_impact'), 25)}%", 'Revenue Potential', True),
+            (str(data.get('guest_rating') or 4.2), 'Guest Rating', False),
+            (f"{_as_percentage(competitive_scores.get('market_positioning'), 75)}/100", 'AI Optimization Score', False),
+        ])
+
+        pdf.add_section_header('Top 4 Immediate Actions')
+        title_content = [f"Current: \"{title}\""]
+        if title_suggestions:
+            title_content.append(f"Optimized: \"{title_suggestions[0]}\"")
+            title_content.extend(f"Option: \"{suggestion}\"" for suggestion in title_suggestions[1:3])
+        pdf.add_recommendation_box('1. Title Enhancement for Search Visibility',
+                                   '\n'.join(title_content), priority('title_priority'))
+        pdf.add_recommendation_box('2. Dynamic Pricing Strategy',
+                                   _plain_text(data.get('pricing_analysis')) or 'Research similar properties for competitive rates.',
+                                   priority('pricing_priority'))
+        if data.get('guest_profile_analysis'):
+            pdf.add_recommendation_box('3. Guest Experience Optimization',
+                                       _plain_text(data['guest_profile_analysis']), priority('experience_priority', 'LOW'))
+        if data.get('booking_gap_analysis'):
+            pdf.add_recommendation_box('4. Booking Gap Analysis & Optimization',
+                                       _plain_text(data['booking_gap_analysis']), priority('booking_priority'))
+
+        # Market analysis & competitive edge
+        pdf.add_page()
+        pdf.add_section_header('Market Analysis & Competitive Edge')
+        market_insights = market_analysis_data.get('market_insights') or []
+        if market_insights:
+            pdf.add_alert_box(' '.join(str(insight) for insight in market_insights[:3]), 'info')
+
+        amenity_lines = _content_lines(data.get('amenities'))
+        photo_lines = _content_lines(data.get('photo_audit'))
+        profile_lines = _content_lines(data.get('guest_profile_analysis'))
+        pdf.add_feature_grid([
+            ('Location Analysis', market_insights[0] if market_insights else f"Positioned in {location}.",
+             _as_percentage(competitive_scores.get('market_positioning'), 75)),
+            ('Amenities Analysis', amenity_lines[0] if amenity_lines else 'Amenity review pending.',
+             _as_percentage(competitive_scores.get('amenity_score'), 80)),
+            ('Visual Appeal', photo_lines[0] if photo_lines else 'Ensure high-quality photos of all key areas.',
+             _as_percentage(competitive_scores.get('visual_score'), 70)),
+            ('Guest Experience', profile_lines[0] if profile_lines else 'Tailor the stay to your core guests.',
+             _as_percentage(competitive_scores.get('experience_score'), 85)),
+        ])
+        if data.get('performance_insights'):
+            pdf.add_recommendation_box('Revenue Insights', _plain_text(data['performance_insights']))
+        if data.get('strategic_recommendations'):
+            pdf.add_recommendation_box('Strategic Recommendations', _plain_text(data['strategic_recommendations']))
+
+        # Content, amenities and pricing strategy
+        pdf.add_page()
+        pdf.add_section_header('Content & Visual Optimization')
+        if title_suggestions:
+            pdf.add_numbered_list(title_suggestions)
+        if data.get('optimized_description'):
+            pdf.add_alert_box(data['optimized_description'], 'success')
+        if amenity_lines:
+            pdf.add_section_header('AI-Suggested Amenities')
+            pdf.add_bullet_list(amenity_lines)
+
+        pdf.add_section_header('AI-Generated Pricing Strategy')
+        pdf.add_table(
+            ['Tactic', 'Adjustment', 'Stay', 'Window', 'Goal'],
+            [
+                ['Last-minute', f"{percent('lastminute_discount', '7-12')}% off", 'Any', '48 hours', 'Fill short gaps'],
+                ['Extended stay', f"{percent('extended_stay_discount', '18-22')}% off", '7+ nights', 'Anytime', 'Remote workers'],
+                ['Mid-week', f"{percent('midweek_discount', '12-18')}% off", 'Sun-Thu', 'Anytime', 'Mid-week gaps'],
+                ['Early bird', f"{percent('early_bird_discount', '8-12')}% off", 'Any', '60+ days', 'Lock in demand'],
+                ['Holiday', f"+{percent('holiday_premium', '40-60')}%", '4 nights', 'Peak dates', 'Premium rates'],
+            ]
+        )
+
+        # 30-day roadmap
+        pdf.add_page()
+        pdf.add_section_header('30-Day Implementation Roadmap')
+        roadmap = [
+            ('Week 1: Immediate Actions', [
+                f"Update title to: \"{title_suggestions[0]}\"" if title_suggestions else 'Update title with AI suggestions',
+                f"Consider rate adjustments of {percent('average_rate_adjustment', '20-40')}% based on market analysis",
+                f"Add weekend pricing premiums (up to {percent('holiday_premium', '40-60')}%)",
+            ]),
+            ('Week 2: Content Enhancement', [
+                f"Complete description rewrite using AI-generated content for {location}",
+                f"Create package offerings: {amenity_lines[0]}" if amenity_lines else 'Create package offerings',
+            ]),
+            ('Week 3: Revenue Optimization', [
+                f"Implement seasonal pricing strategy: {market_insights[0]}" if market_insights
+                else 'Implement AI-optimized seasonal pricing',
+                f"Create gap-filling discount rules: {percent('lastminute_discount', '7-12')}% last-minute, "
+                f"{percent('extended_stay_discount', '18-22')}% extended stays",
+            ]),
+            ('Week 4: Guest Experience Enhancement', [
+                f"Create digital welcome guide with local recommendations for {location}",
+            ]),
+        ]
+        for week_title, items in roadmap:
+            pdf.set_font(pdf.base_font, 'B', 12)
+            pdf.set_text_color(*pdf.colors['medium_gray'])
+            pdf.cell(0, 8, pdf.clean_text(week_title), 0, 1, 'L')
+            pdf.add_bullet_list(items)
+
+        pdf.add_final_cta()
+        pdf.output(output_path)
+
+        execution_time = time.time() - start_time
+        pdf_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if pdf_size > 0:
+            logger.info(f"🎉 Native fpdf2 SUCCESS! PDF: {pdf_size:,} bytes in {execution_time:.2f} seconds")
+            return True
+
+        logger.error("❌ PDF not created by native renderer")
+        return False
+
+    except Exception as e:
+        logger.error(f"❌ Native PDF generation error: {e}")
+        return False
+
+# Renderer selection: 'html' (WeasyPrint/wkhtmltopdf), 'parallel' (WeasyPrint per page section),
+# 'native' (fpdf2) or 'auto'
+PDF_RENDERER = os.getenv('PDF_RENDERER', 'auto').lower()
+# In auto mode, switch to the native renderer once recent HTML renders take longer than this (seconds)
+PDF_SLOW_RENDER_THRESHOLD = float(os.getenv('PDF_SLOW_RENDER_THRESHOLD', '10'))
+# How long auto mode stays on the native renderer before probing the HTML renderers again (seconds)
+PDF_HTML_RETRY_INTERVAL = float(os.getenv('PDF_HTML_RETRY_INTERVAL', '600'))
+
+_html_render_times = deque(maxlen=5)
+_html_render_lock = threading.Lock()
+_last_html_attempt = 0.0
+
+def _html_renderer_is_slow():
+    """True when recent HTML renders were slow and the retry interval has not passed"""
+    with _html_render_lock:
+        if not _html_render_times:
+            return False
+        recent = sorted(_html_render_times)[len(_html_render_times) // 2]
+        return recent > PDF_SLOW_RENDER_THRESHOLD and time.time() - _last_html_attempt < PDF_HTML_RETRY_INTERVAL
+
+def _record_html_render(duration):
+    global _last_html_attempt
+    with _html_render_lock:
+        _html_render_times.append(duration)
+        _last_html_attempt = time.time()
+
+# PDF rendering is CPU- and memory-heavy, so threaded workers render at most this many reports at once
+PDF_MAX_CONCURRENT_RENDERS = int(os.getenv('PDF_MAX_CONCURRENT_RENDERS', '2'))
+_render_slots = threading.BoundedSemaphore(max(1, PDF_MAX_CONCURRENT_RENDERS))
+
+def generate_professional_pdf(optimization_data, output_path, renderer=None):
+    """Generate the professional PDF with the requested renderer ('html', 'parallel', 'native' or 'auto')"""
+    with span('pdf.wait'):
+        _render_slots.acquire()
+    try:
+        return _generate_pdf(optimization_data, output_path, (renderer or PDF_RENDERER).lower())
+    finally:
+        _render_slots.release()
+
+def _generate_pdf(optimization_data, output_path, renderer):
+    if renderer == 'native':
+        return generate_native_pdf(optimization_data, output_path)
+
+    # WeasyPrint and its Pango/font stack load on the first HTML render, not at import
+    from .html_pdf_generator import generate_html_pdf, generate_html_pdf_parallel
+
+    if renderer == 'parallel':
+        with span('pdf.parallel'):
+            parallel_success = generate_html_pdf_parallel(optimization_data, output_path)
+        if parallel_success:
+            return True
+        logger.info("🔄 Section-parallel rendering failed - falling back to sequential HTML-to-PDF")
+
+    if renderer == 'auto' and _html_renderer_is_slow():
+        logger.info(f"⚡ HTML renderers are slow (> {PDF_SLOW_RENDER_THRESHOLD}s) - using native fpdf2 renderer")
+        return generate_native_pdf(optimization_data, output_path)
+
+    logger.debug("📄 Starting HTML-to-PDF generation...")
     
     # Use the enhanced HTML-to-PDF system with improved Chromium handling
-    return generate_html_pdf(optimization_data, output_path) 
\ No newline at end of file
+    start_time = time.time()
+    with span('pdf.html'):
+        success = generate_html_pdf(optimization_data, output_path)
+    _record_html_render(time.time() - start_time)
+
+    if not success and renderer == 'auto':
+        logger.info("🔄 HTML-to-PDF failed - falling back to native fpdf2 renderer")
+        return generate_native_pdf(optimization_data, output_path)
+
+    return success
@@ -0,0 +1,45 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+class PerProcessExecutor:
+    """
+    An executor created on first use in each process. gunicorn forks its workers from a
+    preloaded app, and a pool inherited across fork has no live threads, so a new process
+    gets a new pool.
+    """
+
+    def __init__(self, name, workers, processes=False):
+        self.name = name
+        self.workers = workers
+        self.processes = processes
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _create(self):
+        if self.processes:
+            # spawn avoids forking a threaded gunicorn worker; workers are reused across calls
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+
+    def get(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = self._create()
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.get().submit(fn, *args, **kwargs)
+
+    def reset(self):
+        """Drop the pool (e.g. after its workers crashed or timed out); the next use starts a new one"""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def per_process_executor(name, workers, processes=False):
+    return PerProcessExecutor(name, workers, processes)
@@ -0,0 +1,57 @@
+import re
+import unicodedata
+
+# Every section prompt of an optimization starts with the same bytes: one shared system message
+# carrying the listing context, followed by the section's own role and instructions. Provider-side
+# prompt caching matches on exact prefixes, so only the first call per listing pays full prefill.
+# Guest reviews are not part of the prefix: only the sentiment prompts read them, so they go in
+# those prompts' instructions (see reviews_block) instead of riding along with every section.
+SHARED_SYSTEM_PROMPT = (
+    "You are an expert short-term rental consultant helping an Airbnb host optimize their listing. "
+    "The listing you are analyzing is described below. Each request that follows asks for one part "
+    "of the analysis; answer only that request, in exactly the format it asks for."
+)
+
+CONTEXT_FIELDS = (
+    ('Title', 'title'),
+    ('Location', 'location'),
+    ('Listing URL', 'url'),
+    ('Description', 'description'),
+)
+
+_WHITESPACE_RUN = re.compile(r'[ \t\f\v]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+def normalize_text(value):
+    """Canonical form of a free-text field: NFC, '\\n' line endings, trimmed lines and runs of spaces"""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFC', str(value)).replace('\r\n', '\n').replace('\r', '\n')
+    text = '\n'.join(_WHITESPACE_RUN.sub(' ', line).strip() for line in text.split('\n'))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+def listing_context(title=None, description=None, location=None, url=None):
+    """
+    The listing block shared by all section prompts. Same inputs always give the same bytes:
+    fixed field order, normalized whitespace, nothing time- or request-dependent.
+    """
+    values = {'title': title, 'description': description, 'location': location, 'url': url}
+    lines = ["=== LISTING ==="]
+    for label, key in CONTEXT_FIELDS:
+        text = normalize_text(values[key])
+        if text:
+            lines.append(f"{label}:\n{text}" if '\n' in text else f"{label}: {text}")
+    lines.append("=== END LISTING ===")
+    return '\n'.join(lines)
+
+def reviews_block(reviews):
+    """Guest reviews for the instructions of a section that analyzes them ('' if there are none)"""
+    text = normalize_text(reviews)
+    return f"=== GUEST REVIEWS ===\n{text}\n=== END GUEST REVIEWS ===" if text else ''
+
+def build_messages(context, role, instructions):
+    """Chat messages for one section: the shared prefix (system + listing), then role and instructions"""
+    return [
+        {"role": "system", "content": f"{SHARED_SYSTEM_PROMPT}\n\n{context}"},
+        {"role": "user", "content": f"{role.strip()}\n\n{instructions.strip()}"},
+    ]
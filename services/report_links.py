@@ -0,0 +1,74 @@
+import os
+import hmac
+import time
+import hashlib
+import logging
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# Report delivery: 'attachment' emails the PDF, 'link' emails a signed, expiring download link instead
+REPORT_DELIVERY = os.getenv('REPORT_DELIVERY', 'attachment').lower()
+# Reports live in the dyno's temp directory and are gone after a restart (at least daily on
+# Heroku), so links aren't promised for longer than that
+REPORT_LINK_TTL = int(os.getenv('REPORT_LINK_TTL', str(24 * 3600)))
+# Public base URL of this backend, which serves /api/download (links in emails must be absolute)
+REPORT_LINK_BASE_URL = os.getenv(
+    'REPORT_LINK_BASE_URL', os.getenv('SERVER_URL', 'https://str-optimizer-backend-7d9de05e5c57.herokuapp.com')
+).rstrip('/')
+# When true, /api/download rejects requests without a valid signature
+REQUIRE_SIGNED_DOWNLOADS = os.getenv('REQUIRE_SIGNED_DOWNLOADS', 'false').lower() == 'true'
+
+# The placeholder from env.example / app.py - signing with it would let anyone forge links
+PLACEHOLDER_SECRET = 'your-secret-key-here'
+
+def _signing_key():
+    secret = os.getenv('FLASK_SECRET_KEY')
+    if not secret or secret == PLACEHOLDER_SECRET:
+        return None
+    return secret.encode()
+
+def signing_available():
+    """Whether a real FLASK_SECRET_KEY is configured to sign download links with"""
+    return _signing_key() is not None
+
+def sign_report_link(filename, expires):
+    """HMAC-SHA256 signature over the report filename and its expiry timestamp"""
+    key = _signing_key()
+    if key is None:
+        raise RuntimeError('FLASK_SECRET_KEY is not set - refusing to sign report links')
+    message = f"{filename}:{int(expires)}".encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+def build_report_download_path(pdf_path, ttl=None):
+    """
+    Relative download path for a stored report, e.g. for the frontend result. Signed when a
+    secret is configured; otherwise a plain path (only usable while downloads don't require signatures).
+    """
+    filename = os.path.basename(pdf_path)
+    if not signing_available():
+        logger.warning("⚠️ FLASK_SECRET_KEY not set - report download link is unsigned")
+        return f"/api/download/{filename}"
+    expires = int(time.time() + (ttl or REPORT_LINK_TTL))
+    query = urlencode({'expires': expires, 'signature': sign_report_link(filename, expires)})
+    return f"/api/download/{filename}?{query}"
+
+def build_report_download_url(pdf_path, ttl=None):
+    """Absolute signed download URL for a stored report, for use in emails"""
+    return f"{REPORT_LINK_BASE_URL}{build_report_download_path(pdf_path, ttl)}"
+
+def verify_report_link(filename, expires, signature):
+    """Return (valid, reason) for a download request's expiry and signature"""
+    if not expires or not signature:
+        return (not REQUIRE_SIGNED_DOWNLOADS), 'missing signature'
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False, 'invalid expiry'
+    if expires < time.time():
+        return False, 'link expired'
+    if not signing_available():
+        return False, 'link signing not configured'
+    if not hmac.compare_digest(sign_report_link(filename, expires), signature):
+        return False, 'invalid signature'
+    return True, 'ok'
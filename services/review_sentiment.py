@@ -0,0 +1,165 @@
+import os
+import re
+import math
+import logging
+import contextvars
+from concurrent.futures import wait
+from .prompt_builder import build_messages, normalize_text
+from .text_compression import count_tokens, dedupe_sentences
+from .section_pipeline import remaining_budget
+from .pools import per_process_executor
+
+logger = logging.getLogger(__name__)
+
+# Map-reduce sentiment for large review sets: a local lexicon scores every review, a stratified
+# sample (by sentiment) is split into a fixed number of chunks summarized in parallel, and the
+# partial summaries are reduced into the report's sentiment format. The number of LLM calls
+# and their sizes don't grow with the number of reviews, so neither does latency.
+# Reviews above this many tokens use map-reduce; smaller sets go in one prompt
+SENTIMENT_MAP_REDUCE_TOKENS = int(os.getenv('SENTIMENT_MAP_REDUCE_TOKENS', '2500'))
+SENTIMENT_CHUNK_TOKENS = int(os.getenv('SENTIMENT_CHUNK_TOKENS', '1500'))
+SENTIMENT_MAX_CHUNKS = int(os.getenv('SENTIMENT_MAX_CHUNKS', '6'))
+# Longest the map stage may take (also bounded by the optimization budget)
+SENTIMENT_MAP_TIMEOUT = float(os.getenv('SENTIMENT_MAP_TIMEOUT', '30'))
+
+POSITIVE_WORDS = frozenset("""
+amazing awesome beautiful best clean comfortable comfy cozy convenient delightful easy enjoyed
+excellent fantastic friendly gorgeous great helpful immaculate incredible lovely loved perfect
+pleasant quiet recommend relaxing responsive roomy spacious spotless stunning super welcoming
+wonderful
+""".split())
+NEGATIVE_WORDS = frozenset("""
+awful bad broken cold cramped dated dirty disappointed disappointing dusty expensive filthy
+hard horrible loud mold moldy musty noisy noise poor rude slow small smell smelly stained
+terrible thin tight uncomfortable unresponsive worn worst
+""".split())
+NEGATIONS = frozenset("not no never wasn't isn't weren't didn't don't wasnt isnt didnt dont hardly".split())
+
+_REVIEW_SPLIT = re.compile(r'\n\s*\n|\n(?=\s*(?:[-•*]|\d+[.)])\s)')
+_WORD = re.compile(r"[a-z']+")
+
+_executor = per_process_executor('sentiment', SENTIMENT_MAX_CHUNKS * 4)
+
+def split_reviews(reviews):
+    """Individual reviews from the pasted text: blank-line or bullet separated, else one per line"""
+    text = normalize_text(reviews)
+    parts = _REVIEW_SPLIT.split(text)
+    if len(parts) <= 1:
+        parts = text.split('\n')
+    return [part.strip(' -•*\t') for part in parts if part.strip(' -•*\t')]
+
+def lexicon_score(review):
+    """Polarity in [-1, 1] from positive/negative word counts, flipping words right after a negation"""
+    words = _WORD.findall(review.lower())
+    score = 0
+    for i, word in enumerate(words):
+        polarity = 1 if word in POSITIVE_WORDS else -1 if word in NEGATIVE_WORDS else 0
+        if polarity and any(w in NEGATIONS for w in words[max(0, i - 3):i]):
+            polarity = -polarity
+        score += polarity
+    return 0.0 if score == 0 else max(-1.0, min(1.0, score / 3))
+
+def needs_map_reduce(reviews):
+    return bool(reviews) and count_tokens(reviews) > SENTIMENT_MAP_REDUCE_TOKENS
+
+def _sample(scored, budget):
+    """
+    Representative reviews within a token budget: positive, mixed and negative reviews in
+    proportion to how common they are, but with at least a quarter of the budget for negatives
+    (complaints are rarer and matter most). Within a group, distinct reviews, strongest opinions first.
+    """
+    groups = {
+        'positive': [r for r in scored if r[1] > 0.2],
+        'mixed': [r for r in scored if -0.2 <= r[1] <= 0.2],
+        'negative': [r for r in scored if r[1] < -0.2],
+    }
+    total = len(scored) or 1
+    shares = {name: len(group) / total for name, group in groups.items()}
+    if groups['negative'] and shares['negative'] < 0.25:
+        shrink = 0.75 / (1 - shares['negative'])
+        shares = {name: 0.25 if name == 'negative' else share * shrink for name, share in shares.items()}
+
+    sample = []
+    for name, group in groups.items():
+        allowance = budget * shares[name]
+        # Repeated reviews count once; strongest opinions first, ties by position
+        scores, first_seen = dict(group), {}
+        for i, (review, _) in enumerate(group):
+            first_seen.setdefault(review, i)
+        for review in sorted(first_seen, key=lambda r: (-abs(scores[r]), first_seen[r])):
+            cost = count_tokens(review) + 2
+            if cost <= allowance:
+                sample.append(review)
+                allowance -= cost
+    return sample
+
+def _chunks(reviews, chunk_tokens):
+    chunk, used = [], 0
+    for review in reviews:
+        cost = count_tokens(review) + 2
+        if chunk and used + cost > chunk_tokens:
+            yield chunk
+            chunk, used = [], 0
+        chunk.append(review)
+        used += cost
+    if chunk:
+        yield chunk
+
+def _summarize_chunk(client, listing, chunk):
+    from .str_optimizer import chat_completion
+    reviews_text = '\n'.join(f"- {review}" for review in chunk)
+    prompt = f"""Summarize this batch of {len(chunk)} guest reviews for this listing.
+
+Reviews:
+{reviews_text}
+
+Reply in exactly this format, most frequent first, each point with a rough count of reviews mentioning it:
+Praise: [up to 4 points]
+Complaints: [up to 3 points]
+Emotional drivers: [up to 3 words or phrases]"""
+    response = chat_completion(client, 'sentiment_map',
+        messages=build_messages(listing, "You are a review analyst extracting recurring themes from guest feedback.", prompt)
+    )
+    return response.choices[0].message.content.strip()
+
+def map_reduce_sentiment(client, listing, reviews, format_prompt):
+    """Sentiment analysis of a large review set in format_prompt's format ('' if every chunk failed)"""
+    from .str_optimizer import chat_completion
+    all_reviews = split_reviews(reviews)
+    scored = [(review, lexicon_score(review)) for review in all_reviews]
+    positive_share = sum(1 for _, score in scored if score > 0) / max(1, sum(1 for _, score in scored if score))
+    recurring = [(sentence, count) for sentence, count in dedupe_sentences(all_reviews) if count > 1]
+
+    sample = _sample(scored, SENTIMENT_CHUNK_TOKENS * SENTIMENT_MAX_CHUNKS)
+    chunks = list(_chunks(sample, SENTIMENT_CHUNK_TOKENS))[:SENTIMENT_MAX_CHUNKS]
+    logger.info(f"🗂️ Map-reduce sentiment: {len(all_reviews)} reviews, {len(sample)} sampled into {len(chunks)} chunks")
+
+    futures = [_executor.submit(contextvars.copy_context().run, _summarize_chunk, client, listing, chunk)
+               for chunk in chunks]
+    budget = remaining_budget()
+    timeout = SENTIMENT_MAP_TIMEOUT if budget is None else max(0, min(SENTIMENT_MAP_TIMEOUT, budget * 0.6))
+    done, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    summaries = []
+    for future in futures:
+        if future in done and future.exception() is None:
+            summaries.append(future.result())
+        elif future in done:
+            logger.warning(f"Sentiment chunk error: {future.exception()}")
+    if not summaries:
+        return ""
+
+    partials = '\n\n'.join(f"Batch {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    repeated = ''.join(f"\n- \"{sentence}\" ({count} times)"
+                       for sentence, count in sorted(recurring, key=lambda r: -r[1])[:5])
+    prompt = f"""{format_prompt}
+
+Base the analysis on these summaries of {len(all_reviews)} guest reviews (analyzed in {len(summaries)} batches), not only on the excerpt above.
+A word-level pre-score rates {math.floor(positive_share * 100)}% of the opinionated reviews as positive.{' Verbatim repeats:' + repeated if repeated else ''}
+
+{partials}"""
+    response = chat_completion(client, 'sentiment',
+        messages=build_messages(listing, "You are an expert review sentiment analyst specializing in hospitality feedback analysis.", prompt)
+    )
+    return response.choices[0].message.content.strip()
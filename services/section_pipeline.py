@@ -0,0 +1,142 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from .pools import per_process_executor
+from .admission import ADMISSION_ENABLED, ADMISSION_MAX_CONCURRENT
+from .optimization_jobs import OPTIMIZATION_JOB_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Deadline-aware section runner for the optimization: independent sections run in parallel under
+# one latency budget, each with its own timeout. A section that is still running at its p95
+# latency can get a hedged duplicate (first answer wins); sections that miss their timeout or
+# the budget get their fallback value, so a slow completion can't hold up the whole response.
+OPTIMIZE_BUDGET = float(os.getenv('OPTIMIZE_BUDGET', '90'))
+SECTION_TIMEOUT = float(os.getenv('SECTION_TIMEOUT', '45'))
+# Threads per worker process shared by all requests' sections (the LLM gateway caps actual calls).
+# Sized so every optimization a worker can run at once - admitted /api/optimize requests plus
+# background jobs - gets a thread per section and hedge without queueing behind the others;
+# a section that waits in the queue burns its timeout before it starts.
+SECTIONS_PER_OPTIMIZATION = 16
+SECTION_WORKERS = int(os.getenv('SECTION_WORKERS', '0')) or SECTIONS_PER_OPTIMIZATION * (
+    (ADMISSION_MAX_CONCURRENT if ADMISSION_ENABLED else int(os.getenv('GUNICORN_THREADS', '32')))
+    + OPTIMIZATION_JOB_WORKERS
+)
+SECTION_HEDGING = os.getenv('SECTION_HEDGING', 'true').lower() == 'true'
+# Until a section has this many latency samples, hedge after a fixed delay
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '15'))
+
+_deadline = contextvars.ContextVar('optimization_deadline', default=None)
+
+_executor = per_process_executor('section', SECTION_WORKERS)
+
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+class Section:
+    """One unit of the pipeline: func() -> value, or fallback if it fails or runs out of time"""
+
+    def __init__(self, name, func, fallback=None, timeout=None, hedge=False):
+        self.name = name
+        self.func = func
+        self.fallback = fallback
+        self.timeout = timeout or SECTION_TIMEOUT
+        self.hedge = hedge
+
+def remaining_budget():
+    """Seconds left in the current optimization's budget, or None outside a pipeline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+def start_budget(seconds=None):
+    """Start the latency budget for this optimization (inherited by its section threads)"""
+    return _deadline.set(time.time() + (seconds or OPTIMIZE_BUDGET))
+
+def end_budget(token):
+    _deadline.reset(token)
+
+def _record_latency(name, seconds):
+    with _latencies_lock:
+        samples = _latencies.get(name)
+        if samples is None:
+            samples = _latencies[name] = deque(maxlen=200)
+        samples.append(seconds)
+
+def hedge_delay(name):
+    """p95 of the section's recent successful latencies (fixed default until there are enough)"""
+    with _latencies_lock:
+        samples = sorted(_latencies.get(name) or ())
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return samples[int(len(samples) * 0.95) - 1]
+
+def _timed_call(section):
+    start = time.time()
+    value = section.func()
+    _record_latency(section.name, time.time() - start)
+    return value
+
+def _submit(section):
+    # Each attempt runs in a copy of the caller's context: request spans and the deadline follow it
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, _timed_call, section)
+
+def run_sections(sections, reserve=0):
+    """
+    Run sections in parallel and return ({name: value}, [names that fell back]). Waiting stops
+    at each section's timeout and at the overall budget (less `reserve` seconds kept for later
+    stages); work still outstanding then is cancelled (queued) or abandoned (running - its LLM
+    calls are bounded by the overall deadline).
+    """
+    start = time.time()
+    budget_left = remaining_budget()
+    budget_end = (start + budget_left if budget_left is not None else start + OPTIMIZE_BUDGET) - reserve
+
+    attempts = {section.name: [_submit(section)] for section in sections}
+    by_name = {section.name: section for section in sections}
+    cutoffs = {section.name: min(start + section.timeout, budget_end) for section in sections}
+    hedge_at = {section.name: start + hedge_delay(section.name)
+                for section in sections if section.hedge and SECTION_HEDGING}
+    results, fell_back = {}, []
+
+    def resolve(name, value, failed):
+        results[name] = value
+        if failed:
+            fell_back.append(name)
+        for future in attempts[name]:
+            future.cancel()
+
+    while len(results) < len(sections):
+        now = time.time()
+        for name, cutoff in cutoffs.items():
+            if name not in results and now >= cutoff:
+                logger.warning(f"⏱️ Section {name} timed out after {now - start:.1f}s - using fallback")
+                resolve(name, by_name[name].fallback, True)
+        for name, at in list(hedge_at.items()):
+            if name not in results and now >= at:
+                logger.info(f"🏇 Hedging slow section {name} after {now - start:.1f}s")
+                attempts[name].append(_submit(by_name[name]))
+                del hedge_at[name]
+
+        pending = [name for name in attempts if name not in results]
+        live = [future for name in pending for future in attempts[name] if not future.done()]
+        if live:
+            next_event = min([cutoffs[name] for name in pending] +
+                             [at for name, at in hedge_at.items() if name not in results])
+            wait(live, timeout=max(0, next_event - time.time()), return_when=FIRST_COMPLETED)
+
+        for name in pending:
+            finished = [future for future in attempts[name] if future.done() and not future.cancelled()]
+            succeeded = [future for future in finished if future.exception() is None]
+            if succeeded:
+                resolve(name, succeeded[0].result(), False)
+            elif finished and all(future.done() for future in attempts[name]):
+                logger.warning(f"Section {name} error: {finished[0].exception()}")
+                resolve(name, by_name[name].fallback, True)
+
+    return results, fell_back
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from .sqlite_store import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Backend for login sessions: 'sqlite' (shared by all workers on the host, survives worker
+# recycling), 'redis' (REDIS_URL, shared across hosts) or 'memory' (single worker / development)
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite').lower()
+REDIS_URL = os.getenv('REDIS_URL')
+# Expired sessions are swept at most this often, on create and on lookup (lookups ignore them regardless)
+SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))
+
+# Seconds to wait for Redis when connecting and per command, so an outage can't hang request threads
+REDIS_TIMEOUT = 2
+
+SESSIONS_DB = 'sessions'
+SESSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    namespace TEXT NOT NULL,
+    token_hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, token_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+"""
+
+def _hash_token(token):
+    """Only a hash of each token is stored, so a copy of the store can't be replayed"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionStore:
+    """Token -> session data with a TTL. Subclasses implement _put, _get, _delete and _sweep."""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._last_sweep = 0
+
+    def create(self, data, ttl):
+        """Store data for ttl seconds and return the new session token"""
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        self._put(_hash_token(token), dict(data, created_at=now, expires_at=now + ttl), now + ttl)
+        self.sweep()
+        return token
+
+    def get(self, token):
+        """Session data for a token, or None if it is unknown or expired"""
+        if not token:
+            return None
+        key = _hash_token(token)
+        data = self._get(key)
+        self.sweep()
+        if data is None:
+            return None
+        if data['expires_at'] < time.time():
+            self._delete(key)
+            return None
+        return data
+
+    def delete(self, token):
+        if token:
+            self._delete(_hash_token(token))
+
+    def sweep(self, force=False):
+        """Remove expired sessions, at most every SESSION_SWEEP_INTERVAL seconds unless forced"""
+        now = time.time()
+        if not force and now - self._last_sweep < SESSION_SWEEP_INTERVAL:
+            return 0
+        self._last_sweep = now
+        removed = self._sweep(now)
+        if removed:
+            logger.debug(f"🧹 Swept {removed} expired {self.namespace} sessions")
+        return removed
+
+class MemorySessionStore(SessionStore):
+    """Process-local sessions - only correct with a single worker"""
+
+    def __init__(self, namespace):
+        super().__init__(namespace)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _put(self, key, data, expires_at):
+        with self._lock:
+            self._sessions[key] = data
+
+    def _get(self, key):
+        with self._lock:
+            return self._sessions.get(key)
+
+    def _delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _sweep(self, now):
+        with self._lock:
+            expired = [key for key, data in self._sessions.items() if data['expires_at'] < now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in the shared SQLite data dir, keyed by (namespace, token hash)"""
+
+    def _connection(self):
+        return get_connection(SESSIONS_DB, SESSIONS_SCHEMA)
+
+    def _put(self, key, data, expires_at):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (namespace, token_hash, data, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(data), expires_at)
+        )
+
+    def _get(self, key):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE namespace = ? AND token_hash = ?", (self.namespace, key)
+        ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def _delete(self, key):
+        self._connection().execute(
+            "DELETE FROM sessions WHERE namespace = ? AND token_hash = ?", (self.namespace, key)
+        )
+
+    def _sweep(self, now):
+        return self._connection().execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis; keys carry their own TTL, so Redis does the sweeping"""
+
+    def __init__(self, namespace, client):
+        super().__init__(namespace)
+        self._client = client
+
+    def _key(self, key):
+        return f"session:{self.namespace}:{key}"
+
+    def _put(self, key, data, expires_at):
+        self._client.set(self._key(key), json.dumps(data), ex=max(1, int(expires_at - time.time())))
+
+    def _get(self, key):
+        value = self._client.get(self._key(key))
+        return json.loads(value) if value else None
+
+    def _delete(self, key):
+        self._client.delete(self._key(key))
+
+    def _sweep(self, now):
+        return 0
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _create_store(namespace):
+    if SESSION_STORE == 'memory':
+        return MemorySessionStore(namespace)
+    if SESSION_STORE == 'redis':
+        try:
+            import redis
+        except ImportError as e:
+            # A missing package is a deploy mistake, not an outage - don't hide it behind the fallback
+            raise RuntimeError("SESSION_STORE=redis needs the redis package (see requirements.txt)") from e
+        try:
+            client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT)
+            # Fail over at startup rather than on the first login
+            client.ping()
+            return RedisSessionStore(namespace, client)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis session store unavailable ({e}) - using SQLite")
+    return SQLiteSessionStore(namespace)
+
+def get_session_store(namespace):
+    """Shared store for one kind of session (e.g. 'admin'), using the SESSION_STORE backend"""
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is None:
+            store = _stores[namespace] = _create_store(namespace)
+        return store
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit
+from .sqlite_store import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Single-flight: identical optimizations that overlap (double clicks, frontend retries) share one
+# computation. Within a worker followers wait on an Event; across workers a lease row in the
+# shared SQLite store marks the leader and holds its result for a short while.
+FLIGHTS_DB = 'single_flight'
+FLIGHTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    locked_until REAL,
+    finished_at REAL
+);
+"""
+
+# A leader that hasn't finished within the lease (crashed worker) is replaced by the next caller
+SINGLE_FLIGHT_LEASE = int(os.getenv('SINGLE_FLIGHT_LEASE', '300'))
+# Finished results are reused by identical requests arriving this soon afterwards (a timed-out retry)
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', '120'))
+SINGLE_FLIGHT_POLL_INTERVAL = 0.5
+# Longest a follower waits for the leader's result (a request's own deadline, under the gunicorn timeout)
+SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', '110'))
+
+# Inputs that change the result; everything else in the form (e.g. UI flags) is ignored
+KEY_FIELDS = ('title', 'description', 'reviews', 'email', 'image_url', 'wants_pdf', 'wants_email',
+              'pdf_renderer', 'report_delivery', 'session_id', 'idempotency_key')
+
+class SingleFlightTimeout(Exception):
+    """An identical optimization is still running after the caller's wait"""
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def canonical_listing(url):
+    """Listing identity independent of tracking params, case and host variants (airbnb.com/.co.uk/www)"""
+    if not url:
+        return ''
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/')
+    if 'airbnb.' in host and '/rooms/' in path:
+        return 'airbnb:' + path.split('/rooms/')[1].split('/')[0]
+    return f"{host}{path}"
+
+def optimization_key(form_data):
+    """Hash of the canonical listing plus every input that affects the optimization result"""
+    inputs = {field: form_data.get(field) for field in KEY_FIELDS}
+    inputs['listing'] = canonical_listing(form_data.get('url') or form_data.get('listingUrl'))
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def _connection():
+    return get_connection(FLIGHTS_DB, FLIGHTS_SCHEMA)
+
+def _claim(key, owner):
+    """
+    Try to become the leader across workers. Returns ('leader', None), ('done', result) for a
+    recent result, or ('wait', None) while another worker holds a live lease.
+    """
+    now = time.time()
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM flights WHERE key = ?", (key,)).fetchone()
+        if row and row['status'] == 'done' and row['finished_at'] >= now - SINGLE_FLIGHT_RESULT_TTL:
+            outcome = ('done', json.loads(row['result']))
+        elif row and row['status'] == 'running' and row['locked_until'] >= now:
+            outcome = ('wait', None)
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO flights (key, owner, status, locked_until) VALUES (?, ?, 'running', ?)",
+                (key, owner, now + SINGLE_FLIGHT_LEASE)
+            )
+            outcome = ('leader', None)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return outcome
+
+def _finish(key, owner, result=None, error=None):
+    conn = _connection()
+    if error is None:
+        try:
+            payload = json.dumps(result)
+        except (TypeError, ValueError) as e:
+            # Can't be shared across workers - release the flight so followers compute their own
+            logger.warning(f"⚠️ Single-flight result not shareable ({key[:12]}): {e}")
+            conn.execute(
+                "UPDATE flights SET status = 'abandoned', locked_until = NULL, finished_at = ? WHERE key = ? AND owner = ?",
+                (time.time(), key, owner)
+            )
+            return
+        conn.execute(
+            "UPDATE flights SET status = 'done', result = ?, error = NULL, finished_at = ?, locked_until = NULL "
+            "WHERE key = ? AND owner = ?",
+            (payload, time.time(), key, owner)
+        )
+    else:
+        conn.execute(
+            "UPDATE flights SET status = 'failed', error = ?, finished_at = ?, locked_until = NULL "
+            "WHERE key = ? AND owner = ?",
+            (str(error), time.time(), key, owner)
+        )
+    conn.execute("DELETE FROM flights WHERE finished_at < ?", (time.time() - SINGLE_FLIGHT_RESULT_TTL,))
+
+def _wait_for_leader(key, owner, compute, deadline):
+    """Follow another worker's computation until deadline; take over if its lease lapses or it gives up"""
+    while True:
+        if time.time() >= deadline:
+            raise SingleFlightTimeout(f"Identical optimization still running ({key[:12]})")
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        row = _connection().execute("SELECT * FROM flights WHERE key = ?", (key,)).fetchone()
+        if row and row['status'] == 'done':
+            return json.loads(row['result'])
+        if row and row['status'] == 'failed':
+            raise Exception(row['error'])
+        if row is None or (row['locked_until'] or 0) < time.time():
+            state, result = _claim(key, owner)
+            if state == 'done':
+                return result
+            if state == 'leader':
+                return _lead(key, owner, compute)
+
+def _lead(key, owner, compute):
+    try:
+        result = compute()
+    except Exception as e:
+        _record_outcome(key, owner, error=e)
+        raise
+    _record_outcome(key, owner, result=result)
+    return result
+
+def _record_outcome(key, owner, result=None, error=None):
+    # The computation is done - failing to share it must not cost this caller its result
+    try:
+        _finish(key, owner, result=result, error=error)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record single-flight outcome ({key[:12]}): {e}")
+
+def _run_shared(key, compute, deadline):
+    owner = uuid.uuid4().hex
+    try:
+        state, result = _claim(key, owner)
+    except Exception as e:
+        # Without the shared store we still dedupe within this worker
+        logger.warning(f"⚠️ Single-flight store unavailable, running locally: {e}")
+        return compute()
+
+    if state == 'done':
+        logger.info(f"🔁 Reusing a just-finished identical optimization ({key[:12]})")
+        return result
+    if state == 'wait':
+        logger.info(f"🔁 Identical optimization running in another worker - waiting for it ({key[:12]})")
+        return _wait_for_leader(key, owner, compute, deadline)
+    return _lead(key, owner, compute)
+
+def single_flight(key, compute, timeout=None):
+    """
+    Run compute() once for all concurrent callers with the same key, in this process and across
+    workers; every caller gets the same result (or the same exception). A caller that has waited
+    timeout seconds (SINGLE_FLIGHT_WAIT) for someone else's run gets SingleFlightTimeout.
+    """
+    deadline = time.time() + (timeout or SINGLE_FLIGHT_WAIT)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        logger.info(f"🔁 Identical optimization already in flight - sharing its result ({key[:12]})")
+        if not flight.done.wait(max(0, deadline - time.time())):
+            raise SingleFlightTimeout(f"Identical optimization still running ({key[:12]})")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_shared(key, compute, deadline)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
@@ -0,0 +1,132 @@
+import logging
+import os
+import time
+import smtplib
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Small pool of authenticated SMTP connections per server/account, reused across sends
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '2'))
+# Per-connection socket timeout - never set process-wide
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '10'))
+# Idle connections are checked with NOOP before reuse, and dropped once the server would have closed them
+SMTP_NOOP_AFTER = 30
+SMTP_MAX_IDLE = float(os.getenv('SMTP_MAX_IDLE', '240'))
+
+# Errors that mean the connection is unusable and the send should be retried on a fresh one
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+class SMTPConnectionPool:
+    """Thread-safe pool of logged-in SMTP connections for one server and account"""
+
+    def __init__(self, host, port, use_ssl, username, password, size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._idle = []  # (connection, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, size))
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.port == 587:
+                server.starttls()
+        try:
+            server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        logger.info(f"🔐 Opened SMTP connection to {self.host}:{self.port}")
+        return server
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self):
+        """Reuse an idle connection that is still alive, otherwise open a new one"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+
+            idle_for = time.time() - last_used
+            if idle_for > SMTP_MAX_IDLE:
+                self._close(server)
+            elif idle_for < SMTP_NOOP_AFTER or self._is_alive(server):
+                return server
+            else:
+                self._close(server)
+
+        return self._connect()
+
+    def _checkin(self, server):
+        with self._lock:
+            self._idle.append((server, time.time()))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool only if the block completes cleanly"""
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception:
+                self._close(server)
+                raise
+            self._checkin(server)
+
+    def send_message(self, msg):
+        """Send a message, retrying once on a fresh connection if the pooled one has gone stale"""
+        for attempt in range(2):
+            try:
+                with self.connection() as server:
+                    server.send_message(msg)
+                return
+            except RECONNECT_ERRORS as e:
+                if attempt:
+                    raise
+                logger.info(f"🔄 SMTP connection to {self.host}:{self.port} dropped ({e}) - reconnecting")
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+def get_smtp_pool(host, port, use_ssl, username, password):
+    """Return the shared pool for this server and account (pools are never shared across a fork)"""
+    global _pools_pid
+    key = (host, port, use_ssl, username, password)
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPConnectionPool(host, port, use_ssl, username, password)
+        return pool
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Shared on-disk state lives here so every gunicorn worker on the dyno sees the same data
+DATA_DIR = os.getenv('STR_DATA_DIR', os.path.join(tempfile.gettempdir(), 'str-optimizer'))
+
+_local = threading.local()
+
+def get_connection(name, schema=None):
+    """
+    Return this thread's connection to the named SQLite database, creating it on first use.
+    Connections are per thread and per process (never shared across a fork) and run in
+    autocommit mode - use BEGIN IMMEDIATE for read-modify-write sequences.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    conn = connections.get(name)
+    if conn is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(DATA_DIR, f'{name}.sqlite3'), timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers in other workers proceed while one worker writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if schema:
+            conn.executescript(schema)
+        connections[name] = conn
+
+    return conn
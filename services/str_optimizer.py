@@ -1,30 +1,93 @@
+import logging
 import os
 import requests
 from bs4 import BeautifulSoup
-from openai import OpenAI
 from .airbnb_scraper import scrape_airbnb_images
 from .pdf_generator import generate_professional_pdf
-from .email_service import send_email
+from .email_outbox import enqueue_email
+from .report_links import build_report_download_path
+from .instrumentation import span
+from . import llm_gateway
+from .section_pipeline import Section, run_sections, start_budget, end_budget, OPTIMIZE_BUDGET
+from .llm_usage import start_request, end_request, request_summary
+from .model_routing import apply_route
+from .prompt_builder import listing_context, build_messages, reviews_block
+from .text_compression import compress_description, compress_reviews
+from .review_sentiment import needs_map_reduce, map_reduce_sentiment
+from .title_ranking import TITLE_CANDIDATES, parse_candidates, rank_titles
 import tempfile
 import json
 import random
 from datetime import datetime, timedelta
 import uuid
+import threading
 import urllib.parse
 
-# Initialize OpenAI client - handle missing API key gracefully
+logger = logging.getLogger(__name__)
+
+# Per-call timeout for OpenAI requests - the client is shared by all request threads.
+# Retries are done by the LLM gateway (services/llm_gateway.py), not the client.
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+# Share of the optimization budget kept for the sections that build on the first round's results
+DEPENDENT_SECTIONS_SHARE = 0.25
+
+# Report values used when an analytics section fails or runs out of time
+DEFAULT_COMPETITIVE_SCORES = {
+    'market_positioning': 75,
+    'amenity_score': 80,
+    'visual_score': 70,
+    'experience_score': 85
+}
+DEFAULT_REVENUE_PROJECTIONS = {
+    'booking_improvement': 25,
+    'revenue_impact': 30,
+    'occupancy_rates': {'current': 65, 'optimized': 85},
+    'seasonal_adjustments': 'Dynamic pricing recommended for peak seasons'
+}
+DEFAULT_DYNAMIC_PERCENTAGES = {
+    'search_visibility': 25,
+    'conversion_rate': 20,
+    'average_rate_adjustment': 15
+}
+DEFAULT_TASK_PRIORITIES = {
+    'title_priority': 'HIGH',
+    'pricing_priority': 'HIGH',
+    'photo_priority': 'HIGH',
+    'experience_priority': 'LOW',
+    'booking_priority': 'HIGH'
+}
+
+_client = None
+_client_lock = threading.Lock()
+
+# Initialize OpenAI client on first use - handle missing API key gracefully
 def get_openai_client():
+    """Shared OpenAI client, created (and the openai package imported) on the first AI call"""
+    global _client
+    if _client is not None:
+        return _client
+
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        print("Warning: OPENAI_API_KEY not set. AI features will be limited.")
+        logger.warning("Warning: OPENAI_API_KEY not set. AI features will be limited.")
         return None
-    try:
-        return OpenAI(api_key=api_key)
-    except Exception as e:
-        print(f"Warning: Could not initialize OpenAI client: {e}")
-        return None
-
-client = get_openai_client()
+    with _client_lock:
+        if _client is None:
+            try:
+                from openai import OpenAI
+                _client = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0)
+            except Exception as e:
+                logger.warning(f"Warning: Could not initialize OpenAI client: {e}")
+        return _client
+
+def chat_completion(client, section, **kwargs):
+    """
+    client.chat.completions.create via the LLM gateway, timed as the 'llm.<section>' stage, with
+    the section's model, temperature and max_tokens from the routing table unless the call sets its own
+    """
+    kwargs = apply_route(section, kwargs)
+    with span(f"llm.{section}"):
+        return llm_gateway.chat_completion(client, section, **kwargs)
 
 def generate_mock_trend_data():
     """Generate realistic mock data for occupancy and revenue trends"""
@@ -174,8 +237,7 @@ Examples of good responses:
 
 Return only the location, nothing else."""
                     
-                    location_response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
+                    location_response = chat_completion(client, 'location',
                         messages=[
                             {"role": "system", "content": "You are a location extraction expert. Extract locations from text with high accuracy."},
                             {"role": "user", "content": location_prompt}
@@ -193,7 +255,7 @@ Return only the location, nothing else."""
                             city = ai_location
                             
                 except Exception as e:
-                    print(f"AI location extraction failed: {e}")
+                    logger.warning(f"AI location extraction failed: {e}")
         
         # Strategy 4: Final fallback - try to scrape from the actual page
         if not location:
@@ -219,10 +281,10 @@ Return only the location, nothing else."""
                     location = city
                     
             except Exception as e:
-                print(f"Page scraping for location failed: {e}")
+                logger.warning(f"Page scraping for location failed: {e}")
     
     except Exception as e:
-        print(f"Location extraction error: {e}")
+        logger.warning(f"Location extraction error: {e}")
     
     return location, city, country
 
@@ -298,7 +360,20 @@ def generate_competitor_pricing_data(location, property_type):
     return sorted(competitors, key=lambda x: x['price'])
 
 def optimize_listing(form_data):
-    """Main optimization function that processes STR listing data"""
+    """Main optimization function that processes STR listing data, within OPTIMIZE_BUDGET seconds"""
+    budget_token = start_budget()
+    usage_token, usage = start_request(form_data.get('tier'))
+    try:
+        return _optimize_listing(form_data)
+    finally:
+        summary = request_summary(usage)
+        logger.info(f"💰 LLM usage: {summary['calls']} calls, {summary['prompt_tokens']} prompt "
+                    f"({summary['cached_prompt_tokens']} cached) + {summary['completion_tokens']} completion tokens, ${summary['cost_usd']:.4f}",
+                    extra={'llm_usage': summary})
+        end_request(usage_token)
+        end_budget(budget_token)
+
+def _optimize_listing(form_data):
     # Handle both 'url' and 'listingUrl' keys from frontend
     url = form_data.get('url') or form_data.get('listingUrl')
     title = form_data.get('title')
@@ -308,12 +383,14 @@ def optimize_listing(form_data):
     wants_pdf = form_data.get('wants_pdf', False)
     wants_email = form_data.get('wants_email', False)
     image_url = form_data.get('image_url')
+    pdf_renderer = form_data.get('pdf_renderer')  # 'html', 'native' or 'auto' - defaults to PDF_RENDERER
+    client = get_openai_client()
 
-    print(f"🔍 Processing optimization request:")
-    print(f"  URL: {url}")
-    print(f"  Title: {title}")
-    print(f"  Description: {description[:100] if description else 'None'}...")
-    print(f"  Email: {email}")
+    logger.info(f"🔍 Processing optimization request:")
+    logger.debug(f"  URL: {url}")
+    logger.debug(f"  Title: {title}")
+    logger.debug(f"  Description: {description[:100] if description else 'None'}...")
+    logger.debug(f"  Email: {email}")
 
     # Get description from URL if not provided manually
     if not description and url:
@@ -326,7 +403,8 @@ def optimize_listing(form_data):
                 'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1'
             }
-            response = requests.get(url, headers=headers, timeout=10)
+            with span('scrape.listing'):
+                response = requests.get(url, headers=headers, timeout=10)
             response.raise_for_status()
 
             if 'text/html' not in response.headers.get('content-type', ''):
@@ -348,7 +426,8 @@ def optimize_listing(form_data):
         raise Exception('No description provided or found')
 
     # Extract location dynamically from URL and content
-    location, city, country = extract_location_from_url_and_content(url, title, description)
+    with span('location'):
+        location, city, country = extract_location_from_url_and_content(url, title, description)
     
     # If no location detected, use generic terms
     if not location:
@@ -356,22 +435,25 @@ def optimize_listing(form_data):
         city = "your city"
         country = "your country"
     
-    print(f"📍 Detected location: {location}")
+    logger.debug(f"📍 Detected location: {location}")
+
+    # Listing context shared, byte for byte, as the prefix of every section prompt (provider prompt caching).
+    # Long descriptions and review dumps are cut to their token budgets first; the reviews only go to sentiment.
+    with span('compress'):
+        listing = listing_context(title=title, description=compress_description(description), location=location, url=url)
+        review_excerpt = reviews_block(compress_reviews(reviews))
 
     # Generate optimized title and description with enhanced prompts
     title_prompt = (
-        f"Create 3 compelling Airbnb titles that attract suitable guests. Follow these guidelines:\n"
+        f"Create {TITLE_CANDIDATES} compelling Airbnb titles for this listing that attract suitable guests. Follow these guidelines:\n"
         f"- Aim for 50 characters or less (Airbnb recommendation), but prioritize impact over strict length\n"
         f"- Include location/neighborhood if mentioned\n"
         f"- Highlight unique features or amenities\n"
         f"- Use power words that attract guests\n"
         f"- Make them searchable and descriptive\n"
         f"- Each title should have a different approach/focus\n\n"
-        f"Original listing info: {description}\n\n"
-        f"Return exactly 3 titles, each on a separate line, numbered 1-3. Example format:\n"
-        f"1. First title option here\n"
-        f"2. Second title option here\n"
-        f"3. Third title option here"
+        f"Return only a JSON object with exactly {TITLE_CANDIDATES} titles, in this format:\n"
+        f'{{"titles": ["First title option here", "Second title option here", "..."]}}'
     )
 
     description_prompt = (
@@ -382,84 +464,64 @@ def optimize_listing(form_data):
         f"- Use engaging, descriptive language\n"
         f"- NO call-to-action needed\n"
         f"- Keep it concise and impactful\n\n"
-        f"Property details: {description}\n"
-        f"Location: {location}\n\n"
         f"Return only the 2-3 line summary, nothing else."
     )
 
     # Generate optimized titles (3 options)
-    title_suggestions = []
-    if client:
-        title_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert Airbnb title optimizer who creates high-converting listing titles with different strategic approaches."},
-                {"role": "user", "content": title_prompt}
-            ]
-        )
-        title_response_text = title_response.choices[0].message.content.strip()
-        
-        # Parse the numbered list response
-        lines = title_response_text.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line and (line.startswith(('1.', '2.', '3.')) or line.startswith(('1)', '2)', '3)'))):
-                # Remove the number prefix and clean up
-                title = line.split('.', 1)[-1].split(')', 1)[-1].strip()
-                if title:
-                    # Keep full title - let users see complete suggestions
-                    title_suggestions.append(title)
-        
-        # Fallback if parsing failed - create 3 variations
-        if len(title_suggestions) < 3:
+    def title_section():
+        title_suggestions = []
+        if client:
+            title_response = chat_completion(client, 'title',
+                messages=build_messages(listing, "You are an expert Airbnb title optimizer who creates high-converting listing titles with different strategic approaches.", title_prompt),
+                response_format={"type": "json_object"}
+            )
+            # Several candidates in one call; the best 3 are picked locally (services/title_ranking.py)
+            candidates = parse_candidates(title_response.choices[0].message.content)
+            title_suggestions = rank_titles(candidates, location)
+
+            # Fallback if parsing failed - create 3 variations
+            if len(title_suggestions) < 3:
+                title_suggestions = [
+                    "★ Beautiful Property | Perfect Location",
+                    "🏡 Stunning Home | Great Amenities",
+                    "✨ Cozy Retreat | Prime Location"
+                ]
+        else:
             title_suggestions = [
                 "★ Beautiful Property | Perfect Location",
-                "🏡 Stunning Home | Great Amenities",
+                "🏡 Stunning Home | Great Amenities", 
                 "✨ Cozy Retreat | Prime Location"
             ]
-    else:
-        title_suggestions = [
-            "★ Beautiful Property | Perfect Location",
-            "🏡 Stunning Home | Great Amenities", 
-            "✨ Cozy Retreat | Prime Location"
-        ]
-    
-    # Keep the first title as optimized_title for backward compatibility
-    optimized_title = title_suggestions[0] if title_suggestions else "★ Beautiful Property | Perfect Location"
+        return title_suggestions
 
     # Generate optimized description
-    if client:
-        desc_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert Airbnb listing optimizer who writes compelling descriptions that convert browsers into bookers."},
-                {"role": "user", "content": description_prompt}
-            ]
-        )
-        optimized_description = desc_response.choices[0].message.content.strip()
-    else:
-        optimized_description = f"Discover comfort and style at this exceptional property in {location}. Featuring modern amenities and thoughtful design for the perfect getaway."
+    def description_section():
+        if client:
+            desc_response = chat_completion(client, 'description',
+                messages=build_messages(listing, "You are an expert Airbnb listing optimizer who writes compelling descriptions that convert browsers into bookers.", description_prompt)
+            )
+            optimized_description = desc_response.choices[0].message.content.strip()
+        else:
+            optimized_description = f"Discover comfort and style at this exceptional property in {location}. Featuring modern amenities and thoughtful design for the perfect getaway."
+        return optimized_description
 
     # Suggest amenities
-    if client:
-        amenities_prompt = f"Suggest exactly 5 missing amenities that would improve this Airbnb listing: {description}. Format your response with each amenity on its own line like this:\n1. First amenity\n2. Second amenity\n3. Third amenity\n4. Fourth amenity\n5. Fifth amenity"
-        amenities_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an Airbnb amenity expert."},
-                {"role": "user", "content": amenities_prompt}
-            ]
-        )
-        amenities = amenities_response.choices[0].message.content.strip()
-    else:
-        amenities = ""
+    def amenities_section():
+        if client:
+            amenities_prompt = f"Suggest exactly 5 missing amenities that would improve this Airbnb listing. Format your response with each amenity on its own line like this:\n1. First amenity\n2. Second amenity\n3. Third amenity\n4. Fourth amenity\n5. Fifth amenity"
+            amenities_response = chat_completion(client, 'amenities',
+                messages=build_messages(listing, "You are an Airbnb amenity expert.", amenities_prompt)
+            )
+            amenities = amenities_response.choices[0].message.content.strip()
+        else:
+            amenities = ""
+        return amenities
 
     # ENHANCED: Detailed Review Sentiment Analysis
-    review_sentiment_analysis = ""
-    if reviews and client:
-        sentiment_prompt = f"""Analyze these Airbnb reviews for detailed sentiment insights:
-
-Reviews: {reviews}
+    def sentiment_section():
+        review_sentiment_analysis = ""
+        if reviews and client:
+            sentiment_prompt = f"""Analyze this listing's guest reviews for detailed sentiment insights.
 
 Provide analysis in exactly this format:
 **Recurring Praise**
@@ -474,26 +536,30 @@ Provide analysis in exactly this format:
 - Key emotional drivers: [list top 2-3]
 
 **Actionable Insights**
-- [2-3 specific recommendations based on feedback patterns]"""
-        
-        try:
-            sentiment_response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert review sentiment analyst specializing in hospitality feedback analysis."},
-                    {"role": "user", "content": sentiment_prompt}
-                ]
-            )
-            review_sentiment_analysis = sentiment_response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Sentiment analysis error: {e}")
-    
-    # No static fallback - only show AI-generated content
+- [2-3 specific recommendations based on feedback patterns]
+
+{review_excerpt}"""
+
+            try:
+                if needs_map_reduce(reviews):
+                    # Too many reviews for one excerpt: summarize a sample in parallel chunks
+                    review_sentiment_analysis = map_reduce_sentiment(client, listing, reviews, sentiment_prompt)
+                else:
+                    sentiment_response = chat_completion(client, 'sentiment',
+                        messages=build_messages(listing, "You are an expert review sentiment analyst specializing in hospitality feedback analysis.", sentiment_prompt)
+                    )
+                    review_sentiment_analysis = sentiment_response.choices[0].message.content.strip()
+            except Exception as e:
+                logger.warning(f"Sentiment analysis error: {e}")
+
+        # No static fallback - only show AI-generated content
+        return review_sentiment_analysis
 
     # NEW: Booking Gap & Occupancy Optimization Analysis
-    booking_gap_analysis = ""
-    if client:
-        gap_prompt = f"""Analyze booking optimization for: {title} in {url}
+    def gap_section():
+        booking_gap_analysis = ""
+        if client:
+            gap_prompt = f"""Analyze booking optimization for this listing.
 
 Generate compact analysis in this format:
 **Booking Optimization:**
@@ -506,30 +572,23 @@ Generate compact analysis in this format:
 • Seasonal strategy: [1-line recommendation]
 
 Keep response under 60 words total."""
-        
-        try:
-            gap_response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a vacation rental occupancy specialist focusing on booking optimization and guest experience."},
-                    {"role": "user", "content": gap_prompt}
-                ]
-            )
-            booking_gap_analysis = gap_response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Booking gap analysis error: {e}")
-    
-    # No static fallback - only show AI-generated content
 
-    # NEW: Guest Profile Match Analysis
-    guest_profile_analysis = ""
-    if client:
-        profile_prompt = f"""Analyze the ideal guest profile for this Airbnb property:
+            try:
+                gap_response = chat_completion(client, 'gap',
+                    messages=build_messages(listing, "You are a vacation rental occupancy specialist focusing on booking optimization and guest experience.", gap_prompt)
+                )
+                booking_gap_analysis = gap_response.choices[0].message.content.strip()
+            except Exception as e:
+                logger.warning(f"Booking gap analysis error: {e}")
 
-Property: {title}
-Description: {description}
-Location context: {url}
-Reviews available: {'Yes' if reviews else 'No'}
+        # No static fallback - only show AI-generated content
+        return booking_gap_analysis
+
+    # NEW: Guest Profile Match Analysis
+    def profile_section():
+        guest_profile_analysis = ""
+        if client:
+            profile_prompt = f"""Analyze the ideal guest profile for this Airbnb property.
 
 Provide analysis in exactly this format:
 **Primary Guest Personas:**
@@ -547,94 +606,89 @@ Provide analysis in exactly this format:
 • Amenities to emphasize: [top 3 for target guests]
 • Messaging adjustments: [2-3 specific suggestions]
 • Service enhancements: [2-3 guest-specific improvements]"""
-        
-        try:
-            profile_response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a guest persona analyst specializing in short-term rental market segmentation."},
-                    {"role": "user", "content": profile_prompt}
-                ]
-            )
-            guest_profile_analysis = profile_response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Guest profile analysis error: {e}")
-    
-    # No static fallback - only show AI-generated content
+
+            try:
+                profile_response = chat_completion(client, 'profile',
+                    messages=build_messages(listing, "You are a guest persona analyst specializing in short-term rental market segmentation.", profile_prompt)
+                )
+                guest_profile_analysis = profile_response.choices[0].message.content.strip()
+            except Exception as e:
+                logger.warning(f"Guest profile analysis error: {e}")
+
+        # No static fallback - only show AI-generated content
+        return guest_profile_analysis
 
     # Scrape images from Airbnb listing
-    image_urls = []
-    if url:
-        print(f"🖼️ Starting image scraping for URL: {url}")
-        try:
-            image_urls = scrape_airbnb_images(url, max_images=3)
-            print(f"🖼️ Image scraping completed. Found {len(image_urls)} images")
-            if image_urls:
-                print(f"🖼️ First few image URLs: {image_urls[:2]}")
-            else:
-                print("🖼️ No images found during scraping")
-        except Exception as e:
-            print(f"❌ Image scraping failed: {e}")
-            image_urls = []
-    else:
-        print("🖼️ No URL provided, skipping image scraping")
+    def images_section():
+        image_urls = []
+        if url:
+            logger.debug(f"🖼️ Starting image scraping for URL: {url}")
+            try:
+                with span('scrape.images'):
+                    image_urls = scrape_airbnb_images(url, max_images=3)
+                logger.info(f"🖼️ Image scraping completed. Found {len(image_urls)} images")
+                if image_urls:
+                    logger.debug(f"🖼️ First few image URLs: {image_urls[:2]}")
+                else:
+                    logger.info("🖼️ No images found during scraping")
+            except Exception as e:
+                logger.error(f"❌ Image scraping failed: {e}")
+                image_urls = []
+        else:
+            logger.info("🖼️ No URL provided, skipping image scraping")
+        return image_urls
 
     # Enhanced Analytics: Competitor Pricing Analysis
-    pricing_analysis = ""
-    try:
-        pricing_prompt = f"""Analyze pricing for a {title} in {location}. Provide exactly 3 concise points:
+    def pricing_section():
+        pricing_analysis = ""
+        try:
+            pricing_prompt = f"""Analyze pricing for this listing. Provide exactly 3 concise points:
 1. Market rate range for similar properties
 2. Seasonal pricing considerations (high/low season patterns)
 3. One key pricing strategy recommendation
 Keep each point to 1-2 sentences maximum."""
-        
-        pricing_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"You are a vacation rental market analyst with expertise in global short-term rental markets. Focus on {location if location != 'your area' else 'local market'} dynamics."},
-                {"role": "user", "content": pricing_prompt}
-            ]
-        )
-        pricing_analysis = pricing_response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Pricing analysis error: {e}")
-        pricing_analysis = f"Pricing analysis unavailable. Consider researching similar properties in {location if location != 'your area' else 'your local area'} for competitive rates."
+
+            pricing_response = chat_completion(client, 'pricing',
+                messages=build_messages(listing, f"You are a vacation rental market analyst with expertise in global short-term rental markets. Focus on {location if location != 'your area' else 'local market'} dynamics.", pricing_prompt)
+            )
+            pricing_analysis = pricing_response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning(f"Pricing analysis error: {e}")
+            pricing_analysis = f"Pricing analysis unavailable. Consider researching similar properties in {location if location != 'your area' else 'your local area'} for competitive rates."
+        return pricing_analysis
 
     # Enhanced Analytics: Photo Quality Audit
-    photo_audit = ""
-    try:
-        if image_urls:
-            photo_count = len(image_urls)
-            photo_prompt = f"""Analyze this Airbnb listing's photo strategy:
+    def photo_section():
+        photo_audit = ""
+        try:
+            if image_urls:
+                photo_count = len(image_urls)
+                photo_prompt = f"""Analyze this Airbnb listing's photo strategy:
 - Total photos: {photo_count}
-- Property type: {title}
-- Location: {location}
 
 Provide exactly 3 concise recommendations:
 1. Top missing photo type needed
 2. One lighting/quality improvement
 3. One key shot to enhance guest appeal
 Keep each point to 1-2 sentences maximum."""
-            
-            photo_response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an Airbnb photography expert specializing in listing optimization."},
-                    {"role": "user", "content": photo_prompt}
-                ]
-            )
-            photo_audit = photo_response.choices[0].message.content.strip()
-        else:
-            photo_audit = "No photos detected. Professional photos are essential - consider hiring a photographer to showcase your property's best features."
-    except Exception as e:
-        print(f"Photo audit error: {e}")
-        photo_audit = "Photo audit unavailable. Ensure your listing has high-quality photos of all key areas."
+
+                photo_response = chat_completion(client, 'photo',
+                    messages=build_messages(listing, "You are an Airbnb photography expert specializing in listing optimization.", photo_prompt)
+                )
+                photo_audit = photo_response.choices[0].message.content.strip()
+            else:
+                photo_audit = "No photos detected. Professional photos are essential - consider hiring a photographer to showcase your property's best features."
+        except Exception as e:
+            logger.warning(f"Photo audit error: {e}")
+            photo_audit = "Photo audit unavailable. Ensure your listing has high-quality photos of all key areas."
+        return photo_audit
 
     # Enhanced Analytics: Performance Insights & Optimization Potential
-    performance_insights = ""
-    try:
-        amenities_count = len(amenities.split('\n'))
-        insights_prompt = f"""Based on this listing optimization for {location}:
+    def insights_section():
+        performance_insights = ""
+        try:
+            amenities_count = len(amenities.split('\n'))
+            insights_prompt = f"""Based on this listing optimization:
 - Title: {title} → {optimized_title}
 - Added {amenities_count} amenity suggestions
 
@@ -644,25 +698,21 @@ Generate a compact performance summary in exactly this format:
 • [Secondary area]: [1-line benefit]
 
 Keep total response under 60 words."""
-        
-        insights_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a vacation rental performance analyst with expertise in listing optimization and guest experience."},
-                {"role": "user", "content": insights_prompt}
-            ]
-        )
-        performance_insights = insights_response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Performance insights error: {e}")
-        performance_insights = ""
+
+            insights_response = chat_completion(client, 'insights',
+                messages=build_messages(listing, "You are a vacation rental performance analyst with expertise in listing optimization and guest experience.", insights_prompt)
+            )
+            performance_insights = insights_response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning(f"Performance insights error: {e}")
+            performance_insights = ""
+        return performance_insights
 
     # Generate strategic recommendations
-    strategic_recommendations = ""
-    try:
-        strategic_prompt = f"""Generate exactly 2 strategic recommendations for this STR property:
-Location: {location}
-Title: {title}
+    def strategic_section():
+        strategic_recommendations = ""
+        try:
+            strategic_prompt = f"""Generate exactly 2 strategic recommendations for this STR property.
 
 Format exactly like this:
 • [Strategic area]: [Specific actionable recommendation]
@@ -676,27 +726,80 @@ Focus on:
 - Guest experience improvements that drive bookings
 
 Provide exactly 2 bullet points, each under 25 words."""
-        
-        strategic_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a vacation rental strategy consultant specializing in market positioning and revenue optimization."},
-                {"role": "user", "content": strategic_prompt}
-            ]
-        )
-        strategic_recommendations = strategic_response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Strategic recommendations error: {e}")
-        strategic_recommendations = ""
 
-    # Generate AI-powered analysis data for both PDF and frontend
-    print("🤖 Generating AI analysis data...")
-    market_analysis_data = generate_dynamic_market_data(client, location, title, description)
-    competitive_scores = generate_competitive_scores(client, location, title, description)
-    revenue_projections = generate_revenue_projections(client, location, title)
-    dynamic_percentages = generate_dynamic_percentages(client, title, description)
-    guest_rating = generate_guest_rating(client, location, title, description)
-    task_priorities = generate_task_priorities(client, competitive_scores, revenue_projections, dynamic_percentages)
+            strategic_response = chat_completion(client, 'strategic',
+                messages=build_messages(listing, "You are a vacation rental strategy consultant specializing in market positioning and revenue optimization.", strategic_prompt)
+            )
+            strategic_recommendations = strategic_response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning(f"Strategic recommendations error: {e}")
+            strategic_recommendations = ""
+        return strategic_recommendations
+
+    # Run the sections in parallel within the request's latency budget; a section that fails or
+    # runs out of time gets the same fallback the app uses when AI is unavailable
+    default_titles = [
+        "★ Beautiful Property | Perfect Location",
+        "🏡 Stunning Home | Great Amenities",
+        "✨ Cozy Retreat | Prime Location"
+    ]
+    logger.info("🤖 Generating AI analysis data...")
+    results, fell_back = run_sections([
+        Section('title', title_section, fallback=default_titles),
+        Section('description', description_section,
+                fallback=f"Discover comfort and style at this exceptional property in {location}. Featuring modern amenities and thoughtful design for the perfect getaway."),
+        Section('amenities', amenities_section, fallback=""),
+        # A hedge would repeat every map-reduce call (up to 7) just when the provider is slow
+        Section('sentiment', sentiment_section, fallback="", hedge=not needs_map_reduce(reviews)),
+        Section('gap', gap_section, fallback=""),
+        Section('profile', profile_section, fallback="", hedge=True),
+        Section('images', images_section, fallback=[]),
+        Section('pricing', pricing_section,
+                fallback=f"Pricing analysis unavailable. Consider researching similar properties in {location if location != 'your area' else 'your local area'} for competitive rates."),
+        Section('strategic', strategic_section, fallback=""),
+        # No static market data - the report leaves that block out
+        Section('market_data', lambda: generate_dynamic_market_data(client, listing), fallback=None),
+        Section('competitive_scores', lambda: generate_competitive_scores(client, listing),
+                fallback=dict(DEFAULT_COMPETITIVE_SCORES)),
+        Section('revenue_projections', lambda: generate_revenue_projections(client, listing),
+                fallback=dict(DEFAULT_REVENUE_PROJECTIONS)),
+        Section('dynamic_percentages', lambda: generate_dynamic_percentages(client, listing),
+                fallback=dict(DEFAULT_DYNAMIC_PERCENTAGES)),
+        Section('guest_rating', lambda: generate_guest_rating(client, listing), fallback=4.2),
+    ], reserve=OPTIMIZE_BUDGET * DEPENDENT_SECTIONS_SHARE)
+    title_suggestions = results['title']
+    optimized_description = results['description']
+    amenities = results['amenities']
+    review_sentiment_analysis = results['sentiment']
+    booking_gap_analysis = results['gap']
+    guest_profile_analysis = results['profile']
+    image_urls = results['images']
+    pricing_analysis = results['pricing']
+    strategic_recommendations = results['strategic']
+    market_analysis_data = results['market_data']
+    # Generators that fail internally return None - use the same defaults as a timed-out section
+    competitive_scores = results['competitive_scores'] or dict(DEFAULT_COMPETITIVE_SCORES)
+    revenue_projections = results['revenue_projections'] or dict(DEFAULT_REVENUE_PROJECTIONS)
+    dynamic_percentages = results['dynamic_percentages'] or dict(DEFAULT_DYNAMIC_PERCENTAGES)
+    guest_rating = results['guest_rating']
+
+    # Keep the first title as optimized_title for backward compatibility
+    optimized_title = title_suggestions[0] if title_suggestions else "★ Beautiful Property | Perfect Location"
+
+    # Sections that build on the results above
+    dependent_results, dependent_fell_back = run_sections([
+        Section('photo', photo_section,
+                fallback="Photo audit unavailable. Ensure your listing has high-quality photos of all key areas."),
+        Section('insights', insights_section, fallback=""),
+        Section('task_priorities', lambda: generate_task_priorities(client, listing, competitive_scores, revenue_projections, dynamic_percentages),
+                fallback=dict(DEFAULT_TASK_PRIORITIES)),
+    ])
+    photo_audit = dependent_results['photo']
+    performance_insights = dependent_results['insights']
+    task_priorities = dependent_results['task_priorities'] or dict(DEFAULT_TASK_PRIORITIES)
+    partial_sections = fell_back + dependent_fell_back
+    if partial_sections:
+        logger.warning(f"⚠️ Returning partial results - fallback used for: {', '.join(partial_sections)}")
     
     # Generate chart data for visualizations
     occupancy_trend_data, revenue_trend_data = generate_mock_trend_data()
@@ -706,7 +809,7 @@ Provide exactly 2 bullet points, each under 25 words."""
     pdf_path = None
     if wants_pdf:
         try:
-            print("📄 Generating professional PDF report...")
+            logger.info("📄 Generating professional PDF report...")
             
             # Create PDF with a more predictable filename
             pdf_filename = f"str_report_{uuid.uuid4().hex[:12]}.pdf"
@@ -727,6 +830,7 @@ Provide exactly 2 bullet points, each under 25 words."""
                 'pricing_analysis': pricing_analysis,
                 'photo_audit': photo_audit,
                 'performance_insights': performance_insights,
+                'strategic_recommendations': strategic_recommendations,
                 'image_urls': image_urls,
                 'market_analysis_data': market_analysis_data,
                 'competitive_scores': competitive_scores,
@@ -738,72 +842,38 @@ Provide exactly 2 bullet points, each under 25 words."""
             }
             
             # Generate the professional PDF
-            success = generate_professional_pdf(optimization_data, pdf_path)
+            success = generate_professional_pdf(optimization_data, pdf_path, renderer=pdf_renderer)
             
             if success and os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                print(f"✅ Professional PDF generated successfully: {os.path.getsize(pdf_path)} bytes")
+                logger.info(f"✅ Professional PDF generated successfully: {os.path.getsize(pdf_path)} bytes")
             else:
-                print(f"❌ Professional PDF generation failed")
+                logger.error(f"❌ Professional PDF generation failed")
                 pdf_path = None
 
         except Exception as e:
-            print(f"PDF generation error: {e}")
+            logger.warning(f"PDF generation error: {e}")
             pdf_path = None
 
-    print("📧 Checking email sending...")
-    # Send email if requested
-    # Re-enabled with improved error handling
+    logger.debug("📧 Checking email sending...")
+    # Queue the email - the outbox worker delivers it with retries, off the request path
     DISABLE_EMAIL_FOR_DEBUG = False
     if wants_email and email and not DISABLE_EMAIL_FOR_DEBUG:
         try:
-            print(f"📧 Sending email to: {email}")
-            email_result = send_email(email, optimized_description, amenities, review_sentiment_analysis, pdf_path)
-            if email_result is not False:
-                print("✅ Email sent successfully")
-            else:
-                print("⚠️ Email sending failed but continuing...")
+            # One report email per checkout session, even if the result is requested again
+            session_id = form_data.get('session_id')
+            idempotency_key = form_data.get('idempotency_key') or (f"checkout:{session_id}" if session_id else None)
+            with span('email.enqueue'):
+                enqueue_email(email, optimized_description, amenities, review_sentiment_analysis, pdf_path,
+                              idempotency_key=idempotency_key, delivery=form_data.get('report_delivery'))
         except Exception as e:
-            print(f"❌ Email sending exception: {e} - continuing anyway...")
+            logger.error(f"❌ Email queueing exception: {e} - continuing anyway...")
     else:
         if DISABLE_EMAIL_FOR_DEBUG:
-            print("📧 Email temporarily disabled for debugging")
+            logger.info("📧 Email temporarily disabled for debugging")
         else:
-            print("📧 Email not requested or no email provided")
+            logger.info("📧 Email not requested or no email provided")
 
-    print("📋 Building result dictionary...")
-    
-    # Ensure fallback data if AI generation fails
-    if not competitive_scores:
-        competitive_scores = {
-            'market_positioning': 75,
-            'amenity_score': 80,
-            'visual_score': 70,
-            'experience_score': 85
-        }
-    
-    if not revenue_projections:
-        revenue_projections = {
-            'booking_improvement': 25,
-            'revenue_impact': 30,
-            'occupancy_rates': {'current': 65, 'optimized': 85},
-            'seasonal_adjustments': 'Dynamic pricing recommended for peak seasons'
-        }
-    
-    if not dynamic_percentages:
-        dynamic_percentages = {
-            'search_visibility': 25,
-            'conversion_rate': 20,
-            'average_rate_adjustment': 15
-        }
-    
-    if not task_priorities:
-        task_priorities = {
-            'title_priority': 'HIGH',
-            'pricing_priority': 'HIGH',
-            'photo_priority': 'HIGH',
-            'experience_priority': 'LOW',
-            'booking_priority': 'HIGH'
-        }
+    logger.debug("📋 Building result dictionary...")
     
     # Ensure guest_rating is always a valid number (never None, 0, or falsy)
     if not guest_rating or guest_rating == 0:
@@ -845,32 +915,29 @@ Provide exactly 2 bullet points, each under 25 words."""
         'task_priorities': task_priorities,
         'title': title,  # Include original title for frontend
         'location': location,  # Include location for frontend
-        'guest_rating': guest_rating
+        'guest_rating': guest_rating,
+        'partial_sections': partial_sections  # Sections that fell back (error or out of time)
     }
     
-    print("📄 Adding PDF download URL to result...")
+    logger.debug("📄 Adding PDF download URL to result...")
     if pdf_path and os.path.exists(pdf_path):
-        pdf_filename = os.path.basename(pdf_path)
-        result['pdf_download_url'] = f"/api/download/{pdf_filename}"
-        print(f"✅ PDF download URL: {result['pdf_download_url']}")
-        print(f"✅ PDF file location: {pdf_path}")
+        result['pdf_download_url'] = build_report_download_path(pdf_path)
+        logger.debug(f"✅ PDF download URL: {result['pdf_download_url']}")
+        logger.debug(f"✅ PDF file location: {pdf_path}")
     else:
-        print("❌ No PDF path available or file doesn't exist")
+        logger.warning("❌ No PDF path available or file doesn't exist")
     
-    print("✅ Returning optimization result...")
+    logger.debug("✅ Returning optimization result...")
     return result
 
 
-def generate_dynamic_market_data(client, location, title, description):
+def generate_dynamic_market_data(client, listing):
     """Generate AI-powered market analysis data"""
     if not client:
         return None
     
     try:
-        market_prompt = f"""Analyze the short-term rental market for this property:
-Location: {location}
-Title: {title}
-Description: {description}
+        market_prompt = f"""Analyze the short-term rental market for this property.
 
 Generate realistic market data in this JSON format:
 {{
@@ -886,12 +953,8 @@ Generate realistic market data in this JSON format:
 
 Base pricing on local market conditions and property type."""
         
-        market_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a short-term rental market analyst. Provide realistic pricing data based on location and property type."},
-                {"role": "user", "content": market_prompt}
-            ]
+        market_response = chat_completion(client, 'market',
+            messages=build_messages(listing, "You are a short-term rental market analyst. Provide realistic pricing data based on location and property type.", market_prompt)
         )
         
         import json
@@ -899,20 +962,17 @@ Base pricing on local market conditions and property type."""
         return market_data
         
     except Exception as e:
-        print(f"Market data generation error: {e}")
+        logger.warning(f"Market data generation error: {e}")
         return None
 
 
-def generate_competitive_scores(client, location, title, description):
+def generate_competitive_scores(client, listing):
     """Generate AI-powered competitive advantage scores"""
     if not client:
         return None
     
     try:
-        scores_prompt = f"""Analyze this property's competitive advantages:
-Location: {location}
-Title: {title}
-Description: {description}
+        scores_prompt = f"""Analyze this property's competitive advantages.
 
 Rate each category from 1-100 based on market competitiveness:
 - Market Positioning: How well positioned vs competitors
@@ -928,12 +988,8 @@ Respond in JSON format:
     "experience_score": [1-100]
 }}"""
         
-        scores_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a competitive analysis expert for short-term rentals."},
-                {"role": "user", "content": scores_prompt}
-            ]
+        scores_response = chat_completion(client, 'scores',
+            messages=build_messages(listing, "You are a competitive analysis expert for short-term rentals.", scores_prompt)
         )
         
         import json
@@ -941,20 +997,17 @@ Respond in JSON format:
         return scores_data
         
     except Exception as e:
-        print(f"Competitive scores generation error: {e}")
+        logger.warning(f"Competitive scores generation error: {e}")
         return None
 
 
-def generate_guest_rating(client, location, title, description):
+def generate_guest_rating(client, listing):
     """Generate AI-powered realistic guest rating"""
     if not client:
         return 4.2  # fallback rating
     
     try:
-        rating_prompt = f"""Analyze this property and estimate a realistic guest rating:
-Location: {location}
-Title: {title}
-Description: {description}
+        rating_prompt = f"""Analyze this property and estimate a realistic guest rating.
 
 Based on the property details, market standards, and typical guest expectations, provide a realistic guest rating between 3.5 and 5.0.
 
@@ -966,12 +1019,8 @@ Consider factors like:
 
 Respond with just the rating number (e.g., 4.3):"""
         
-        rating_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a vacation rental rating analyst specializing in realistic guest satisfaction predictions."},
-                {"role": "user", "content": rating_prompt}
-            ]
+        rating_response = chat_completion(client, 'rating',
+            messages=build_messages(listing, "You are a vacation rental rating analyst specializing in realistic guest satisfaction predictions.", rating_prompt)
         )
         
         rating_text = rating_response.choices[0].message.content.strip()
@@ -997,19 +1046,17 @@ Respond with just the rating number (e.g., 4.3):"""
         return round(rating, 1)
         
     except Exception as e:
-        print(f"Guest rating generation error: {e}")
+        logger.warning(f"Guest rating generation error: {e}")
         return 4.2  # fallback rating
 
 
-def generate_revenue_projections(client, location, title):
+def generate_revenue_projections(client, listing):
     """Generate AI-powered booking performance analysis and statistics"""
     if not client:
         return None
     
     try:
-        revenue_prompt = f"""Analyze potential performance improvements for this property:
-Location: {location}
-Title: {title}
+        revenue_prompt = f"""Analyze potential performance improvements for this property.
 
 Provide realistic analysis in JSON format:
 {{
@@ -1025,12 +1072,8 @@ Provide realistic analysis in JSON format:
 
 Base on location market conditions and property type."""
         
-        revenue_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a vacation rental performance analyst specializing in booking optimization."},
-                {"role": "user", "content": revenue_prompt}
-            ]
+        revenue_response = chat_completion(client, 'revenue',
+            messages=build_messages(listing, "You are a vacation rental performance analyst specializing in booking optimization.", revenue_prompt)
         )
         
         import json
@@ -1038,19 +1081,17 @@ Base on location market conditions and property type."""
         return revenue_data
         
     except Exception as e:
-        print(f"Revenue projections generation error: {e}")
+        logger.warning(f"Revenue projections generation error: {e}")
         return None
 
 
-def generate_dynamic_percentages(client, title, description):
+def generate_dynamic_percentages(client, listing):
     """Generate AI-powered percentage values for various metrics"""
     if not client:
         return None
     
     try:
-        percentages_prompt = f"""Generate realistic percentage values for this property's optimization metrics:
-Title: {title}
-Description: {description}
+        percentages_prompt = f"""Generate realistic percentage values for this property's optimization metrics.
 
 Provide values in JSON format with ranges using dashes (no brackets, no commas):
 {{
@@ -1070,12 +1111,8 @@ Provide values in JSON format with ranges using dashes (no brackets, no commas):
 
 Base on property type and market positioning."""
         
-        percentages_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a vacation rental market analyst specializing in pricing patterns."},
-                {"role": "user", "content": percentages_prompt}
-            ]
+        percentages_response = chat_completion(client, 'percentages',
+            messages=build_messages(listing, "You are a vacation rental market analyst specializing in pricing patterns.", percentages_prompt)
         )
         
         import json
@@ -1083,19 +1120,13 @@ Base on property type and market positioning."""
         return percentages_data
         
     except Exception as e:
-        print(f"Dynamic percentages generation error: {e}")
+        logger.warning(f"Dynamic percentages generation error: {e}")
         return None
 
-def generate_task_priorities(client, competitive_scores, revenue_projections, dynamic_percentages):
+def generate_task_priorities(client, listing, competitive_scores, revenue_projections, dynamic_percentages):
     """Generate AI-powered task priorities based on analysis results"""
     if not client:
-        return {
-            'title_priority': 'HIGH',
-            'pricing_priority': 'HIGH', 
-            'photo_priority': 'HIGH',
-            'experience_priority': 'LOW',
-            'booking_priority': 'HIGH'
-        }
+        return dict(DEFAULT_TASK_PRIORITIES)
     
     try:
         # Create context from analysis results
@@ -1130,12 +1161,8 @@ Return JSON format:
     "booking_priority": "[HIGH/MEDIUM/LOW]"
 }}"""
         
-        priorities_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert at prioritizing optimization tasks based on data analysis."},
-                {"role": "user", "content": context}
-            ]
+        priorities_response = chat_completion(client, 'priorities',
+            messages=build_messages(listing, "You are an expert at prioritizing optimization tasks based on data analysis.", context)
         )
         
         import json
@@ -1143,11 +1170,5 @@ Return JSON format:
         return priorities_data
         
     except Exception as e:
-        print(f"Error generating task priorities: {e}")
-        return {
-            'title_priority': 'HIGH',
-            'pricing_priority': 'HIGH', 
-            'photo_priority': 'HIGH',
-            'experience_priority': 'LOW',
-            'booking_priority': 'HIGH'
-        } 
\ No newline at end of file
+        logger.warning(f"Error generating task priorities: {e}")
+        return dict(DEFAULT_TASK_PRIORITIES) 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import logging
+from .sqlite_store import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Paid checkout sessions don't change, so their metadata is kept locally (shared by all workers)
+# instead of asking Stripe again on every result poll
+SESSIONS_DB = 'stripe_sessions'
+SESSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkout_sessions (
+    session_id TEXT PRIMARY KEY,
+    payment_status TEXT,
+    metadata TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_checkout_sessions_cached ON checkout_sessions (cached_at);
+"""
+
+STRIPE_SESSION_CACHE_TTL = int(os.getenv('STRIPE_SESSION_CACHE_TTL', str(24 * 3600)))
+
+_last_purge = 0
+
+def _connection():
+    return get_connection(SESSIONS_DB, SESSIONS_SCHEMA)
+
+def cache_checkout_session(session_id, payment_status, metadata):
+    """Store a session's payment status and metadata (only paid sessions - others can still change)"""
+    if payment_status != 'paid':
+        return
+    _connection().execute(
+        "INSERT OR REPLACE INTO checkout_sessions (session_id, payment_status, metadata, cached_at) VALUES (?, ?, ?, ?)",
+        (session_id, payment_status, json.dumps(dict(metadata or {})), time.time())
+    )
+    _purge_expired()
+
+def get_cached_checkout_session(session_id):
+    """Cached session as {'id', 'payment_status', 'metadata'}, or None if missing or expired"""
+    row = _connection().execute(
+        "SELECT * FROM checkout_sessions WHERE session_id = ? AND cached_at >= ?",
+        (session_id, time.time() - STRIPE_SESSION_CACHE_TTL)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'id': row['session_id'], 'payment_status': row['payment_status'], 'metadata': json.loads(row['metadata'])}
+
+def retrieve_checkout_session(session_id):
+    """
+    Checkout session as {'id', 'payment_status', 'metadata'} (metadata a plain dict), from the
+    cache when possible, otherwise from Stripe. Stripe errors propagate to the caller.
+    """
+    cached = get_cached_checkout_session(session_id)
+    if cached is not None:
+        logger.debug(f"💾 Checkout session {session_id} served from cache")
+        return cached
+
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    checkout_session = stripe.checkout.Session.retrieve(session_id)
+    metadata = checkout_session.metadata.to_dict() if checkout_session.metadata else {}
+    cache_checkout_session(session_id, checkout_session.payment_status, metadata)
+    return {'id': session_id, 'payment_status': checkout_session.payment_status, 'metadata': metadata}
+
+def _purge_expired():
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    _connection().execute(
+        "DELETE FROM checkout_sessions WHERE cached_at < ?",
+        (time.time() - STRIPE_SESSION_CACHE_TTL,)
+    )
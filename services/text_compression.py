@@ -0,0 +1,158 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Token counts are estimates: tiktoken is not in requirements.txt, so deployments use a length
+# heuristic that slightly overcounts. Installing tiktoken (TOKENIZER_ENCODING) makes them exact.
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Token budgets for the free-text fields, global rather than per section: the description sits in
+# the shared listing prefix, which has to be identical for every section, and the review excerpt
+# only goes to the sentiment prompt. Text over budget is reduced to its key sentences
+# (near-duplicate review sentences collapsed first), so hundreds of pasted reviews cost about as
+# much as a few.
+CONTEXT_DESCRIPTION_TOKENS = int(os.getenv('CONTEXT_DESCRIPTION_TOKENS', '600'))
+CONTEXT_REVIEW_TOKENS = int(os.getenv('CONTEXT_REVIEW_TOKENS', '1200'))
+TOKENIZER_ENCODING = os.getenv('TOKENIZER_ENCODING', 'cl100k_base')
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been but by can could did do does
+for from had has have he her here him his how i if in into is it its just me more most my no
+not of on or our out so some than that the their them then there these they this to too us
+very was we were what when where which while who will with would you your
+""".split())
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r"[a-z0-9']+")
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if not TIKTOKEN_AVAILABLE or _encoding_failed:
+        return None
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # First use downloads the BPE file; offline dynos fall back to the estimate
+                _encoding_failed = True
+                logger.warning(f"⚠️ tiktoken encoding unavailable, estimating token counts: {e}")
+        return _encoding
+
+def count_tokens(text):
+    """Prompt tokens for text: an estimate (slightly high) unless tiktoken is installed"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # ~4 characters or ~0.75 words per token for English; take the larger so budgets hold
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, on a word boundary"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        text = encoding.decode(encoding.encode(text)[:max_tokens])
+    else:
+        text = text[:max_tokens * 3]
+    return text.rsplit(' ', 1)[0].rstrip() + '…'
+
+def split_sentences(text):
+    return [s.strip(' -•*\t') for s in _SENTENCE_END.split(text or '') if s.strip(' -•*\t')]
+
+def _content_words(sentence):
+    # Light stemming (plural 's') so "great beds" and "Great bed!" count as the same sentence
+    words = (w.strip("'") for w in _WORD.findall(sentence.lower()))
+    return [w[:-1] if len(w) > 3 and w.endswith('s') and not w.endswith('ss') else w
+            for w in words if w and w not in STOPWORDS]
+
+def dedupe_sentences(sentences):
+    """
+    Collapse near-identical sentences (same content words, ignoring case, punctuation, order
+    and stopwords). Returns [(sentence, count)] in first-seen order.
+    """
+    seen = {}
+    order = []
+    for sentence in sentences:
+        words = _content_words(sentence)
+        key = frozenset(words) if words else sentence.lower()
+        if key in seen:
+            seen[key][1] += 1
+        else:
+            seen[key] = [sentence, 1]
+            order.append(key)
+    return [tuple(seen[key]) for key in order]
+
+def _select_key_sentences(entries, max_tokens, keep_lead=0, render=lambda sentence, count: sentence):
+    """
+    Greedy extractive summary: score sentences by how common their words are across the text
+    (repeated sentences score higher), take the best until the budget is used, and return them
+    in their original order. The first keep_lead sentences are always kept.
+    """
+    frequencies = Counter()
+    for sentence, count in entries:
+        for word in set(_content_words(sentence)):
+            frequencies[word] += count
+
+    def score(index):
+        sentence, count = entries[index]
+        words = set(_content_words(sentence))
+        if not words:
+            return 0
+        return (sum(frequencies[w] for w in words) / math.sqrt(len(words))) * (1 + math.log(count))
+
+    lead = list(range(min(keep_lead, len(entries))))
+    ranked = lead + sorted((i for i in range(len(entries)) if i >= keep_lead), key=lambda i: (-score(i), i))
+
+    chosen, used = [], 0
+    for index in ranked:
+        cost = count_tokens(render(*entries[index])) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.append(index)
+        used += cost
+    return [render(*entries[i]) for i in sorted(chosen)]
+
+@lru_cache(maxsize=256)
+def compress_description(description, max_tokens=CONTEXT_DESCRIPTION_TOKENS):
+    """Description within max_tokens: unchanged if it fits, else its opening plus key sentences"""
+    if not description or count_tokens(description) <= max_tokens:
+        return description
+    entries = [(sentence, 1) for sentence in split_sentences(description)]
+    selected = _select_key_sentences(entries, max_tokens, keep_lead=1)
+    compressed = truncate_to_tokens(' '.join(selected) if selected else description, max_tokens)
+    logger.info(f"✂️ Description compressed from {count_tokens(description)} to {count_tokens(compressed)} tokens")
+    return compressed
+
+@lru_cache(maxsize=256)
+def compress_reviews(reviews, max_tokens=CONTEXT_REVIEW_TOKENS):
+    """
+    Reviews within max_tokens: near-duplicate sentences merged (with how often they were said)
+    and, if still over budget, reduced to the most representative sentences
+    """
+    if not reviews or count_tokens(reviews) <= max_tokens:
+        return reviews
+    entries = dedupe_sentences(split_sentences(reviews))
+    render = lambda sentence, count: f"- {sentence} (x{count})" if count > 1 else f"- {sentence}"
+    selected = _select_key_sentences(entries, max_tokens, render=render)
+    compressed = truncate_to_tokens('\n'.join(selected), max_tokens)
+    logger.info(f"✂️ Reviews compressed from {count_tokens(reviews)} to {count_tokens(compressed)} tokens "
+                f"({len(entries)} distinct sentences, {len(selected)} kept)")
+    return compressed
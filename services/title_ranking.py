@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The title section asks for several candidates in one JSON completion and picks the best few
+# locally. Scoring is deterministic (no model call), so ranking is cheap and testable offline.
+TITLE_CANDIDATES = int(os.getenv('TITLE_CANDIDATES', '8'))
+TITLE_OPTIONS = 3
+# Airbnb truncates titles beyond this many characters in search results
+TITLE_MAX_CHARS = 50
+
+WEIGHTS = {
+    'length': 0.4,
+    'location': 0.25,
+    'power': 0.2,
+    'uniqueness': 0.15,
+}
+# How much a candidate loses per unit of word overlap with a title already picked
+DIVERSITY_PENALTY = 0.3
+
+POWER_WORDS = frozenset("""
+beachfront breathtaking charming chic cozy designer dreamy elegant escape getaway gorgeous
+hideaway historic hot-tub hottub king lakefront luxe luxury modern oasis panoramic peaceful
+pool private renovated retreat romantic rooftop secluded serene spacious stunning sunny
+tranquil trendy unique views walkable waterfront
+""".split())
+# Words that say nothing about this particular listing
+GENERIC_WORDS = frozenset("amazing awesome beautiful great home house nice perfect place property rental stay".split())
+# Placeholders _optimize_listing uses when no location was detected
+UNKNOWN_LOCATIONS = frozenset(("your area", "your city", "your country"))
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+_NUMBERED = re.compile(r'^\s*\d+\s*[.)]\s*')
+
+def parse_candidates(text):
+    """
+    Titles from the model's reply: {"titles": [...]} (optionally in a code fence), or a
+    numbered list if the model ignored the JSON instruction
+    """
+    if not text:
+        return []
+    cleaned = text.strip()
+    if cleaned.startswith('```'):
+        cleaned = cleaned.strip('`').split('\n', 1)[-1]
+    try:
+        data = json.loads(cleaned[cleaned.find('{'):cleaned.rfind('}') + 1])
+        titles = data.get('titles', []) if isinstance(data, dict) else []
+        return [t.strip().strip('"') for t in titles if isinstance(t, str) and t.strip()]
+    except (ValueError, TypeError):
+        pass
+    return [_NUMBERED.sub('', line).strip().strip('"') for line in text.split('\n') if _NUMBERED.match(line)]
+
+def location_terms(location):
+    """Lower-case place names worth seeing in a title ('Asheville, NC' -> ['asheville', 'nc'])"""
+    if not location or location.lower() in UNKNOWN_LOCATIONS:
+        return []
+    return [part.strip().lower() for part in location.split(',') if len(part.strip()) > 1]
+
+def _words(title):
+    return set(_WORD.findall(title.lower()))
+
+def mentions_location(title, terms):
+    """True if a location term appears as whole words ('nc' doesn't match 'enchanting')"""
+    padded = f" {' '.join(_WORD.findall(title.lower()))} "
+    for term in terms:
+        term_words = _WORD.findall(term.lower())
+        if term_words and f" {' '.join(term_words)} " in padded:
+            return True
+    return False
+
+def length_score(title):
+    """1.0 between 30 and 50 characters, falling off for shorter titles and more steeply for longer ones"""
+    length = len(title)
+    if length > TITLE_MAX_CHARS:
+        return max(0.0, 1 - (length - TITLE_MAX_CHARS) / 20)
+    if length < 30:
+        return max(0.0, length / 30)
+    return 1.0
+
+def score_title(title, terms=()):
+    """Score components of one title (each 0..1) and their weighted total"""
+    words = _words(title)
+    components = {
+        'length': length_score(title),
+        'location': 1.0 if mentions_location(title, terms) else 0.0,
+        'power': min(1.0, len(words & POWER_WORDS) / 2),
+        'uniqueness': 1 - len(words & GENERIC_WORDS) / len(words) if words else 0.0,
+    }
+    components['total'] = sum(WEIGHTS[name] * value for name, value in components.items())
+    return components
+
+def _overlap(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def rank_titles(candidates, location=None, count=TITLE_OPTIONS):
+    """
+    Best `count` distinct candidates: highest score first, each pick penalized for word overlap
+    with titles already picked so the options take different angles. Ties keep the model's order.
+    """
+    terms = location_terms(location)
+    seen, unique = set(), []
+    for title in candidates:
+        key = ' '.join(sorted(_words(title)))
+        if title and key not in seen:
+            seen.add(key)
+            unique.append(title)
+
+    scores = {title: score_title(title, terms)['total'] for title in unique}
+    chosen = []
+    while unique and len(chosen) < count:
+        def adjusted(item):
+            index, title = item
+            overlap = max((_overlap(_words(title), _words(c)) for c in chosen), default=0.0)
+            return (-(scores[title] - DIVERSITY_PENALTY * overlap), index)
+        _, best = min(enumerate(unique), key=adjusted)
+        chosen.append(best)
+        unique.remove(best)
+    logger.debug(f"🏷️ Ranked titles: {[(t, round(scores[t], 2)) for t in chosen]}")
+    return chosen
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from .sqlite_store import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Local copy of the Firebase user list for the admin dashboard: synced in full once, then
+# refreshed in the background, so admin requests only ever read SQLite
+DIRECTORY_DB = 'user_directory'
+DIRECTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid TEXT PRIMARY KEY,
+    email TEXT,
+    email_lower TEXT,
+    display_name TEXT,
+    email_verified INTEGER,
+    disabled INTEGER,
+    created_at INTEGER,
+    last_sign_in_at INTEGER,
+    photo_url TEXT,
+    phone_number TEXT,
+    provider_data TEXT,
+    row_hash TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email_lower);
+CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at);
+CREATE INDEX IF NOT EXISTS idx_users_last_sign_in ON users (last_sign_in_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_synced_at REAL,
+    locked_until REAL
+);
+"""
+
+# Seconds between background refreshes of the directory
+USER_DIRECTORY_REFRESH = int(os.getenv('USER_DIRECTORY_REFRESH', '300'))
+USER_DIRECTORY_SYNC_LEASE = 600
+USER_DIRECTORY_MAX_PAGE_SIZE = 500
+# Longest a request waits for another worker's first sync before listing Firebase directly
+# (kept under Heroku's 30s router timeout)
+USER_DIRECTORY_FIRST_SYNC_WAIT = float(os.getenv('USER_DIRECTORY_FIRST_SYNC_WAIT', '20'))
+
+# API sort key -> indexed column
+SORT_COLUMNS = {
+    'createdAt': 'created_at',
+    'lastSignInAt': 'last_sign_in_at',
+    'email': 'email_lower',
+}
+
+_refresh_lock = threading.Lock()
+
+def _connection():
+    return get_connection(DIRECTORY_DB, DIRECTORY_SCHEMA)
+
+def _user_row(user):
+    metadata = user.user_metadata
+    row = {
+        'uid': user.uid,
+        'email': user.email,
+        'email_lower': (user.email or '').lower(),
+        'display_name': user.display_name,
+        'email_verified': int(bool(user.email_verified)),
+        'disabled': int(bool(user.disabled)),
+        'created_at': metadata.creation_timestamp if metadata else None,
+        'last_sign_in_at': metadata.last_sign_in_timestamp if metadata else None,
+        'photo_url': user.photo_url,
+        'phone_number': user.phone_number,
+        'provider_data': json.dumps([{'providerId': p.provider_id, 'uid': p.uid} for p in user.provider_data]),
+    }
+    row['row_hash'] = hashlib.sha1(json.dumps(row, sort_keys=True).encode()).hexdigest()
+    return row
+
+def _claim_sync():
+    """Only one worker refreshes at a time; a crashed refresh frees up after the lease"""
+    now = time.time()
+    conn = _connection()
+    conn.execute("INSERT OR IGNORE INTO sync_state (id) VALUES (1)")
+    cursor = conn.execute(
+        "UPDATE sync_state SET locked_until = ? WHERE id = 1 AND (locked_until IS NULL OR locked_until < ?)",
+        (now + USER_DIRECTORY_SYNC_LEASE, now)
+    )
+    return cursor.rowcount == 1
+
+def sync_users(auth):
+    """
+    Page through Firebase and bring the local directory up to date: new and changed users are
+    written, unchanged ones only touched, and users no longer in Firebase removed. Firebase has
+    no change feed, so every refresh lists all users - but off the request path.
+    """
+    if not _claim_sync():
+        return False
+
+    conn = _connection()
+    started = time.time()
+    known = {row['uid']: row['row_hash'] for row in conn.execute("SELECT uid, row_hash FROM users")}
+    written = 0
+    try:
+        page = auth.list_users()
+        while page:
+            rows = [_user_row(user) for user in page.users]
+            changed = [row for row in rows if known.get(row['uid']) != row['row_hash']]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO users (uid, email, email_lower, display_name, email_verified, disabled, "
+                    "created_at, last_sign_in_at, photo_url, phone_number, provider_data, row_hash, seen_at) "
+                    "VALUES (:uid, :email, :email_lower, :display_name, :email_verified, :disabled, :created_at, "
+                    ":last_sign_in_at, :photo_url, :phone_number, :provider_data, :row_hash, :seen_at)",
+                    [dict(row, seen_at=started) for row in changed]
+                )
+                conn.executemany(
+                    "UPDATE users SET seen_at = ? WHERE uid = ?",
+                    [(started, row['uid']) for row in rows if known.get(row['uid']) == row['row_hash']]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            written += len(changed)
+            page = page.get_next_page()
+
+        removed = conn.execute("DELETE FROM users WHERE seen_at < ?", (started,)).rowcount
+        conn.execute("UPDATE sync_state SET last_synced_at = ?, locked_until = NULL WHERE id = 1", (time.time(),))
+        logger.info(f"👥 User directory synced in {time.time() - started:.1f}s: {written} updated, {removed} removed")
+        return True
+    except Exception:
+        conn.execute("UPDATE sync_state SET locked_until = NULL WHERE id = 1")
+        raise
+
+def _refresh_in_background(auth):
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            sync_users(auth)
+        except Exception as e:
+            logger.warning(f"⚠️ User directory refresh failed: {e}")
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='user-directory-refresh', daemon=True).start()
+
+def last_synced_at():
+    row = _connection().execute("SELECT last_synced_at FROM sync_state WHERE id = 1").fetchone()
+    return row['last_synced_at'] if row else None
+
+def _sync_in_progress():
+    row = _connection().execute("SELECT locked_until FROM sync_state WHERE id = 1").fetchone()
+    return bool(row and row['locked_until'] and row['locked_until'] > time.time())
+
+def _first_sync(auth):
+    """
+    Sync for the first time, or wait for the worker already doing it. Returns False when the
+    directory still isn't ready after USER_DIRECTORY_FIRST_SYNC_WAIT.
+    """
+    deadline = time.time() + USER_DIRECTORY_FIRST_SYNC_WAIT
+    while last_synced_at() is None:
+        # A holder that crashed frees the lease, and then this worker takes over
+        if not _sync_in_progress() and sync_users(auth):
+            return True
+        if time.time() >= deadline:
+            logger.warning("⚠️ First user directory sync still running elsewhere - listing Firebase directly")
+            return False
+        time.sleep(0.5)
+    return True
+
+def ensure_user_directory(auth):
+    """
+    Make sure the directory is usable: the very first call syncs in full (blocking, or waiting
+    for the worker that is), later calls start a background refresh once the data is older than
+    USER_DIRECTORY_REFRESH. False means it isn't ready yet - use list_users_direct instead.
+    """
+    synced_at = last_synced_at()
+    if synced_at is None:
+        with _refresh_lock:
+            return _first_sync(auth)
+    if time.time() - synced_at > USER_DIRECTORY_REFRESH:
+        _refresh_in_background(auth)
+    return True
+
+def clamp_page_size(page_size):
+    """The page size query_users actually uses (None = every match)"""
+    if not page_size:
+        return None
+    return max(1, min(int(page_size), USER_DIRECTORY_MAX_PAGE_SIZE))
+
+def _user_dict(row):
+    return {
+        'uid': row['uid'],
+        'email': row['email'] or 'N/A',
+        'displayName': row['display_name'] or 'N/A',
+        'emailVerified': bool(row['email_verified']),
+        'disabled': bool(row['disabled']),
+        'createdAt': row['created_at'],
+        'lastSignInAt': row['last_sign_in_at'],
+        'photoURL': row['photo_url'] or None,
+        'phoneNumber': row['phone_number'] or None,
+        'providerData': json.loads(row['provider_data'] or '[]')
+    }
+
+def query_users(search=None, sort='createdAt', order='desc', page=1, page_size=None):
+    """
+    Users from the local directory as (users, total). search matches the start of the email
+    (index-backed) or anywhere in the display name; page_size=None returns every match.
+    """
+    where, params = '', []
+    if search:
+        term = search.strip().lower()
+        where = "WHERE email_lower >= ? AND email_lower < ? OR display_name LIKE ?"
+        params = [term, term + '\uffff', f'%{search.strip()}%']
+
+    column = SORT_COLUMNS.get(sort, 'created_at')
+    direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+
+    conn = _connection()
+    total = conn.execute(f"SELECT COUNT(*) FROM users {where}", params).fetchone()[0]
+    sql = f"SELECT * FROM users {where} ORDER BY {column} {direction}, uid"
+    page_size = clamp_page_size(page_size)
+    if page_size:
+        sql += " LIMIT ? OFFSET ?"
+        params = params + [page_size, (max(1, int(page)) - 1) * page_size]
+
+    return [_user_dict(row) for row in conn.execute(sql, params)], total
+
+def list_users_direct(auth, search=None, sort='createdAt', order='desc', page=1, page_size=None):
+    """query_users answered straight from Firebase, for when the directory isn't synced yet"""
+    rows = []
+    page_of_users = auth.list_users()
+    while page_of_users:
+        rows.extend(_user_row(user) for user in page_of_users.users)
+        page_of_users = page_of_users.get_next_page()
+
+    if search:
+        term = search.strip().lower()
+        rows = [row for row in rows
+                if row['email_lower'].startswith(term) or term in (row['display_name'] or '').lower()]
+
+    column = SORT_COLUMNS.get(sort, 'created_at')
+    rows.sort(key=lambda row: row['uid'])
+    rows.sort(key=lambda row: (row[column] is not None, row[column]), reverse=str(order).lower() != 'asc')
+    total = len(rows)
+    page_size = clamp_page_size(page_size)
+    if page_size:
+        start = (max(1, int(page)) - 1) * page_size
+        rows = rows[start:start + page_size]
+    return [_user_dict(row) for row in rows], total
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test how bulk report emails are packed into SendGrid requests (no HTTP calls)
+"""
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import email_service
+from services.email_service import _build_bulk_requests, SENDGRID_MAX_RECIPIENTS
+
+def message(i, body='Your report is ready.', **extra):
+    return dict({'to': f'host{i}@example.com', 'subject': 'Your report', 'body': body}, **extra)
+
+def recipients(request):
+    return sum(len(p['to']) + len(p.get('cc', [])) for p in request['personalizations'])
+
+def test_recipients_split_at_the_sendgrid_limit():
+    attachments = [{'content': 'UERG', 'filename': 'Property_Optimization_Report.pdf'}]
+    requests_data = _build_bulk_requests([message(i) for i in range(SENDGRID_MAX_RECIPIENTS + 200)], attachments)
+    assert [recipients(r) for r in requests_data] == [SENDGRID_MAX_RECIPIENTS, 200]
+    assert all(r['attachments'] is attachments for r in requests_data)
+
+def test_cc_counts_toward_the_limit_and_personalizations_stay_whole():
+    messages = [message(i, cc=[f'cohost{i}@example.com']) for i in range(SENDGRID_MAX_RECIPIENTS // 2 + 1)]
+    requests_data = _build_bulk_requests(messages, [])
+    assert [recipients(r) for r in requests_data] == [SENDGRID_MAX_RECIPIENTS, 2]
+    assert all('attachments' not in r for r in requests_data)
+
+def test_attachments_encoded_once_per_group():
+    sent, encoded = [], []
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for name in ('a.pdf', 'b.pdf'):
+            paths.append(os.path.join(folder, name))
+            with open(paths[-1], 'wb') as f:
+                f.write(b'%PDF-1.4 ' + name.encode())
+        messages = [message(i, body=f'Report {i}', pdf_paths=[paths[i % 2]]) for i in range(6)]
+
+        originals = (email_service._post_sendgrid, email_service.get_encoded_attachment, os.environ.get('SENDGRID_API_KEY'))
+        email_service._post_sendgrid = lambda data: sent.append(data) or SimpleNamespace(status_code=202, text='')
+        email_service.get_encoded_attachment = lambda path: encoded.append(path) or f'encoded:{os.path.basename(path)}'
+        os.environ['SENDGRID_API_KEY'] = 'test'
+        try:
+            summary = email_service.send_bulk_email(messages)
+        finally:
+            email_service._post_sendgrid, email_service.get_encoded_attachment, key = originals
+            if key is None:
+                os.environ.pop('SENDGRID_API_KEY', None)
+            else:
+                os.environ['SENDGRID_API_KEY'] = key
+
+    # One request per attachment group, each PDF encoded once and every recipient in their group's request
+    assert summary['requests'] == 2 and len(summary['sent']) == 6 and not summary['failed']
+    assert sorted(encoded) == sorted(paths)
+    by_attachment = {r['attachments'][0]['content']: {p['to'][0]['email'] for p in r['personalizations']} for r in sent}
+    assert by_attachment == {
+        'encoded:a.pdf': {f'host{i}@example.com' for i in (0, 2, 4)},
+        'encoded:b.pdf': {f'host{i}@example.com' for i in (1, 3, 5)},
+    }
+
+if __name__ == "__main__":
+    test_recipients_split_at_the_sendgrid_limit()
+    test_cc_counts_toward_the_limit_and_personalizations_stay_whole()
+    test_attachments_encoded_once_per_group()
+    print("✅ Bulk email batching tests passed")
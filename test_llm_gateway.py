@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test that the LLM gateway's circuit breaker recovers after half-open probes that end without a
+verdict (rate-limited, or cut off by the optimization deadline), using a scripted stand-in client
+"""
+
+import sys
+import os
+import time
+import uuid
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import llm_gateway
+from services.section_pipeline import start_budget, end_budget
+
+COOLDOWN = 0.05
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={})
+
+class ScriptedClient:
+    """Each create() runs the next step: an HTTP status to fail with, 'slow' (sleep then time out) or 'ok'"""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        step = self.steps.pop(0) if self.steps else 'ok'
+        if step == 'slow':
+            time.sleep(0.3)
+            raise TimeoutError('request timed out')
+        if step != 'ok':
+            raise ProviderError(step)
+        message = SimpleNamespace(content='fine')
+        return SimpleNamespace(model='gpt-test', usage=None, choices=[SimpleNamespace(message=message)])
+
+_saved = {}
+
+def setup_function(function=None):
+    _saved.update(breaker=llm_gateway._breaker, limiter=llm_gateway._limiter, retries=llm_gateway.LLM_MAX_RETRIES)
+
+def teardown_function(function=None):
+    llm_gateway._breaker, llm_gateway._limiter, llm_gateway.LLM_MAX_RETRIES = (
+        _saved['breaker'], _saved['limiter'], _saved['retries'])
+
+def call(client):
+    # A unique prompt per call, so no cached fallback can stand in for a real answer
+    return llm_gateway.chat_completion(client, 'test', model='gpt-test',
+                                       messages=[{'role': 'user', 'content': uuid.uuid4().hex}])
+
+def open_breaker():
+    llm_gateway._breaker = llm_gateway.CircuitBreaker(threshold=1, cooldown=COOLDOWN)
+    llm_gateway._limiter = llm_gateway.AIMDLimiter(8, 1, 32)
+    llm_gateway.LLM_MAX_RETRIES = 0
+    try:
+        call(ScriptedClient(500))
+    except ProviderError:
+        pass
+    assert llm_gateway._breaker.state == 'open'
+    time.sleep(COOLDOWN * 2)
+    assert llm_gateway._breaker.state == 'half-open'
+
+def assert_recovers():
+    assert call(ScriptedClient('ok')).choices[0].message.content == 'fine'
+    assert llm_gateway._breaker.state == 'closed'
+
+def test_rate_limited_probe_frees_the_probe_slot():
+    open_breaker()
+    try:
+        call(ScriptedClient(429))
+    except ProviderError:
+        pass
+    assert llm_gateway._breaker.state == 'half-open'
+    assert_recovers()
+
+def test_deadline_cut_probe_frees_the_probe_slot():
+    open_breaker()
+    token = start_budget(0.1)
+    try:
+        call(ScriptedClient('slow'))
+    except llm_gateway.LLMUnavailableError:
+        pass
+    finally:
+        end_budget(token)
+    assert llm_gateway._breaker.state == 'half-open'
+    assert_recovers()
+
+def test_prober_may_retry_after_429():
+    open_breaker()
+    llm_gateway.LLM_MAX_RETRIES = 1
+    # The probe's own retry goes out even though the breaker is still half-open
+    assert call(ScriptedClient(429, 'ok')).choices[0].message.content == 'fine'
+    assert llm_gateway._breaker.state == 'closed'
+
+if __name__ == "__main__":
+    for test in (test_rate_limited_probe_frees_the_probe_slot, test_deadline_cut_probe_frees_the_probe_slot,
+                 test_prober_may_retry_after_429):
+        setup_function()
+        try:
+            test()
+        finally:
+            teardown_function()
+    print("✅ LLM gateway breaker tests passed")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test that every section prompt of an optimization shares one byte-stable prefix
+(so provider-side prompt caching can reuse it), using a recording stand-in for the OpenAI client
+"""
+
+import sys
+import os
+import threading
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import str_optimizer
+from services.prompt_builder import SHARED_SYSTEM_PROMPT, listing_context, build_messages
+
+class RecordingClient:
+    """Records every chat.completions.create call and answers with canned text"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+        prompt = kwargs['messages'][-1]['content']
+        if 'JSON' in prompt or 'json' in prompt:
+            content = '{}'
+        elif 'titles' in prompt:
+            content = '1. First title\n2. Second title\n3. Third title'
+        else:
+            content = 'Asheville, United States'
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10)
+        return SimpleNamespace(model=kwargs.get('model'), usage=usage,
+                               choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def run_optimization(form_data):
+    client = RecordingClient()
+    original_client, original_images = str_optimizer.get_openai_client, str_optimizer.scrape_airbnb_images
+    str_optimizer.get_openai_client = lambda: client
+    str_optimizer.scrape_airbnb_images = lambda url, max_images=3: ['https://example.com/photo.jpg']
+    try:
+        str_optimizer.optimize_listing(form_data)
+    finally:
+        str_optimizer.get_openai_client, str_optimizer.scrape_airbnb_images = original_client, original_images
+    return client.calls
+
+TEST_LISTING = {
+    'title': 'Riverside Cabin',
+    'description': 'Cozy cabin by the French Broad River with a hot tub,\r\nfire pit   and mountain views.',
+    'reviews': 'Loved the hot tub! Quiet and clean.',
+    'pdf_renderer': 'native',
+}
+
+def test_listing_context_is_byte_stable():
+    """Whitespace and line-ending variants of the same listing give identical bytes"""
+    first = listing_context(title='Riverside Cabin ', description='Hot tub,\r\nfire pit   and views.', location='Asheville')
+    second = listing_context(title='Riverside Cabin', description='Hot tub,\nfire pit and views.  ', location='Asheville')
+    assert first.encode() == second.encode()
+    assert 'Asheville' in first and 'fire pit and views.' in first
+
+def test_section_prompts_share_prefix():
+    """All section calls of one optimization start with the same system message; sections differ only at the end"""
+    calls = run_optimization(dict(TEST_LISTING))
+    section_calls = [c for c in calls if c['messages'][0]['content'].startswith(SHARED_SYSTEM_PROMPT)]
+    assert len(section_calls) >= 15, f"expected every section to use the shared prefix, got {len(section_calls)}"
+
+    prefixes = {c['messages'][0]['content'] for c in section_calls}
+    assert len(prefixes) == 1, "section prompts must share one identical prefix"
+    assert 'Riverside Cabin' in prefixes.pop()
+    assert len({c['messages'][-1]['content'] for c in section_calls}) == len(section_calls)
+
+def test_reviews_only_reach_the_sentiment_prompt():
+    """Reviews stay out of the shared prefix and go only to the section that analyzes them"""
+    calls = run_optimization(dict(TEST_LISTING))
+    with_reviews = [c for c in calls if any('Loved the hot tub' in m['content'] for m in c['messages'])]
+    assert len(with_reviews) == 1
+    assert 'Loved the hot tub' not in with_reviews[0]['messages'][0]['content']
+    assert 'Recurring Praise' in with_reviews[0]['messages'][-1]['content']
+
+def test_prefix_stable_across_requests():
+    """Two runs for the same listing send the same prefix, so the second run can hit the provider cache"""
+    first = run_optimization(dict(TEST_LISTING))
+    second = run_optimization(dict(TEST_LISTING))
+    prefix = lambda calls: {c['messages'][0]['content'] for c in calls if c['messages'][0]['content'].startswith(SHARED_SYSTEM_PROMPT)}
+    assert prefix(first) == prefix(second)
+
+def test_build_messages_puts_section_text_last():
+    context = listing_context(title='Cabin', description='Hot tub')
+    messages = build_messages(context, 'You are a pricing analyst.', 'Give 3 pricing tips.')
+    assert messages[0] == {'role': 'system', 'content': f"{SHARED_SYSTEM_PROMPT}\n\n{context}"}
+    assert messages[1]['content'].endswith('Give 3 pricing tips.')
+
+if __name__ == "__main__":
+    test_listing_context_is_byte_stable()
+    test_section_prompts_share_prefix()
+    test_reviews_only_reach_the_sentiment_prompt()
+    test_prefix_stable_across_requests()
+    test_build_messages_puts_section_text_last()
+    print("✅ Prompt prefix tests passed")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test the local title scorer and ranking used by the title section (no OpenAI calls)
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.title_ranking import parse_candidates, rank_titles, score_title, location_terms, length_score, mentions_location
+
+CANDIDATES = [
+    "Beautiful Home | Great Place | Perfect Stay",
+    "Secluded Asheville Cabin w/ Hot Tub & Mountain Views",
+    "Cozy Asheville Cabin | Hot Tub | Mountain Views",
+    "Romantic Riverside Retreat near Downtown Asheville",
+    "Charming cabin",
+    "Cozy Asheville Cabin - Hot Tub - Mountain Views",
+    "Private Hot Tub Oasis with Fire Pit, Hammocks, Stargazing Deck and Fast Wifi",
+]
+
+def test_parse_json_and_numbered_fallback():
+    assert parse_candidates('{"titles": ["A one", " B two "]}') == ["A one", "B two"]
+    assert parse_candidates('```json\n{"titles": ["Fenced A"]}\n```') == ["Fenced A"]
+    assert parse_candidates('1. First option\n2) "Second option"\nnot a title') == ["First option", "Second option"]
+    assert parse_candidates('') == []
+
+def test_length_follows_airbnb_guideline():
+    assert length_score("x" * 45) == 1.0
+    assert length_score("x" * 50) == 1.0
+    assert length_score("x" * 60) < length_score("x" * 52) < 1.0
+    assert length_score("x" * 15) == 0.5
+
+def test_location_and_power_words_raise_score():
+    terms = location_terms("Asheville, United States")
+    with_location = score_title("Secluded Asheville Cabin with Hot Tub", terms)
+    without_location = score_title("Secluded Mountain Cabin with Hot Tub", terms)
+    assert with_location['location'] == 1.0 and without_location['location'] == 0.0
+    assert with_location['total'] > without_location['total']
+    assert score_title("Serene Modern Loft", terms)['power'] > score_title("Modest Loft Space", terms)['power']
+    assert location_terms("your area") == []
+
+def test_location_matches_whole_words_only():
+    terms = location_terms("Asheville, NC")
+    assert not mentions_location("Enchanting Mountain Cabin", terms)
+    assert mentions_location("Cozy Cabin near Downtown Asheville, NC", terms)
+    assert score_title("Enchanting Mountain Cabin", terms)['location'] == 0.0
+    new_york = location_terms("New York, USA")
+    assert mentions_location("Bright Loft in the Heart of New York", new_york)
+    assert not mentions_location("Brand New Yorkshire Cottage", new_york)
+
+def test_ranking_is_deterministic_and_diverse():
+    ranked = rank_titles(CANDIDATES, "Asheville, United States")
+    assert ranked == rank_titles(list(CANDIDATES), "Asheville, United States")
+    assert len(ranked) == 3
+    # Generic, too-short and over-long titles lose; the two near-identical "Cozy" titles count once
+    assert "Beautiful Home | Great Place | Perfect Stay" not in ranked
+    assert "Charming cabin" not in ranked
+    assert CANDIDATES[-1] not in ranked
+    assert not {"Cozy Asheville Cabin | Hot Tub | Mountain Views", "Cozy Asheville Cabin - Hot Tub - Mountain Views"} <= set(ranked)
+    assert all(len(title) <= 52 for title in ranked)
+
+def test_ranking_handles_few_candidates():
+    assert rank_titles([], "Asheville") == []
+    assert rank_titles(["Only One Title Here For This Cabin"], None) == ["Only One Title Here For This Cabin"]
+
+if __name__ == "__main__":
+    test_parse_json_and_numbered_fallback()
+    test_length_follows_airbnb_guideline()
+    test_location_and_power_words_raise_score()
+    test_location_matches_whole_words_only()
+    test_ranking_is_deterministic_and_diverse()
+    test_ranking_handles_few_candidates()
+    print("✅ Title ranking tests passed")